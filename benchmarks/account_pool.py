@@ -0,0 +1,106 @@
+"""
+Order throughput with 1, 2 and 4 upstream accounts behind one account pool.
+
+The stub allows ``--rate`` requests per second per member ID and answers
+more with HTTP 429; each account's service is limited to 90% of that on
+the client side, as UPSTREAM_RATE_LIMIT should be set in production. A
+burst of orders is placed through the pool for every account count, so
+throughput should grow with the accounts. A last run drains one account outside the
+bot after its balance was checked: its rejected orders are moved to the
+other accounts and it leaves the rotation, so no order fails.
+
+Usage:
+    python -m benchmarks.account_pool [--orders 600] [--rate 20] [--policy least_loaded]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from benchmarks.stub import StubUpstream
+from services.accounts import AccountPool
+from services.journal import TransactionJournal
+from services.omegatronik import OmegatronikService
+
+PRICE = 5000
+GROUPS = {"S10": "Telkomsel", "I10": "Indosat", "X10": "XL", "A10": "Axis", "T10": "Tri", "D10": "Dana"}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_case(name: str, count: int, args, drain_to: int = 0) -> None:
+    members = [f"M{i:04d}" for i in range(1, count + 1)]
+    accounts = {member: ("1234", "secret", 10 ** 12) for member in members}
+
+    async with StubUpstream(latency=args.latency, price=PRICE, accounts=accounts,
+                            account_rate_limit=args.rate) as stub:
+        journal = TransactionJournal(os.path.join(tempfile.mkdtemp(prefix="accounts_"), "orders.journal"),
+                                     fsync=False)
+        pool = AccountPool(
+            [OmegatronikService(member, "1234", "secret", endpoints=[stub.base_url], hedge_orders=False,
+                                rate_limit=args.rate * 0.9, rate_burst=args.rate * 0.9)
+             for member in members],
+            policy=args.policy, journal=journal,
+            price_of=lambda code: PRICE, group_of=GROUPS.get
+        )
+        await journal.open()
+        await pool.check_balance(fresh=True)
+        if drain_to:
+            # Spent elsewhere; the pool still believes the old balance
+            stub.balances[members[0]] = PRICE * drain_to
+        stub.paths.clear()
+
+        latencies: List[float] = []
+        failed = 0
+        codes = list(GROUPS)
+
+        async def order(i: int) -> None:
+            nonlocal failed
+            started = time.perf_counter()
+            result = await pool.order_product(f"0812{i:08d}", codes[i % len(codes)], meta={"user_id": i})
+            latencies.append(time.perf_counter() - started)
+            if not result["success"]:
+                failed += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[order(i) for i in range(args.orders)])
+        elapsed = time.perf_counter() - started
+        await pool.close()
+        await journal.close()
+
+    trx = stub.paths.get("/trx", 0)
+    spread = " ".join(f"{member}={stub.orders_by_account.get(member, 0)}" for member in members)
+    print(f"{name:<16} {args.orders / elapsed:7.1f} orders/s  elapsed={elapsed:5.1f}s "
+          f"p50={statistics.median(latencies):5.2f}s p95={percentile(latencies, 95):5.2f}s "
+          f"failed={failed} moved={trx - args.orders} http429={stub.statuses.get(429, 0)}")
+    statuses = {a.name: a.status for a in pool.accounts if a.status != 'active'}
+    print(f"{'':<16} {spread}  out_of_rotation={statuses or '-'}")
+
+
+async def run(args) -> None:
+    print(f"orders={args.orders} per_account_rate={args.rate}/s latency={args.latency}s policy={args.policy}")
+    for count in args.accounts:
+        await run_case(f"{count} account{'s' if count > 1 else ''}", count, args)
+    await run_case("4, one drained", 4, args, drain_to=args.short)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=600)
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second per account")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--policy", default="least_loaded", choices=["least_loaded", "balance", "sticky"])
+    parser.add_argument("--accounts", type=lambda value: [int(v) for v in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--short", type=int, default=10, help="Orders the drained account can still pay for")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
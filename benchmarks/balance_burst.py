@@ -0,0 +1,53 @@
+"""
+Balance burst benchmark: many users pressing "Cek Saldo" at once.
+
+All concurrent checks should collapse into a single upstream CekSaldo
+request, and later checks inside the TTL should not reach the upstream.
+
+Usage:
+    python -m benchmarks.balance_burst [--users 200] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub import StubUpstream
+from services.omegatronik import OmegatronikService
+
+
+async def run(users: int, latency: float) -> None:
+    async with StubUpstream(latency=latency) as stub:
+        service = OmegatronikService(
+            member_id="M0001", pin="1234", password="secret",
+            endpoints=[stub.base_url], balance_cache_ttl=10
+        )
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*[service.check_balance() for _ in range(users)])
+            burst = time.perf_counter() - started
+
+            started = time.perf_counter()
+            await asyncio.gather(*[service.check_balance() for _ in range(users)])
+            cached = time.perf_counter() - started
+
+            await service.order_product("081200000001", "S10")
+            after_order = stub.requests
+            await service.check_balance()
+        finally:
+            await service.close()
+
+    assert all(r["success"] for r in results)
+    print(f"users={users} burst={burst:.3f}s cached_burst={cached * 1000:.2f}ms "
+          f"upstream_requests={after_order - 1} refetched_after_order={stub.requests - after_order == 1}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Balance reads during a stream of orders: cached CekSaldo vs local ledger.
+
+Simulated users place orders and press "Cek Saldo" at random over the run,
+against a stub that deducts each order's price from its balance. With the
+cache, every successful order invalidates the cached balance, so the next
+read goes upstream. With the ledger, reads are answered locally and the
+upstream is only asked every ``--reconcile-every`` orders. Near the end a
+top-up is made outside the bot to show that reconciliation catches the
+drift, and the balance is run down so the last orders are refused locally.
+
+Usage:
+    python -m benchmarks.balance_ledger [--orders 300] [--reads 1500] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+from benchmarks.stub import StubUpstream
+from services.journal import TransactionJournal
+from services.ledger import BalanceLedger
+from services.omegatronik import OmegatronikService
+
+PRICE = 5000
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(mode: str, args) -> None:
+    # Enough for all but the last few orders
+    start_balance = PRICE * (args.orders - args.short)
+    async with StubUpstream(latency=args.latency, balance=start_balance, price=PRICE) as stub:
+        journal = TransactionJournal(os.path.join(tempfile.mkdtemp(prefix="ledger_"), "orders.journal"),
+                                     fsync=False)
+        service = OmegatronikService(
+            member_id="M0001", pin="1234", password="secret",
+            endpoints=[stub.base_url], balance_cache_ttl=10, journal=journal, hedge_orders=False
+        )
+        ledger = None
+        if mode == "ledger":
+            ledger = BalanceLedger(
+                fetch=lambda: service.check_balance(fresh=True),
+                price_of=lambda code: PRICE,
+                reconcile_interval=args.duration * 10,
+                reconcile_every=args.reconcile_every
+            )
+            journal.listeners.append(ledger.on_record)
+        await journal.open()
+        if ledger is not None:
+            ledger.start()
+            await ledger.reconcile()
+        stub.paths.clear()
+
+        read_latencies: List[float] = []
+        refused = 0
+        failed = 0
+
+        async def read(delay: float) -> None:
+            await asyncio.sleep(delay)
+            started = time.perf_counter()
+            result = await (ledger.get() if ledger is not None else service.check_balance())
+            assert result["success"], result
+            read_latencies.append(time.perf_counter() - started)
+
+        async def order(i: int, delay: float) -> None:
+            nonlocal refused, failed
+            await asyncio.sleep(delay)
+            if ledger is not None and not ledger.can_afford(PRICE):
+                refused += 1
+                return
+            result = await service.order_product(f"0812{i:08d}", "S5", meta={"user_id": i})
+            if not result["success"]:
+                failed += 1
+
+        async def top_up() -> None:
+            # Deposit made outside the bot, only visible through CekSaldo
+            await asyncio.sleep(args.duration * 0.5)
+            stub.balance += args.top_up
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            top_up(),
+            *[order(i, args.duration * i / args.orders) for i in range(args.orders)],
+            *[read(random.uniform(0, args.duration)) for _ in range(args.reads)],
+        )
+        elapsed = time.perf_counter() - started
+        if ledger is not None:
+            await ledger.reconcile()
+            await ledger.stop()
+        await journal.close()
+        await service.close()
+
+    local = ledger.balance if ledger is not None else None
+    print(f"\n[{mode}] elapsed={elapsed:.1f}s CekSaldo={stub.paths.get('/CekSaldo', 0)} "
+          f"trx={stub.paths.get('/trx', 0)} upstream_rejected={failed} refused_locally={refused}")
+    print(f"  balance reads: n={len(read_latencies)} p50={statistics.median(read_latencies) * 1000:.2f}ms "
+          f"p95={percentile(read_latencies, 95) * 1000:.2f}ms max={max(read_latencies) * 1000:.1f}ms")
+    if local is not None:
+        print(f"  final ledger balance Rp {local:,} vs upstream Rp {stub.balance:,}")
+
+
+async def run(args) -> None:
+    print(f"orders={args.orders} reads={args.reads} duration={args.duration}s latency={args.latency}s "
+          f"short_by={args.short} orders, top_up=Rp {args.top_up:,} halfway")
+    for mode in args.modes:
+        random.seed(1)
+        await run_mode(mode, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--reads", type=int, default=1500)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds over which load is spread")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--reconcile-every", type=int, default=50)
+    parser.add_argument("--short", type=int, default=20, help="Orders the starting balance cannot cover")
+    parser.add_argument("--top-up", type=int, default=50_000)
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["cache", "ledger"])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
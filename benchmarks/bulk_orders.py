@@ -0,0 +1,98 @@
+"""
+Bulk order benchmark: a 1,000-row batch against the local stub.
+
+Parses and validates a generated order list, then runs it through
+BulkOrderBatch at a few concurrency limits and reports wall time and
+throughput. Also compares per-order signing cost of the plain function
+with the precomputed SigningContext.
+
+Usage:
+    python -m benchmarks.bulk_orders [--rows 1000] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+from benchmarks.stub import StubUpstream
+from services.bulk import BulkOrderBatch, parse_bulk_orders
+from services.omegatronik import OmegatronikService
+from utils.signature import SigningContext, generate_order_signature
+
+
+def build_list(rows: int) -> str:
+    lines = ["tujuan,produk"]
+    lines += [f"0812{i:08d},{('S10', 'S25', 'I10', 'X50')[i % 4]}" for i in range(rows)]
+    return "\n".join(lines)
+
+
+async def run_batch(text: str, rows: int, concurrency: int, latency: float) -> None:
+    async with StubUpstream(latency=latency) as stub:
+        service = OmegatronikService(
+            member_id="M0001", pin="1234", password="secret",
+            endpoints=[stub.base_url], hedge_orders=False,
+            # Pool headroom above the batch limit; a pool filled to the brim
+            # hands connections over slowly
+            max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2
+        )
+        await service.start()
+        progress_calls = 0
+
+        async def on_progress(batch):
+            nonlocal progress_calls
+            progress_calls += 1
+
+        try:
+            started = time.perf_counter()
+            parsed, errors = parse_bulk_orders(text, max_rows=rows)
+            parse_time = time.perf_counter() - started
+            assert not errors, errors
+
+            batch = BulkOrderBatch(
+                parsed,
+                order=lambda row: service.order_product(row.destination, row.product_code),
+                concurrency=concurrency,
+                on_progress=on_progress,
+                progress_interval=0.5
+            )
+            await batch.run()
+            elapsed = time.perf_counter() - started
+            report = batch.results_csv()
+        finally:
+            await service.close()
+
+    print(f"concurrency={concurrency:<4} rows={len(parsed)} parse={parse_time * 1000:.1f}ms "
+          f"elapsed={elapsed:.2f}s rate={len(parsed) / elapsed:.0f}/s counts={batch.counts} "
+          f"progress_updates={progress_calls} report={len(report) // 1024}KB "
+          f"upstream_connections={stub.connections}")
+
+
+def bench_signing() -> None:
+    context = SigningContext("M0001", "1234", "secret")
+    number = 100_000
+    plain = min(timeit.repeat(
+        lambda: generate_order_signature("M0001", "1234", "secret", "081200000001", "S10", "173000000000000001"),
+        number=number, repeat=5
+    ))
+    shared = min(timeit.repeat(
+        lambda: context.sign_order("081200000001", "S10", "173000000000000001"),
+        number=number, repeat=5
+    ))
+    print(f"signing  plain {plain / number * 1e6:.2f}us  context {shared / number * 1e6:.2f}us per order")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 20, 50])
+    args = parser.parse_args()
+
+    bench_signing()
+    text = build_list(args.rows)
+    for concurrency in args.concurrency:
+        asyncio.run(run_batch(text, args.rows, concurrency, args.latency))
+
+
+if __name__ == "__main__":
+    main()
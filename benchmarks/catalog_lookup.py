@@ -0,0 +1,67 @@
+"""
+Catalog benchmark: code lookup and search latency over a large price list.
+
+Builds a synthetic 20k-product catalog, then times exact code validation
+(the check that replaces a failed upstream round trip) and prefix search
+(what inline queries run), with and without the search cache.
+
+Usage:
+    python -m benchmarks.catalog_lookup [--products 20000]
+"""
+import argparse
+import random
+import time
+
+from services.catalog import Product, ProductCatalog
+
+OPERATORS = ["Telkomsel", "Indosat", "XL", "Axis", "Tri", "Smartfren", "PLN", "Dana", "OVO", "GoPay"]
+KINDS = ["Pulsa", "Data", "Voucher", "Token", "Saldo"]
+
+
+def build(count: int) -> ProductCatalog:
+    products = []
+    for i in range(count):
+        operator = OPERATORS[i % len(OPERATORS)]
+        kind = KINDS[(i // len(OPERATORS)) % len(KINDS)]
+        nominal = 5 * (1 + i % 200)
+        code = f"{operator[:2].upper()}{kind[0]}{i}"
+        products.append(Product(code, f"{operator} {kind} {nominal}rb", nominal * 1000 + 150, operator))
+    catalog = ProductCatalog()
+    catalog.replace(products)
+    return catalog
+
+
+def timed(fn, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    catalog = build(args.products)
+    print(f"build    {len(catalog)} products indexed in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    codes = [p.code.lower() for p in catalog.products]
+    hits = [(random.choice(codes),) for _ in range(args.lookups)]
+    misses = [(f"ZZ{i}",) for i in range(args.lookups)]
+    print(f"get      hit  {timed(catalog.get, hits) * 1e9:7.0f} ns")
+    print(f"get      miss {timed(catalog.get, misses) * 1e9:7.0f} ns")
+
+    queries = ["tsel", "te", "indosat data", "pln token 50", "xl", "s", "gopay 100rb", "tri data 25"]
+    cold = [(f"{q} {i}", 20) for i, q in enumerate(queries * 200)]
+    catalog.search_cache_size = 0
+    print(f"search   uncached {timed(catalog.search, cold) * 1e6:7.1f} us")
+    catalog.search_cache_size = 1024
+    warm = [(q, 20) for q in queries * 2000]
+    print(f"search   cached   {timed(catalog.search, warm) * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
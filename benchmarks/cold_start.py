@@ -0,0 +1,235 @@
+"""
+Time to first update after a cold start, in polling and webhook mode.
+
+Starts ``bot.py`` as a fresh process, as a container restart would, pointed
+at a local fake Telegram Bot API (TELEGRAM_API_URL) and an upstream stub.
+A /start update is waiting from the moment the process is spawned: in
+polling mode it is returned by the first getUpdates, in webhook mode it is
+POSTed to /webhook until the server accepts it. The run measures when the
+process first talks to the Bot API (imports and module setup done) and
+when the reply to /start arrives. It also records when the first CekSaldo
+reaches the upstream, to show whether warm-up sits in the critical path.
+
+``--state large`` seeds what a busy bot carries across restarts: a 20k
+product price list, a journal of finished orders and 100k order
+schedules.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5] [--state empty,large] [--modes polling,webhook]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import tornado.httpserver
+import tornado.web
+
+from benchmarks.order_scheduler import fill_store
+from benchmarks.stub import StubUpstream
+from benchmarks.webhook_scaling import ROOT, free_port, start_message
+
+TOKEN = "123456:COLDSTART"
+CHAT_ID = 4242
+OPERATORS = ["Telkomsel", "Indosat", "XL", "Axis", "Tri", "Smartfren", "PLN", "Dana", "OVO", "GoPay"]
+
+
+class PollingTelegramApi:
+    """Fake Bot API that also serves getUpdates, timestamping the calls of one run"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.started = 0.0
+        self.events: Dict[str, float] = {}
+        self.updates: List[dict] = []
+        self._server = None
+        self._arrived = asyncio.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def reset(self, updates: List[dict]) -> None:
+        self.started = time.perf_counter()
+        self.events = {}
+        self.updates = list(updates)
+
+    def mark(self, name: str) -> None:
+        self.events.setdefault(name, time.perf_counter() - self.started)
+
+    def start(self) -> None:
+        api = self
+
+        class MethodHandler(tornado.web.RequestHandler):
+            async def post(self, method: str) -> None:
+                api.mark("first_api_call")
+                if "json" in self.request.headers.get("Content-Type", ""):
+                    params = json.loads(self.request.body or b"{}")
+                else:
+                    params = {key: self.get_body_argument(key) for key in self.request.body_arguments}
+
+                if method == "getMe":
+                    result = {"id": 123456, "is_bot": True, "first_name": "Cold", "username": "cold_start_bot"}
+                elif method == "getUpdates":
+                    api.mark("first_get_updates")
+                    offset = int(params.get("offset") or 0)
+                    result = [update for update in api.updates if update["update_id"] >= offset]
+                    if not result:
+                        # Long poll, cut short so shutdown stays quick
+                        await asyncio.sleep(min(float(params.get("timeout") or 0), 0.5))
+                elif method == "sendMessage":
+                    if int(params.get("chat_id")) == CHAT_ID:
+                        api.mark("reply")
+                    result = {"message_id": 1, "date": int(time.time()),
+                              "chat": {"id": int(params.get("chat_id")), "type": "private"},
+                              "text": params.get("text", "")}
+                else:
+                    result = True
+                self.write({"ok": True, "result": result})
+
+            get = post
+
+        app = tornado.web.Application([(r"/bot[^/]+/(\w+)", MethodHandler)], log_function=lambda handler: None)
+        self._server = tornado.httpserver.HTTPServer(app)
+        self._server.listen(self.port, address="127.0.0.1")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+
+
+def seed_state(workdir: str, args) -> None:
+    """What a busy bot has on disk: price list, journal and schedules"""
+    with open(os.path.join(workdir, "products.csv"), "w", encoding="utf-8") as f:
+        f.write("code,name,price,group\n")
+        for i in range(args.products):
+            operator = OPERATORS[i % len(OPERATORS)]
+            f.write(f"{operator[:2].upper()}{i},{operator} {5 * (1 + i % 200)}rb,{5000 + i % 200 * 1000},{operator}\n")
+
+    now = time.time()
+    with open(os.path.join(workdir, "orders.journal"), "w", encoding="utf-8") as f:
+        for i in range(args.orders):
+            f.write(json.dumps({
+                "ref_id": f"17{i:016d}", "state": "success", "ts": now - i, "created_at": now - i - 5,
+                "user_id": 1000 + i % 5000, "chat_id": 1000 + i % 5000, "destination": f"0812{i:08d}",
+                "product_code": "S10", "trx_id": f"T{i}", "price": 10150, "message": "Transaksi sukses",
+            }, separators=(",", ":")) + "\n")
+
+    fill_store(os.path.join(workdir, "schedules.db"), args.schedules, now + 86400).close()
+
+
+async def run_once(mode: str, state: str, args, api: PollingTelegramApi, stub: StubUpstream) -> Dict[str, float]:
+    workdir = tempfile.mkdtemp(prefix=f"cold_start_{mode}_{state}_")
+    if state == "large":
+        seed_state(workdir, args)
+    port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN, TELEGRAM_API_URL=api.base_url,
+        WEBHOOK_MODE="true" if mode == "webhook" else "false", WEBHOOK_WORKERS="1",
+        WEBHOOK_URL="https://example.invalid/webhook", WEB_SERVER_PORT=str(port),
+        MEMBER_ID="M0001", PIN="1234", PASSWORD="secret", OMEGA_ENDPOINTS=stub.base_url,
+        JOURNAL_PATH=os.path.join(workdir, "orders.journal"),
+        REFID_STATE_PATH=os.path.join(workdir, "refid.state"),
+        SESSION_DB_PATH=os.path.join(workdir, "sessions.db"),
+        HISTORY_DB_PATH=os.path.join(workdir, "history.db"),
+        SCHEDULE_DB_PATH=os.path.join(workdir, "schedules.db"),
+        CATALOG_PATH=os.path.join(workdir, "products.csv"),
+        METRICS_ENABLED="false", LOG_LEVEL="ERROR",
+    )
+    env.pop("WORKER_INDEX", None)
+    update = json.loads(start_message(1, CHAT_ID))
+    api.reset([update] if mode == "polling" else [])
+    balance_checks = stub.paths.get("/CekSaldo", 0)
+    process = subprocess.Popen([sys.executable, "bot.py"], cwd=ROOT, env=env)
+
+    async def watch_upstream() -> None:
+        while stub.paths.get("/CekSaldo", 0) == balance_checks:
+            await asyncio.sleep(0.005)
+        api.mark("first_upstream_call")
+
+    watcher = asyncio.create_task(watch_upstream())
+    try:
+        deadline = time.perf_counter() + args.timeout
+        if mode == "webhook":
+            async with httpx.AsyncClient() as client:
+                while time.perf_counter() < deadline:
+                    try:
+                        response = await client.post(f"http://127.0.0.1:{port}/webhook", json=update, timeout=5)
+                        if response.status_code == 200:
+                            api.mark("webhook_accepted")
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    await asyncio.sleep(0.005)
+        while "reply" not in api.events and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        # Let background warm-up show up before the process is stopped
+        await asyncio.sleep(args.settle)
+    finally:
+        watcher.cancel()
+        process.send_signal(signal.SIGINT if mode == "polling" else signal.SIGTERM)
+        try:
+            await asyncio.to_thread(process.wait, 30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return dict(api.events)
+
+
+def median(runs: List[Dict[str, float]], name: str) -> Optional[float]:
+    values = [run[name] for run in runs if name in run]
+    return statistics.median(values) if values else None
+
+
+async def run(args) -> None:
+    api = PollingTelegramApi()
+    api.start()
+    columns = ("first_api_call", "webhook_accepted", "reply", "first_upstream_call")
+    results = []
+    try:
+        async with StubUpstream(latency=args.upstream_latency, member_id="M0001", pin="1234",
+                                password="secret") as stub:
+            for state in args.state:
+                for mode in args.modes:
+                    runs = [await run_once(mode, state, args, api, stub) for _ in range(args.runs)]
+                    results.append((mode, state, runs))
+    finally:
+        api.stop()
+
+    print(f"runs={args.runs} (median) products={args.products} orders={args.orders} "
+          f"schedules={args.schedules} upstream_latency={args.upstream_latency}s")
+    print(f"{'mode':<8} {'state':<6} {'first API call':>15} {'webhook up':>11} {'first reply':>12} {'first CekSaldo':>15}")
+    for mode, state, runs in results:
+        cells = []
+        for name in columns:
+            value = median(runs, name)
+            cells.append("-" if value is None else f"{value:.2f}s")
+        print(f"{mode:<8} {state:<6} {cells[0]:>15} {cells[1]:>11} {cells[2]:>12} {cells[3]:>15}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--state", type=lambda value: value.split(","), default=["empty", "large"])
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["polling", "webhook"])
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=20_000, help="Finished orders in the journal")
+    parser.add_argument("--schedules", type=int, default=100_000)
+    parser.add_argument("--upstream-latency", type=float, default=0.3)
+    parser.add_argument("--settle", type=float, default=3.0,
+                        help="Seconds to wait after the reply, so loading finishes before the stop")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
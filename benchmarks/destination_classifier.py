@@ -0,0 +1,104 @@
+"""
+Destination classifier benchmark: correctness and throughput.
+
+Checks every case of ``benchmarks/corpus/destinations.json`` (kind,
+normalised number and operator), then times classification over a mix of
+generated mobile numbers in all input forms, PLN IDs, game IDs and invalid
+numbers, and compares the compiled prefix table with a regex per operator.
+Exits non-zero when any case is classified differently.
+
+Usage:
+    python -m benchmarks.destination_classifier [--numbers 200000]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+from services.destination import OPERATOR_PREFIXES, OPERATOR_TRIE, classify_destination
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "destinations.json")
+
+
+def generate(count: int) -> list:
+    prefixes = [prefix for group in OPERATOR_PREFIXES.values() for prefix in group]
+    forms = [
+        lambda p, rest: f"{p}{rest}",
+        lambda p, rest: f"+62{p[1:]}{rest}",
+        lambda p, rest: f"62{p[1:]}{rest}",
+        lambda p, rest: f"{p}-{rest[:4]}-{rest[4:]}",
+    ]
+    numbers = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 7:
+            rest = f"{random.randrange(10 ** 8):08d}"
+            numbers.append(random.choice(forms)(random.choice(prefixes), rest))
+        elif kind == 7:
+            numbers.append(f"{random.randrange(10 ** 10, 10 ** 12)}")
+        elif kind == 8:
+            numbers.append(f"{random.randrange(10 ** 7, 10 ** 8)}({random.randrange(1000, 9999)})")
+        else:
+            numbers.append(f"08{random.choice('0479')}{random.randrange(10 ** 8):08d}")
+    return numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--numbers", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    failures = 0
+    for case in cases:
+        result = classify_destination(case["input"])
+        got = {"kind": result.kind.value, "number": result.number, "operator": result.operator}
+        expected = {key: case[key] for key in ("kind", "number", "operator")}
+        if got != expected:
+            failures += 1
+            print(f"MISMATCH {case['input']!r}\n  got      {got}\n  expected {expected}")
+    print(f"cases    {len(cases) - failures}/{len(cases)} match "
+          f"(prefix table: {len(OPERATOR_TRIE)} entries, depth {OPERATOR_TRIE.depth})")
+
+    random.seed(1)
+    numbers = generate(args.numbers)
+    best = float("inf")
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        for number in numbers:
+            classify_destination(number)
+        best = min(best, time.perf_counter() - started)
+    print(f"classify {len(numbers) / best / 1e6:.2f}M destinations/s ({best / len(numbers) * 1e9:.0f} ns each)")
+
+    # Operator lookup alone, against the usual one regex per operator
+    national = [number for number in numbers if number.startswith("08") and number.isdigit()]
+    patterns = [(operator, re.compile("^(?:" + "|".join(prefixes) + r")\d{6,9}$"))
+                for operator, prefixes in OPERATOR_PREFIXES.items()]
+
+    def by_regex(number):
+        for operator, pattern in patterns:
+            if pattern.match(number):
+                return operator
+        return None
+
+    for name, lookup in (("prefix table", OPERATOR_TRIE.lookup), ("regex", by_regex)):
+        best = float("inf")
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            for number in national:
+                lookup(number)
+            best = min(best, time.perf_counter() - started)
+        print(f"  operator via {name:<13} {len(national) / best / 1e6:6.2f}M/s "
+              f"({best / len(national) * 1e9:.0f} ns each)")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
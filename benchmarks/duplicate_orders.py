@@ -0,0 +1,148 @@
+"""
+Duplicate order submissions through the real bot.py handlers.
+
+Each simulated user orders a product with a double tap (the product code
+sent twice at once), then repeats the whole flow while the order is still
+running, as users do after a slow "⏳" message, and once more after the
+result arrived, this time confirming the "order again?" prompt. Only the
+first and the confirmed order should reach the upstream; the in-flight
+duplicate gets the running order's result without a request of its own.
+
+Usage:
+    python -m benchmarks.duplicate_orders [--users 200] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import tempfile
+import time
+
+from telegram.ext import Application
+
+from benchmarks.load_bot import MEMBER_ID, PASSWORD, PIN, FakeBot, SimulatedUsers
+from benchmarks.stub import StubUpstream
+
+PRODUCT = "S10"
+
+
+def is_result(method: str, text: str) -> bool:
+    return method == "editMessageText" and ("Order Berhasil" in text or "Order Gagal" in text)
+
+
+async def run_user(users: SimulatedUsers, bot_module, user_id: int, delay: float, counts: dict) -> None:
+    await asyncio.sleep(delay)
+    destination = f"0812{user_id:08d}"
+    app, bot = users.app, users.bot
+
+    async def to_product() -> None:
+        await users.step("menu", user_id, users.callback(user_id, "order_produk"),
+                         lambda method, text: "Order Produk" in text)
+        await users.step("destination", user_id, users.message(user_id, destination),
+                         lambda method, text: "Nomor tujuan" in text)
+
+    await users.step("start", user_id, users.message(user_id, "/start"))
+    await to_product()
+
+    # Double tap: the same product code twice before the first is handled
+    results = [bot.expect(user_id, is_result) for _ in range(3)]
+    accepted = bot.expect(user_id, lambda method, text: "Order diterima" in text)
+    joined = bot.expect(user_id, lambda method, text: "masih diproses" in text)
+    started = time.perf_counter()
+    await app.update_queue.put(users.message(user_id, PRODUCT))
+    await app.update_queue.put(users.message(user_id, PRODUCT))
+    counts["submitted"] += 2
+    await asyncio.wait_for(asyncio.gather(accepted, joined), users.timeout)
+    counts["joined"] += 1
+
+    # Resend while the order is still running
+    await to_product()
+    joined = bot.expect(user_id, lambda method, text: "masih diproses" in text)
+    await app.update_queue.put(users.message(user_id, PRODUCT))
+    counts["submitted"] += 1
+    await asyncio.wait_for(joined, users.timeout)
+    counts["joined"] += 1
+    # The order and both duplicates get the same result
+    await asyncio.wait_for(asyncio.gather(*results), users.timeout)
+    users.latencies["order"].append(time.perf_counter() - started)
+
+    # Resend after the result: needs an explicit confirmation
+    await to_product()
+    prompt = bot.expect(user_id, lambda method, text: "Order lagi?" in text)
+    await app.update_queue.put(users.message(user_id, PRODUCT))
+    counts["submitted"] += 1
+    await asyncio.wait_for(prompt, users.timeout)
+    counts["confirm_prompts"] += 1
+
+    ref_id = bot_module.order_guard.check((user_id, destination, PRODUCT)).ref_id
+    repeated = bot.expect(user_id, is_result)
+    await app.update_queue.put(users.callback(user_id, f"ulang:{ref_id}"))
+    await asyncio.wait_for(repeated, users.timeout)
+    counts["confirmed"] += 1
+
+
+async def run(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="duplicate_orders_")
+    async with StubUpstream(latency=args.latency, member_id=MEMBER_ID, pin=PIN, password=PASSWORD) as stub:
+        # bot.py reads its configuration at import time
+        os.environ.update({
+            "BOT_TOKEN": "123456:LOADTEST", "MEMBER_ID": MEMBER_ID, "PIN": PIN, "PASSWORD": PASSWORD,
+            "OMEGA_ENDPOINTS": stub.base_url, "OMEGA_HEDGE_ORDERS": "false",
+            "JOURNAL_PATH": os.path.join(workdir, "orders.journal"),
+            "REFID_STATE_PATH": os.path.join(workdir, "refid.state"),
+            "HISTORY_DB_PATH": os.path.join(workdir, "history.db"),
+            "CATALOG_PATH": os.path.join(workdir, "products.csv"),
+            "SESSION_BACKEND": "memory", "ORDER_WORKERS": "64", "ORDER_QUEUE_SIZE": str(args.users * 4),
+            "ORDER_DEDUP_WINDOW": "120", "LOG_LEVEL": "ERROR",
+        })
+        bot_module = importlib.import_module("bot")
+
+        fake_bot = FakeBot()
+        app = Application.builder().bot(fake_bot).updater(None).concurrent_updates(256).build()
+        bot_module.application = app
+        bot_module.register_handlers(app)
+
+        await app.initialize()
+        await bot_module.on_startup(app)
+        await app.start()
+
+        users = SimulatedUsers(app, fake_bot, timeout=args.timeout)
+        counts = dict.fromkeys(("submitted", "joined", "confirm_prompts", "confirmed"), 0)
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*[
+                run_user(users, bot_module, 200_000 + i, args.ramp * i / args.users, counts)
+                for i in range(args.users)
+            ], return_exceptions=True)
+            elapsed = time.perf_counter() - started
+        finally:
+            await app.stop()
+            await app.shutdown()
+            await bot_module.on_shutdown(app)
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    trx = stub.paths.get("/trx", 0)
+    print(f"users={args.users} upstream_latency={args.latency}s elapsed={elapsed:.1f}s errors={len(errors)}")
+    print(f"order submissions={counts['submitted']} upstream /trx={trx} "
+          f"(expected {2 * args.users}: first order + confirmed repeat)")
+    print(f"joined in-flight={counts['joined']} confirm prompts={counts['confirm_prompts']} "
+          f"confirmed repeats={counts['confirmed']}")
+    print(f"saved requests={counts['submitted'] - trx} "
+          f"order p50={statistics.median(users.latencies['order']):.2f}s" if users.latencies["order"] else "")
+    if errors:
+        print(f"first error: {errors[0]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which users arrive")
+    parser.add_argument("--latency", type=float, default=1.0, help="Upstream latency in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Failover benchmark: tail latency while the primary endpoint is down.
+
+Runs balance checks and orders against a primary stub that either hangs
+or returns HTTP 500, with a healthy backup stub behind it. Before the
+router, a hanging primary cost the full 30s/60s timeout per call.
+
+Usage:
+    python -m benchmarks.failover [--calls 20] [--hang 60]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub import StubUpstream
+from services.omegatronik import OmegatronikService
+
+
+class BrokenStub(StubUpstream):
+    """Stub that answers every request with HTTP 500"""
+
+    def respond(self, path: str, params: dict) -> tuple:
+        return 500, "Internal Server Error"
+
+
+async def measure(name: str, primary: StubUpstream, backup: StubUpstream, calls: int) -> None:
+    service = OmegatronikService(
+        member_id="M0001", pin="1234", password="secret",
+        endpoints=[primary.base_url, backup.base_url]
+    )
+    service.router.hedge_default_delay = 1.0
+    latencies = []
+    try:
+        for i in range(calls):
+            started = time.perf_counter()
+            if i % 2:
+                result = await service.order_product(f"0812{i:08d}", "S10")
+            else:
+                result = await service.check_balance()
+            latencies.append(time.perf_counter() - started)
+            assert result["success"], result
+    finally:
+        await service.close()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    print(f"{name:<14} calls={calls} p50={p50:.3f}s max={latencies[-1]:.3f}s "
+          f"primary_state={service.router.endpoints[0].state}")
+
+
+async def run(calls: int, hang: float) -> None:
+    async with StubUpstream(latency=0.02) as backup:
+        async with StubUpstream(latency=hang) as primary:
+            await measure("primary-hangs", primary, backup, calls)
+        async with BrokenStub(latency=0.02) as primary:
+            await measure("primary-500", primary, backup, calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--hang", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.hang))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+End-to-end load test: simulated users driving the real bot.py handlers.
+
+Starts a primary and a backup stub (with signature checks), points bot.py
+at them through its environment variables, and replaces the Telegram API
+with a fake Bot whose ``_post`` answers locally. Every simulated user then
+goes through the whole chat flow with synthetic Updates: /start, the
+"Order Produk" button, the destination and the product code. The run
+reports throughput and p50/p95/p99 latency per step, plus the order's
+end-to-end time until its result is edited into the chat.
+
+Usage:
+    python -m benchmarks.load_bot [--users 2000] [--ramp 10] [--latency lognormal:0.2:0.5]
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from benchmarks.stub import StubUpstream, parse_latency
+from services.updates import ChatUpdateProcessor
+
+MEMBER_ID, PIN, PASSWORD = "M0001", "1234", "secret"
+STEPS = ("start", "menu", "destination", "product", "order")
+
+
+class FakeBot(Bot):
+    """
+    Bot whose API calls are answered locally instead of by Telegram.
+
+    ``_post`` is the single choke point of every Bot API method, so
+    overriding it keeps PTB's own argument handling and result parsing in
+    the measured path. Outgoing messages resolve the waiters registered by
+    simulated users.
+    """
+
+    def __init__(self, api_latency: float = 0.0):
+        super().__init__("123456:LOADTEST")
+        # PTB freezes its objects after __init__
+        with self._unfrozen():
+            self._api_latency = api_latency
+            self._message_ids = itertools.count(1)
+            self._waiters: Dict[int, List[tuple]] = {}
+            self.calls: Dict[str, int] = {}
+
+    def expect(self, chat_id: int, predicate: Callable[[str, str], bool]) -> asyncio.Future:
+        """Future resolved with the first outgoing message in ``chat_id`` matching ``predicate(method, text)``"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((predicate, future))
+        return future
+
+    async def _post(self, endpoint: str, data: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self._api_latency:
+            await asyncio.sleep(self._api_latency)
+        data = data or {}
+
+        if endpoint == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Load", "username": "load_test_bot",
+                    "can_join_groups": False, "can_read_all_group_messages": False,
+                    "supports_inline_queries": True}
+        if endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup", "sendDocument"):
+            chat_id = int(data.get("chat_id"))
+            text = data.get("text") or data.get("caption") or ""
+            message_id = data.get("message_id") or next(self._message_ids)
+            self._resolve(chat_id, endpoint, text)
+            return {"message_id": message_id, "date": int(time.time()), "text": text,
+                    "chat": {"id": chat_id, "type": "private"}}
+        return True
+
+    def _resolve(self, chat_id: int, method: str, text: str) -> None:
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for entry in waiters:
+            predicate, future = entry
+            if not future.done() and predicate(method, text):
+                future.set_result(text)
+                waiters.remove(entry)
+                break
+
+
+class SimulatedUsers:
+    """Builds synthetic Updates and walks users through the order flow"""
+
+    def __init__(self, app: Application, bot: FakeBot, timeout: float):
+        self.app = app
+        self.bot = bot
+        self.timeout = timeout
+        self._update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.outcomes: Dict[str, int] = {}
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Update:
+        message = {
+            "message_id": next(self._update_ids), "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.bot)
+
+    def callback(self, user_id: int, data: str) -> Update:
+        update_id = next(self._update_ids)
+        return Update.de_json({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": self._user(user_id), "chat_instance": str(user_id), "data": data,
+                "message": {
+                    "message_id": update_id, "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"}, "text": "menu",
+                    "from": {"id": 123456, "is_bot": True, "first_name": "Load"},
+                },
+            },
+        }, self.bot)
+
+    async def step(self, name: str, user_id: int, update: Update,
+                   predicate: Callable[[str, str], bool] = lambda method, text: True) -> str:
+        reply = self.bot.expect(user_id, predicate)
+        started = time.perf_counter()
+        await self.app.update_queue.put(update)
+        text = await asyncio.wait_for(reply, self.timeout)
+        self.latencies[name].append(time.perf_counter() - started)
+        return text
+
+    async def run_user(self, user_id: int, product: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self.step("start", user_id, self.message(user_id, "/start"))
+            await self.step("menu", user_id, self.callback(user_id, "order_produk"))
+            await self.step("destination", user_id, self.message(user_id, f"0812{user_id:08d}"))
+
+            final = self.bot.expect(
+                user_id, lambda method, text: method == "editMessageText" and "Order diterima" not in text
+            )
+            started = time.perf_counter()
+            await self.step("product", user_id, self.message(user_id, product))
+            text = await asyncio.wait_for(final, self.timeout)
+            self.latencies["order"].append(time.perf_counter() - started)
+            outcome = text.split("*")[1] if "*" in text else text[:20]
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(args) -> None:
+    stub_options = dict(
+        latency=parse_latency(args.latency), error_rate=args.error_rate, failure_rate=args.failure_rate,
+        body_format=args.format, member_id=MEMBER_ID, pin=PIN, password=PASSWORD
+    )
+    workdir = tempfile.mkdtemp(prefix="load_bot_")
+    async with StubUpstream(**stub_options) as primary, StubUpstream(**stub_options) as backup:
+        # bot.py reads its configuration at import time
+        os.environ.update({
+            "BOT_TOKEN": "123456:LOADTEST", "MEMBER_ID": MEMBER_ID, "PIN": PIN, "PASSWORD": PASSWORD,
+            "OMEGA_ENDPOINTS": f"{primary.base_url},{backup.base_url}",
+            "JOURNAL_PATH": os.path.join(workdir, "orders.journal"),
+            "REFID_STATE_PATH": os.path.join(workdir, "refid.state"),
+            "CATALOG_PATH": os.path.join(workdir, "products.csv"),
+            "SESSION_BACKEND": "memory",
+            "ORDER_WORKERS": str(args.workers), "ORDER_QUEUE_SIZE": str(args.users),
+            "LOG_LEVEL": "ERROR",
+        })
+        bot_module = importlib.import_module("bot")
+
+        fake_bot = FakeBot(api_latency=args.telegram_latency)
+        # The bot's own per-chat update processor, as deployed
+        if args.concurrent_updates:
+            bot_module.update_processor = ChatUpdateProcessor(max_concurrent=args.concurrent_updates)
+        app = (Application.builder().bot(fake_bot).updater(None)
+               .concurrent_updates(bot_module.update_processor).build())
+        bot_module.application = app
+        bot_module.register_handlers(app)
+
+        await app.initialize()
+        await bot_module.on_startup(app)
+        await app.start()
+
+        users = SimulatedUsers(app, fake_bot, timeout=args.timeout)
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*[
+                users.run_user(100_000 + i, "S10", args.ramp * i / args.users) for i in range(args.users)
+            ])
+            elapsed = time.perf_counter() - started
+        finally:
+            await app.stop()
+            await app.shutdown()
+            await bot_module.on_shutdown(app)
+
+    orders = len(users.latencies["order"])
+    print(f"users={args.users} ramp={args.ramp}s workers={args.workers} "
+          f"concurrent_updates={bot_module.update_processor.max_concurrent} upstream={args.latency}")
+    print(f"elapsed={elapsed:.2f}s orders={orders} throughput={orders / elapsed:.1f} orders/s")
+    print(f"{'step':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for step in STEPS:
+        values = users.latencies[step]
+        print(f"{step:<12} " + " ".join(
+            f"{percentile(values, pct) * 1000:7.0f}ms" for pct in (50, 95, 99, 100)
+        ))
+    print(f"outcomes={users.outcomes}")
+    print(f"upstream primary={primary.statuses} backup={backup.statuses} "
+          f"bad_signatures={primary.bad_signatures + backup.bad_signatures}")
+    print(f"telegram_calls={fake_bot.calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which users arrive")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5", help="Upstream latency spec, see benchmarks.stub")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--format", choices=["json", "pipe", "ok"], default="json")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--concurrent-updates", type=int, default=0,
+                        help="Updates handled at once; UPDATE_CONCURRENCY when 0")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Simulated Bot API round trip")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Load test: N concurrent orders against a slow local stub.
+
+With a non-blocking transport the whole batch should finish in roughly one
+upstream latency. A blocking client would need about N of them.
+
+Usage:
+    python -m benchmarks.load_concurrent_orders [--orders 50] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub import StubUpstream
+from services.omegatronik import OmegatronikService
+
+
+async def run(orders: int, latency: float) -> float:
+    async with StubUpstream(latency=latency) as stub:
+        service = OmegatronikService(
+            member_id="M0001", pin="1234", password="secret",
+            base_url=stub.base_url, backup_base_url=stub.base_url,
+            max_connections=orders
+        )
+        await service.start()
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*[
+                service.order_product(f"0812{i:08d}", "S10") for i in range(orders)
+            ])
+            elapsed = time.perf_counter() - started
+        finally:
+            await service.close()
+
+    failed = [r for r in results if not r["success"]]
+    print(f"orders={orders} latency={latency:.3f}s elapsed={elapsed:.3f}s "
+          f"ratio={elapsed / latency:.2f}x failed={len(failed)} "
+          f"upstream_connections={stub.connections}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    elapsed = asyncio.run(run(args.orders, args.latency))
+    if elapsed > args.latency * 3:
+        raise SystemExit(f"FAIL: {args.orders} orders took {elapsed:.2f}s, expected ~{args.latency:.2f}s")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Logging benchmark: per-order cost of upstream-call logging on the caller.
+
+Compares the old synchronous logging (seven f-string INFO lines per call,
+written inline by a StreamHandler) with the queue-based setup: one sampled
+INFO record, lazy DEBUG dumps, formatting and I/O in the listener thread.
+Times only what the event loop pays, writing to a temporary file.
+
+Usage:
+    python -m benchmarks.logging_overhead [--orders 20000]
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+import httpx
+
+from services.omegatronik import OmegatronikService
+from services.router import Endpoint
+from utils.log import setup_logging
+
+logger = logging.getLogger("services.omegatronik")
+
+
+def sample_exchange():
+    params = {
+        "memberID": "M0001", "pin": "1234", "password": "secret", "dest": "081234567890",
+        "product": "S10", "qty": "1", "refID": "173000000000000001", "sign": "x" * 27
+    }
+    response = httpx.Response(
+        200,
+        headers={"Content-Type": "application/json", "Server": "nginx", "Date": "Sun, 18 Oct 2026 01:00:00 GMT"},
+        text=json.dumps({"status": "success", "trx_id": "T1", "dest": "081234567890", "product": "S10",
+                         "price": 10150, "message": "Transaksi sukses"})
+    )
+    result = {"success": True, "data": {"trx_id": "T1"}}
+    return params, Endpoint("https://apiomega.id"), response, result
+
+
+def log_before(params, endpoint, response):
+    # The logging the service did before the queue-based setup
+    logger.info(f"=== ORDER REQUEST DEBUG ===")
+    logger.info(f"Params: {params}")
+    logger.info(f"Signature: {params['sign']}")
+    logger.info(f"=== ORDER RESPONSE DEBUG ===")
+    logger.info(f"Endpoint: {endpoint.base_url}")
+    logger.info(f"Status Code: {response.status_code}")
+    logger.info(f"Headers: {dict(response.headers)}")
+    logger.info(f"Response Content: {response.text}")
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+
+def measure(label, orders, call):
+    started = time.perf_counter()
+    for _ in range(orders):
+        call()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed / orders * 1e6:7.2f} us/order")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=20_000)
+    args = parser.parse_args()
+
+    service = OmegatronikService("M0001", "1234", "secret")
+    params, endpoint, response, result = sample_exchange()
+
+    with tempfile.TemporaryFile("w") as out:
+        reset_root()
+        logging.basicConfig(stream=out, level=logging.INFO,
+                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        measure("before: sync, 8 INFO lines", args.orders, lambda: log_before(params, endpoint, response))
+
+        for label, json_format, rate in [("after: queue, text, sample 10%", False, 0.1),
+                                         ("after: queue, json, sample 10%", True, 0.1),
+                                         ("after: queue, json, sample 100%", True, 1.0)]:
+            reset_root()
+            listener = setup_logging("INFO", json_format=json_format, sample_rate=rate, stream=out)
+            measure(label, args.orders,
+                    lambda: service._log_exchange("trx", params, endpoint, response, 0.042, result))
+            listener.stop()
+
+        reset_root()
+        listener = setup_logging("DEBUG", json_format=True, sample_rate=1.0, stream=out)
+        measure("after: queue, json, DEBUG dumps", args.orders,
+                lambda: service._log_exchange("trx", params, endpoint, response, 0.042, result))
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
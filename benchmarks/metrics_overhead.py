@@ -0,0 +1,92 @@
+"""
+Metrics benchmark: cost of recording on the hot path and of a scrape.
+
+Times Counter.inc, Histogram.observe and the handler timing decorator
+with realistic label sets, then renders a registry shaped like the bot's
+(three endpoints, two paths, five outcomes, a dozen handlers).
+
+Usage:
+    python -m benchmarks.metrics_overhead [--iterations 500000]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from utils.metrics import Counter, Histogram, Registry
+
+
+def per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=500_000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    requests = registry.register(Histogram("upstream_seconds", "Upstream latency", ("endpoint", "path", "outcome")))
+    failovers = registry.register(Counter("failovers_total", "Failovers", ("path", "endpoint")))
+    handlers = registry.register(Histogram("handler_seconds", "Handler time", ("handler",)))
+
+    endpoints = ["https://apiomega.id", "http://188.166.178.169:6969", "https://backup.example"]
+    paths = ["/trx", "/CekSaldo"]
+    outcomes = ["ok", "http_error", "timeout", "error", "abandoned"]
+    latencies = [random.expovariate(2.0) for _ in range(1024)]
+
+    def inc(n):
+        for _ in range(n):
+            failovers.inc("/trx", "http://188.166.178.169:6969")
+
+    def observe(n):
+        for i in range(n):
+            requests.observe(latencies[i & 1023], "https://apiomega.id", "/trx", "ok")
+
+    def baseline(n):
+        for i in range(n):
+            pass
+
+    @handlers.time("handle_callback")
+    async def handler():
+        pass
+
+    async def plain():
+        pass
+
+    async def run_handlers(fn, n):
+        started = time.perf_counter()
+        for _ in range(n):
+            await fn()
+        return (time.perf_counter() - started) / n
+
+    loop_cost = per_call(baseline, args.iterations)
+    print(f"counter.inc          {(per_call(inc, args.iterations) - loop_cost) * 1e9:6.0f} ns")
+    print(f"histogram.observe    {(per_call(observe, args.iterations) - loop_cost) * 1e9:6.0f} ns")
+
+    n = args.iterations // 5
+    timed = asyncio.run(run_handlers(handler, n))
+    untimed = asyncio.run(run_handlers(plain, n))
+    print(f"handler decorator    {(timed - untimed) * 1e9:6.0f} ns per update")
+
+    for endpoint in endpoints:
+        for path in paths:
+            for outcome in outcomes:
+                requests.observe(0.1, endpoint, path, outcome)
+    for i in range(12):
+        handlers.observe(0.01, f"handler_{i}")
+
+    async def scrape():
+        started = time.perf_counter()
+        text = await registry.render()
+        return text, time.perf_counter() - started
+
+    text, elapsed = asyncio.run(scrape())
+    print(f"render               {elapsed * 1000:6.2f} ms "
+          f"({len(text.splitlines())} lines, {len(text) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
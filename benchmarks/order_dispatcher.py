@@ -0,0 +1,75 @@
+"""
+Order dispatcher benchmark: sustained order throughput through the queue.
+
+Many users submit several orders each against a slow local stub. Reports
+orders per minute, how long submission takes (what the Telegram handler
+waits for), and checks that each user's orders ran in submission order.
+
+Usage:
+    python -m benchmarks.order_dispatcher [--users 100] [--per-user 5] [--workers 32]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub import StubUpstream
+from services.dispatcher import DispatcherFull, OrderDispatcher
+from services.omegatronik import OmegatronikService
+
+
+async def run(users: int, per_user: int, workers: int, latency: float) -> None:
+    async with StubUpstream(latency=latency) as stub:
+        service = OmegatronikService(
+            member_id="M0001", pin="1234", password="secret",
+            endpoints=[stub.base_url], max_connections=workers
+        )
+        dispatcher = OrderDispatcher(workers=workers, max_pending=users * per_user)
+        dispatcher.start()
+
+        completed = {user: [] for user in range(users)}
+
+        def make_job(user: int, seq: int):
+            async def job():
+                await service.order_product(f"0812{user:08d}", f"S{seq}")
+                completed[user].append(seq)
+            return job
+
+        submit_times = []
+        started = time.perf_counter()
+        for seq in range(per_user):
+            for user in range(users):
+                t0 = time.perf_counter()
+                dispatcher.submit(user, make_job(user, seq))
+                submit_times.append(time.perf_counter() - t0)
+
+        # Queue is exactly full now; one more submission must be refused
+        try:
+            dispatcher.submit(-1, make_job(-1, 0))
+            rejected = False
+        except DispatcherFull:
+            rejected = True
+
+        await dispatcher.stop(timeout=300)
+        elapsed = time.perf_counter() - started
+        await service.close()
+
+    total = users * per_user
+    ordered = all(seqs == list(range(per_user)) for seqs in completed.values())
+    print(f"orders={total} workers={workers} latency={latency}s elapsed={elapsed:.2f}s "
+          f"throughput={total / elapsed * 60:.0f}/min "
+          f"max_submit={max(submit_times) * 1e6:.0f}us per_user_order_kept={ordered} "
+          f"backpressure={rejected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.per_user, args.workers, args.latency))
+
+
+if __name__ == "__main__":
+    main()
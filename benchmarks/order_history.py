@@ -0,0 +1,129 @@
+"""
+Order history query cost as the table grows to a million rows.
+
+Fills an OrderHistory database in steps (10k, 100k, 1M orders by default)
+spread over many users, with one heavy user holding 1% of all orders. At
+each size it times the queries behind /riwayat: first page, a deep page
+reached by keyset cursor, lookup by refID and by trx_id. For comparison it
+also times the same deep page with LIMIT/OFFSET, which has to walk every
+skipped row. Query plans are printed to show which index is used.
+
+Usage:
+    python -m benchmarks.order_history [--sizes 10000,100000,1000000] [--users 10000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from services.history import OrderHistory
+from services.journal import OrderRecord, OrderState
+
+HEAVY_USER = 1
+
+
+def make_records(start: int, count: int, users: int, started_at: float) -> List[OrderRecord]:
+    records = []
+    for i in range(start, start + count):
+        # Every 100th order belongs to the heavy user
+        user_id = HEAVY_USER if i % 100 == 0 else 1000 + random.randrange(users)
+        record = OrderRecord(f"{1_700_000_000_000 + i:013d}00{i % 1000:03d}", OrderState.SUCCESS,
+                             started_at + i * 0.5)
+        record.user_id = record.chat_id = user_id
+        record.destination = f"0812{random.randrange(10**8):08d}"
+        record.product_code = random.choice(("S10", "S20", "I10", "X25", "PLN20"))
+        record.trx_id = f"T{i}"
+        record.price = 10_150
+        record.sn = f"{random.randrange(10**16):016d}"
+        record.message = "Transaksi sukses"
+        record.updated_at = record.created_at
+        records.append(record)
+    return records
+
+
+def timed(func: Callable, repeat: int) -> float:
+    """Median seconds per call"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=lambda value: [int(n) for n in value.split(",")],
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--page", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="order_history_"), "history.db")
+    history = OrderHistory(path)
+    loop = asyncio.new_event_loop()
+
+    def run_coroutine(coroutine_factory: Callable) -> Callable:
+        return lambda: loop.run_until_complete(coroutine_factory())
+
+    random.seed(1)
+    started_at = time.time() - max(args.sizes) * 0.5
+    filled = 0
+
+    print(f"users={args.users} page={args.page} (heavy user holds 1% of orders)")
+    print(f"{'rows':>9} {'insert/s':>9} {'first page':>11} {'deep page':>10} {'deep OFFSET':>12} "
+          f"{'by refID':>9} {'by trx_id':>10}")
+    previous = 0
+    for size in args.sizes:
+        insert_started = time.perf_counter()
+        while filled < size:
+            batch = min(50_000, size - filled)
+            history.import_records(make_records(filled, batch, args.users, started_at))
+            filled += batch
+        insert_elapsed = time.perf_counter() - insert_started
+
+        heavy_orders = filled // 100
+        # Cursor halfway through the heavy user's history (newest first)
+        cursor = history._db.execute(
+            "SELECT ref_id FROM orders WHERE user_id = ? ORDER BY created_at DESC, ref_id DESC LIMIT 1 OFFSET ?",
+            (HEAVY_USER, heavy_orders // 2)
+        ).fetchone()[0]
+        ref_ids = [f"{1_700_000_000_000 + i:013d}00{i % 1000:03d}" for i in random.sample(range(filled), 1000)]
+        trx_ids = [f"T{i}" for i in random.sample(range(filled), 1000)]
+        users = [1000 + random.randrange(args.users) for _ in range(1000)]
+
+        first = timed(run_coroutine(lambda: history.page(random.choice(users), limit=args.page)), args.repeat)
+        deep = timed(run_coroutine(lambda: history.page(HEAVY_USER, before=cursor, limit=args.page)), args.repeat)
+        offset = timed(lambda: history._db.execute(
+            "SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC, ref_id DESC LIMIT ? OFFSET ?",
+            (HEAVY_USER, args.page, heavy_orders // 2)
+        ).fetchall(), max(5, args.repeat // 20))
+        by_ref = timed(run_coroutine(lambda: history.get(random.choice(ref_ids))), args.repeat)
+        by_trx = timed(run_coroutine(lambda: history.get(random.choice(trx_ids))), args.repeat)
+
+        inserted, previous = filled - previous, filled
+        print(f"{filled:>9} {inserted / insert_elapsed:>9.0f} {first * 1e6:>9.0f}µs {deep * 1e6:>8.0f}µs "
+              f"{offset * 1e6:>10.0f}µs {by_ref * 1e6:>7.0f}µs {by_trx * 1e6:>8.0f}µs")
+
+    print("\nQuery plans:")
+    for label, sql, params in (
+        ("first page", "SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC, ref_id DESC LIMIT 6",
+         (HEAVY_USER,)),
+        ("deep page", "SELECT * FROM orders WHERE user_id = ? AND (created_at, ref_id) < "
+         "(SELECT created_at, ref_id FROM orders WHERE ref_id = ?) ORDER BY created_at DESC, ref_id DESC LIMIT 6",
+         (HEAVY_USER, cursor)),
+        ("by trx_id", "SELECT * FROM orders WHERE trx_id = ? LIMIT 1", ("T1",)),
+    ):
+        plan = history._db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        print(f"  {label:<11} " + "; ".join(row[-1] for row in plan))
+    history.close()
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Order scheduler: idle cost of 100k schedules, burst spreading and restart catch-up.
+
+Idle: ``--schedules`` schedules due tomorrow are loaded and the process
+sits idle for ``--idle`` seconds. CPU time and memory are compared with one
+sleeping asyncio task per schedule and with a loop that scans every
+schedule once a second.
+
+Burst: ``--burst`` schedules all due at the same second, as at 00:00 on the
+1st, fire through the scheduler with and without jitter; the peak fires per
+second is what the upstream sees.
+
+Catch-up: a store with runs missed an hour ago and three days ago is
+started twice. Each recent run must fire exactly once across both starts;
+the old ones are skipped and reported.
+
+Usage:
+    python -m benchmarks.order_scheduler [--schedules 100000] [--idle 5] [--burst 10000] [--jitter 10]
+"""
+import argparse
+import asyncio
+import collections
+import os
+import tempfile
+import time
+import tracemalloc
+
+from services.schedules import OrderScheduler, Schedule, ScheduleStore
+
+DAY = 86400
+
+
+def fill_store(path: str, count: int, next_due: float, repeat: str = 'daily') -> ScheduleStore:
+    store = ScheduleStore(path)
+    now = time.time()
+    with store._db:
+        store._db.execute("BEGIN")
+        for i in range(count):
+            store.add(Schedule(
+                user_id=i, chat_id=i, destination=f"0812{i:08d}", product_code="S10",
+                repeat=repeat, day=None, at=time.strftime('%H:%M', time.gmtime(next_due + 7 * 3600)),
+                date=None, next_due=next_due, created_at=now
+            ))
+    return store
+
+
+async def idle_cpu(seconds: float) -> float:
+    started = time.process_time()
+    await asyncio.sleep(seconds)
+    return (time.process_time() - started) / seconds * 100
+
+
+async def run_idle(args, directory: str) -> None:
+    due = time.time() + DAY
+    store = fill_store(os.path.join(directory, "idle.db"), args.schedules, due)
+
+    async def fire(schedule):
+        return None
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    scheduler = OrderScheduler(store, fire)
+    await scheduler.start()
+    load = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    cpu = await idle_cpu(args.idle)
+    print(f"{'heap timer':<22} load={load:5.2f}s  memory={memory / 2 ** 20:6.1f} MiB  idle cpu={cpu:5.2f}%")
+    schedules = list(scheduler._schedules.values())
+    await scheduler.stop()
+    tracemalloc.stop()
+
+    # One sleeping task per schedule
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    async def wait(schedule):
+        await asyncio.sleep(schedule.next_due - time.time())
+
+    tasks = [asyncio.create_task(wait(schedule)) for schedule in schedules]
+    await asyncio.sleep(0)
+    load = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    cpu = await idle_cpu(args.idle)
+    print(f"{'task per schedule':<22} load={load:5.2f}s  memory={memory / 2 ** 20:6.1f} MiB  idle cpu={cpu:5.2f}%")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    tracemalloc.stop()
+
+    # Scan everything once a second
+    async def scan():
+        while True:
+            now = time.time()
+            for schedule in schedules:
+                if schedule.next_due <= now:
+                    pass
+            await asyncio.sleep(1)
+
+    task = asyncio.create_task(scan())
+    cpu = await idle_cpu(args.idle)
+    print(f"{'scan every second':<22} {'':<34} idle cpu={cpu:5.2f}%")
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    store.close()
+
+
+async def run_burst(args, directory: str, jitter: float, fire_rate: float) -> None:
+    due = time.time() + 1
+    store = fill_store(os.path.join(directory, f"burst_{jitter:g}_{fire_rate:g}.db"), args.burst, due)
+    fired = []
+
+    async def fire(schedule):
+        fired.append(time.time())
+        return None
+
+    scheduler = OrderScheduler(store, fire, jitter=jitter, fire_rate=fire_rate)
+    await scheduler.start()
+    deadline = due + jitter + args.burst / fire_rate + 30
+    while len(fired) < args.burst and time.time() < deadline:
+        await asyncio.sleep(0.2)
+    await scheduler.stop()
+    store.close()
+
+    per_second = collections.Counter(int(t - due) for t in fired)
+    print(f"jitter={jitter:>4g}s rate={fire_rate:>6g}/s  fired={len(fired)}/{args.burst} "
+          f"peak={max(per_second.values()):6d}/s  spread={max(fired) - min(fired):5.1f}s "
+          f"first={min(fired) - due:+.2f}s")
+
+
+async def run_catch_up(args, directory: str) -> None:
+    now = time.time()
+    path = os.path.join(directory, "catch_up.db")
+    store = fill_store(path, args.catch_up, now - 3600)
+    recent = {schedule.id for schedule in store.load()}
+    with store._db:
+        store._db.execute("BEGIN")
+        for i in range(args.catch_up):
+            store.add(Schedule(
+                user_id=i, chat_id=i, destination=f"0813{i:08d}", product_code="S10",
+                repeat='daily', day=None, at='00:00', date=None, next_due=now - 3 * DAY, created_at=now
+            ))
+    store.close()
+
+    fires = collections.Counter()
+    missed = collections.Counter()
+
+    async def fire(schedule):
+        fires[schedule.id] += 1
+        return None
+
+    async def on_missed(schedule, due):
+        missed[schedule.id] += 1
+
+    for attempt in (1, 2):
+        store = ScheduleStore(path)
+        scheduler = OrderScheduler(store, fire, on_missed=on_missed, jitter=2, fire_rate=10_000)
+        started = time.perf_counter()
+        await scheduler.start()
+        while sum(fires.values()) < len(recent) and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+        future = all(s.next_due > time.time() for s in store.load())
+        store.close()
+        print(f"start {attempt}: fired={sum(fires.values())} missed={sum(missed.values())} all next runs ahead={future}")
+
+    once = all(fires[i] == 1 for i in recent) and len(fires) == len(recent)
+    reported = len(missed) == args.catch_up and all(count == 1 for count in missed.values())
+    print(f"recent runs fired exactly once: {once}; old runs skipped and reported once: {reported}")
+
+
+async def run(args) -> None:
+    directory = tempfile.mkdtemp(prefix="schedules_")
+    print(f"schedules={args.schedules} idle={args.idle}s")
+    await run_idle(args, directory)
+    print(f"\nburst of {args.burst} due at the same second")
+    await run_burst(args, directory, jitter=0, fire_rate=1_000_000)
+    await run_burst(args, directory, jitter=args.jitter, fire_rate=1_000_000)
+    await run_burst(args, directory, jitter=args.jitter, fire_rate=args.burst / args.jitter / 2)
+    print(f"\nrestart catch-up, {args.catch_up} runs missed 1h ago and {args.catch_up} 3 days ago")
+    await run_catch_up(args, directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--schedules", type=int, default=100_000)
+    parser.add_argument("--idle", type=float, default=5.0, help="Seconds idle CPU is measured over")
+    parser.add_argument("--burst", type=int, default=10_000)
+    parser.add_argument("--jitter", type=float, default=10.0)
+    parser.add_argument("--catch-up", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
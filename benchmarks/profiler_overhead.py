@@ -0,0 +1,83 @@
+"""
+Profiler overhead: order-path work per second with each admin profiling tool on.
+
+Concurrent coroutines repeat what the bot does per order in Python:
+classify the destination, sign the request and parse the reply, with an
+await between steps. The rate is measured with nothing active (as in
+production), during a sampling profile, during a cProfile run and with
+tracemalloc tracing. The first row is the baseline; the admin commands
+install nothing until they are used.
+
+Usage:
+    python -m benchmarks.profiler_overhead [--seconds 3] [--tasks 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from services.destination import classify_destination
+from services.parser import order_result
+from utils.profiling import MemoryTracker, SamplingProfiler, profile_calls
+from utils.signature import SigningContext
+
+REPLY = json.dumps({"status": "success", "trx_id": "T1", "dest": "081234567890", "product": "S10",
+                    "price": 10150, "message": "Transaksi sukses"})
+
+
+async def workload(seconds: float, tasks: int) -> float:
+    signer = SigningContext("M0001", "1234", "secret")
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(n: int) -> None:
+        nonlocal done
+        i = 0
+        while time.perf_counter() < deadline:
+            destination = classify_destination(f"0812{n:04d}{i:04d}")
+            await asyncio.sleep(0)
+            signer.sign_order(destination.number, "S10", str(i))
+            await asyncio.sleep(0)
+            order_result(REPLY)
+            done += 1
+            i += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(n) for n in range(tasks)])
+    return done / (time.perf_counter() - started)
+
+
+async def run(args) -> None:
+    await workload(1.0, args.tasks)  # warm up caches and the allocator
+    baseline = await workload(args.seconds, args.tasks)
+    print(f"{'nothing active':<20} {baseline:9.0f} orders/s")
+
+    sampler = SamplingProfiler(interval=args.interval)
+    rate, _ = await asyncio.gather(workload(args.seconds, args.tasks), sampler.run(args.seconds))
+    print(f"{'sampling profile':<20} {rate:9.0f} orders/s  {rate / baseline - 1:+6.1%}  "
+          f"samples={sampler.samples} top={sampler.top(1)[0][0]}")
+
+    rate, _ = await asyncio.gather(workload(args.seconds, args.tasks), profile_calls(args.seconds))
+    print(f"{'cProfile':<20} {rate:9.0f} orders/s  {rate / baseline - 1:+6.1%}")
+
+    tracker = MemoryTracker()
+    tracker.start()
+    rate = await workload(args.seconds, args.tasks)
+    tracker.stop()
+    print(f"{'tracemalloc':<20} {rate:9.0f} orders/s  {rate / baseline - 1:+6.1%}")
+
+    after = await workload(args.seconds, args.tasks)
+    print(f"{'nothing active again':<20} {after:9.0f} orders/s  {after / baseline - 1:+6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.005, help="Sampling interval")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
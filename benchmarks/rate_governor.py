@@ -0,0 +1,232 @@
+"""
+Outbound Bot API traffic against simulated Telegram flood limits.
+
+A fake ``BaseRequest`` stands in for api.telegram.org and enforces its
+published limits: about one message per second per chat (with a short
+burst) and 30 per second overall. Requests over the limit get a 429 with
+``retry_after``, like the real API. Each simulated chat produces the bursty
+traffic the bot generates: a reply, a few menu redraws, an order result
+and a stream of bulk-progress edits of one message.
+
+The same load is sent three ways: unthrottled, with a limiter that only
+reacts to 429s by waiting and retrying, and through TelegramRateGovernor.
+The run reports 429s, requests that failed for the caller, requests that
+actually reached the API, and latency per kind of message.
+
+Usage:
+    python -m benchmarks.rate_governor [--chats 200] [--progress-edits 10]
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ExtBot
+from telegram.request import BaseRequest, RequestData
+
+from services.governor import TelegramRateGovernor
+from utils.ratelimit import Priority
+
+TOKEN = "123456:GOVERNOR"
+
+
+class _Limit:
+    """Strict token bucket used by the fake API to decide on 429s"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """0 when a token was taken, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Answers Bot API calls locally and enforces per-chat and global flood limits"""
+
+    def __init__(self, latency: float = 0.03, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 global_rate: float = 30.0):
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_limit = _Limit(global_rate, global_rate)
+        self.chat_limits: Dict[int, _Limit] = {}
+        self.sent: Dict[str, int] = {}
+        self.flooded = 0
+        self.texts: Dict[Tuple[int, int], str] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        await asyncio.sleep(self.latency)
+
+        if endpoint == "getMe":
+            return 200, json.dumps({"ok": True, "result": {
+                "id": 123456, "is_bot": True, "first_name": "Governor", "username": "governor_bot"
+            }}).encode()
+
+        chat_id = int(params["chat_id"])
+        limit = self.chat_limits.setdefault(chat_id, _Limit(self.chat_rate, self.chat_burst))
+        wait = limit.take() or self.global_limit.take()
+        if wait:
+            self.flooded += 1
+            retry_after = max(1, math.ceil(wait))
+            return 429, json.dumps({
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }).encode()
+
+        self.sent[endpoint] = self.sent.get(endpoint, 0) + 1
+        message_id = int(params.get("message_id") or 1000 + self.sent[endpoint])
+        self.texts[(chat_id, message_id)] = params.get("text", "")
+        return 200, json.dumps({"ok": True, "result": {
+            "message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+            "chat": {"id": chat_id, "type": "private"},
+        }}).encode()
+
+
+class RetryOnlyLimiter(BaseRateLimiter[int]):
+    """Baseline that sends everything at once and only reacts to 429s"""
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        for attempt in range(3):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == 2:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+
+class Workload:
+    """Per-chat burst of replies, menu redraws, an order result and progress edits"""
+
+    KINDS = ("reply", "menu", "result", "progress")
+
+    def __init__(self, bot: ExtBot, governed: bool, progress_edits: int):
+        self.bot = bot
+        self.governed = governed
+        self.progress_edits = progress_edits
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in self.KINDS}
+        self.failed: Dict[str, int] = {kind: 0 for kind in self.KINDS}
+
+    def _priority(self, priority: Priority) -> dict:
+        return {"rate_limit_args": priority} if self.governed else {}
+
+    async def _timed(self, kind: str, call) -> None:
+        started = time.perf_counter()
+        try:
+            await call
+        except RetryAfter:
+            self.failed[kind] += 1
+            return
+        self.latencies[kind].append(time.perf_counter() - started)
+
+    async def chat(self, chat_id: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        bot = self.bot
+        calls = [
+            self._timed("reply", bot.send_message(chat_id, "👋 Selamat datang")),
+            self._timed("menu", bot.edit_message_text("Menu 1", chat_id=chat_id, message_id=1)),
+            self._timed("menu", bot.edit_message_text("Menu 2", chat_id=chat_id, message_id=1)),
+            self._timed("result", bot.edit_message_text(
+                "✅ Order Berhasil!", chat_id=chat_id, message_id=2, **self._priority(Priority.HIGH)
+            )),
+        ]
+
+        async def progress() -> None:
+            for done in range(1, self.progress_edits + 1):
+                await asyncio.sleep(0.1)
+                asyncio.ensure_future(self._timed("progress", bot.edit_message_text(
+                    f"⏳ Bulk order: {done}/{self.progress_edits} selesai", chat_id=chat_id, message_id=3,
+                    **self._priority(Priority.LOW)
+                )))
+
+        await asyncio.gather(*calls, progress())
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(mode: str, args) -> None:
+    fake = FakeTelegramRequest(latency=args.latency)
+    limiter = {"none": None, "retry-only": RetryOnlyLimiter(), "governor": TelegramRateGovernor()}[mode]
+    bot = ExtBot(TOKEN, request=fake, get_updates_request=FakeTelegramRequest(), rate_limiter=limiter)
+    workload = Workload(bot, governed=mode == "governor", progress_edits=args.progress_edits)
+
+    async with bot:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            workload.chat(10_000 + i, args.ramp * i / args.chats) for i in range(args.chats)
+        ])
+        # Progress edits are fire-and-forget; wait until they settle
+        expected = args.chats * args.progress_edits
+        while len(workload.latencies["progress"]) + workload.failed["progress"] < expected:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+    final_progress = sum(
+        1 for i in range(args.chats)
+        if fake.texts.get((10_000 + i, 3), "").startswith(f"⏳ Bulk order: {args.progress_edits}/")
+    )
+    print(f"\n[{mode}] elapsed={elapsed:.1f}s api_calls={sum(fake.sent.values())} "
+          f"http_429={fake.flooded} failed={sum(workload.failed.values())} "
+          f"final_progress_shown={final_progress}/{args.chats}")
+    print(f"  {'kind':<9} {'ok':>6} {'failed':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for kind in Workload.KINDS:
+        values = workload.latencies[kind]
+        print(f"  {kind:<9} {len(values):>6} {workload.failed[kind]:>6} " + " ".join(
+            f"{percentile(values, pct):7.2f}s" for pct in (50, 95, 100)
+        ))
+
+
+async def run(args) -> None:
+    print(f"chats={args.chats} ramp={args.ramp}s progress_edits={args.progress_edits} "
+          f"api_latency={args.latency * 1000:.0f}ms limits: 1/s per chat (burst 3), 30/s global")
+    for mode in args.modes:
+        await run_mode(mode, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which chats start")
+    parser.add_argument("--progress-edits", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.03, help="Simulated Bot API round trip")
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["none", "retry-only", "governor"])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
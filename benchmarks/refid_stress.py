@@ -0,0 +1,76 @@
+"""
+refID stress test: concurrent allocations never collide.
+
+Issues allocations from many threads and asyncio tasks at once, then
+checks every refID is unique, each caller saw strictly increasing IDs,
+and a restarted allocator (same state file, clock set back) continues
+above everything issued before.
+
+Usage:
+    python -m benchmarks.refid_stress [--allocations 10000] [--threads 16]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from utils.refid import RefIdAllocator
+
+
+def check_threads(allocator: RefIdAllocator, allocations: int, threads: int) -> list:
+    per_thread = allocations // threads
+
+    def worker(_):
+        return [allocator.next() for _ in range(per_thread)]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        batches = list(pool.map(worker, range(threads)))
+
+    for batch in batches:
+        assert all(int(a) < int(b) for a, b in zip(batch, batch[1:])), "IDs went backwards within a thread"
+    return [ref for batch in batches for ref in batch]
+
+
+async def check_tasks(allocator: RefIdAllocator, allocations: int) -> list:
+    async def one():
+        await asyncio.sleep(0)
+        return allocator.next()
+    return await asyncio.gather(*[one() for _ in range(allocations)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--allocations", type=int, default=10_000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state = os.path.join(tmp, "refid.state")
+        allocator = RefIdAllocator(node_id=3, state_path=state)
+
+        started = time.perf_counter()
+        from_threads = check_threads(allocator, args.allocations, args.threads)
+        from_tasks = asyncio.run(check_tasks(allocator, args.allocations))
+        elapsed = time.perf_counter() - started
+
+        issued = from_threads + from_tasks
+        assert len(set(issued)) == len(issued), f"{len(issued) - len(set(issued))} collisions"
+        assert all(RefIdAllocator.node_of(ref) == 3 for ref in issued)
+
+        # Restart with the wall clock ten minutes behind
+        highest = max(int(ref) for ref in issued)
+        behind = time.time_ns() - 600 * 10**9
+        with mock.patch("utils.refid.time.time_ns", return_value=behind):
+            restarted = RefIdAllocator(node_id=3, state_path=state)
+            after_restart = [int(restarted.next()) for _ in range(1000)]
+        assert min(after_restart) > highest, "restart reissued an old refID"
+
+    print(f"allocations={len(issued)} unique=True threads={args.threads} "
+          f"rate={len(issued) / elapsed:,.0f}/s restart_monotonic=True")
+
+
+if __name__ == "__main__":
+    main()
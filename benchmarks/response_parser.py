@@ -0,0 +1,54 @@
+"""
+Response parser benchmark: correctness and cost over a captured-reply corpus.
+
+Checks every entry of ``benchmarks/corpus/responses.json`` against its
+expected result dict, then times parsing per entry. Exits non-zero when any
+entry parses differently, so it doubles as a regression check.
+
+Usage:
+    python -m benchmarks.response_parser [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from services.parser import balance_result, order_result
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "responses.json")
+PARSERS = {"balance": balance_result, "order": order_result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    failures = 0
+    for entry in corpus:
+        result = PARSERS[entry["endpoint"]](entry["body"])
+        if result != entry["expect"]:
+            failures += 1
+            print(f"MISMATCH {entry['name']}\n  got      {result}\n  expected {entry['expect']}")
+    print(f"corpus   {len(corpus) - failures}/{len(corpus)} entries match")
+
+    total = 0.0
+    for entry in corpus:
+        parse, body = PARSERS[entry["endpoint"]], entry["body"]
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            parse(body)
+        elapsed = (time.perf_counter() - started) / args.iterations
+        total += elapsed
+        print(f"  {entry['name']:<38} {elapsed * 1e6:6.2f} us")
+    print(f"mean     {total / len(corpus) * 1e6:.2f} us per reply")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
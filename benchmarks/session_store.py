@@ -0,0 +1,89 @@
+"""
+Session store benchmark: memory per session and lookup cost.
+
+Compares the old dict-of-dicts ``user_sessions`` with the slotted
+MemorySessionStore, and measures lookups on the SQLite backend.
+
+Usage:
+    python -m benchmarks.session_store [--sessions 100000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from services.sessions import MemorySessionStore, SQLiteSessionStore, Session, SessionState
+
+
+def measure_memory(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holder = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del holder
+    return after - before
+
+
+async def fill(store, count: int) -> None:
+    for user_id in range(count):
+        session = Session(SessionState.WAITING_PRODUCT_CODE, f"0812{user_id:08d}")
+        await store.set(user_id, session)
+
+
+async def lookup_cost(store, count: int, lookups: int) -> float:
+    keys = [random.randrange(count) for _ in range(lookups)]
+    started = time.perf_counter()
+    for key in keys:
+        await store.get(key)
+    return (time.perf_counter() - started) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.sessions
+
+    def build_dicts():
+        return {
+            user_id: {'state': 'waiting_product_code', 'destination': f"0812{user_id:08d}"}
+            for user_id in range(n)
+        }
+
+    def build_store():
+        store = MemorySessionStore(ttl=900)
+        asyncio.run(fill(store, n))
+        return store
+
+    legacy = measure_memory(build_dicts)
+    slotted = measure_memory(build_store)
+    print(f"memory  dict-of-dicts     {legacy / n:7.1f} B/session  ({legacy / 2**20:.1f} MiB total)")
+    print(f"memory  MemorySessionStore {slotted / n:6.1f} B/session  ({slotted / 2**20:.1f} MiB total)")
+
+    async def lookups():
+        memory = MemorySessionStore(ttl=900)
+        await fill(memory, n)
+        cost = await lookup_cost(memory, n, args.lookups)
+        print(f"lookup  memory  {cost * 1e9:8.0f} ns/op at {n} sessions")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite = SQLiteSessionStore(os.path.join(tmp, "sessions.db"), ttl=900)
+            sqlite._db.execute("BEGIN")
+            await fill(sqlite, n)
+            sqlite._db.execute("COMMIT")
+            cost = await lookup_cost(sqlite, n, min(args.lookups, 50_000))
+            print(f"lookup  sqlite  {cost * 1e9:8.0f} ns/op at {n} sessions")
+            await sqlite.close()
+
+    asyncio.run(lookups())
+
+
+if __name__ == "__main__":
+    main()
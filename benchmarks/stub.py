@@ -0,0 +1,323 @@
+"""
+Local stand-in for the Omega Tronik H2H API.
+
+Speaks just enough HTTP/1.1 (with keep-alive) to answer ``/CekSaldo`` and
+``/trx`` so benchmarks can run without touching apiomega.id. Latency is a
+fixed delay or a distribution, and a share of requests can be failed with
+HTTP 500, business errors or hangs. Replies come as JSON, pipe-delimited
+text or a bare ``OK``. With credentials set, signatures are checked exactly
+like the real API, and a repeated refID returns the original order's
+result instead of a new transaction. Several accounts can be served at
+once, each with its own balance and request rate limit (HTTP 429).
+
+Run standalone as a primary and backup pair:
+
+    python -m benchmarks.stub --port 6968 --backup-port 6969 \\
+        --latency lognormal:0.2:0.5 --error-rate 0.01 --format json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit, parse_qs
+
+from utils.signature import generate_order_signature, generate_signature
+
+
+Latency = Union[float, Callable[[], float]]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Build a latency source from a spec string
+
+    Forms: ``0.2`` (fixed), ``uniform:LOW:HIGH``, ``exp:MEAN``,
+    ``lognormal:MEDIAN:SIGMA`` (long tail, like a loaded upstream) and
+    ``bimodal:FAST:SLOW:SLOW_SHARE``.
+    """
+    kind, _, rest = spec.partition(':')
+    if not rest:
+        return float(kind)
+    args = [float(value) for value in rest.split(':')]
+    if kind == 'uniform':
+        low, high = args
+        return lambda: random.uniform(low, high)
+    if kind == 'exp':
+        mean, = args
+        return lambda: random.expovariate(1 / mean)
+    if kind == 'lognormal':
+        median, sigma = args
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    if kind == 'bimodal':
+        fast, slow, share = args
+        return lambda: slow if random.random() < share else fast
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubUpstream:
+    """Async HTTP stub that answers balance and order requests"""
+
+    def __init__(self, latency: Latency = 0.5, host: str = "127.0.0.1", port: int = 0,
+                 error_rate: float = 0.0, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang: float = 120.0,
+                 body_format: str = "json", order_status: str = "success",
+                 member_id: Optional[str] = None, pin: Optional[str] = None,
+                 password: Optional[str] = None, balance: int = 10**12, price: int = 5000,
+                 accounts: Optional[Dict[str, Tuple[str, str, int]]] = None,
+                 account_rate_limit: float = 0.0):
+        """
+        Initialize stub
+
+        Args:
+            latency: Seconds per request, or a function returning them
+            host: Listen address
+            port: Listen port, 0 picks a free one
+            error_rate: Share of requests answered with HTTP 500
+            failure_rate: Share of orders answered with a business failure
+            hang_rate: Share of requests held for ``hang`` seconds
+            hang: Delay of hung requests
+            body_format: "json", "pipe" or "ok"; "pipe" only applies to
+                /CekSaldo, orders are answered in JSON as pipe replies are
+                not accepted as order results
+            order_status: Status of successful JSON orders ("success" or "pending")
+            member_id: With pin and password, check request signatures
+            pin: Transaction PIN for signature checks
+            password: API password for signature checks
+            balance: Balance reported by /CekSaldo; each accepted order is deducted
+            price: Price charged per order
+            accounts: More accounts as {member_id: (pin, password, balance)},
+                checked and charged separately from the one above
+            account_rate_limit: Requests per second allowed per member ID;
+                more are answered with HTTP 429. 0 for no limit.
+        """
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang = hang
+        self.body_format = body_format
+        self.order_status = order_status
+        self.credentials = (member_id, pin, password) if member_id else None
+        self.balance = balance
+        self.price = price
+        self.accounts = {member: (pin, password) for member, (pin, password, _) in (accounts or {}).items()}
+        self.balances = {member: balance for member, (_, _, balance) in (accounts or {}).items()}
+        self.account_rate_limit = account_rate_limit
+
+        self.requests = 0
+        self.connections = 0
+        self.statuses: Dict[int, int] = {}
+        self.paths: Dict[str, int] = {}
+        self.bad_signatures = 0
+        self.orders_by_account: Dict[str, int] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._orders: Dict[tuple, tuple] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "StubUpstream":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def delay(self) -> float:
+        """Seconds to wait before answering the next request"""
+        if self.hang_rate and random.random() < self.hang_rate:
+            return self.hang
+        return self.latency() if callable(self.latency) else self.latency
+
+    def signature_ok(self, path: str, params: dict) -> bool:
+        member_id = params.get("memberID")
+        if member_id in self.accounts:
+            pin, password = self.accounts[member_id]
+        elif self.credentials is None:
+            return True
+        elif member_id != self.credentials[0]:
+            return False
+        else:
+            _, pin, password = self.credentials
+        if path == "/CekSaldo":
+            expected = generate_signature(member_id, pin, password)
+        else:
+            expected = generate_order_signature(
+                member_id, pin, password, params.get("dest", ""), params.get("product", ""),
+                params.get("refID", "")
+            )
+        return params.get("sign") == expected
+
+    def respond(self, path: str, params: dict) -> tuple:
+        """Build ``(status_code, body)`` for a request"""
+        if path not in ("/CekSaldo", "/trx"):
+            return 404, "Not Found"
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, "Internal Server Error"
+        if not self.signature_ok(path, params):
+            self.bad_signatures += 1
+            return 200, "Invalid signature"
+        if not self._take_token(params.get("memberID", "")):
+            return 429, "Too Many Requests"
+
+        if path == "/CekSaldo":
+            return 200, self._balance_body(params.get("memberID"))
+
+        # The real API answers a repeated refID of an account with the original transaction
+        key = (params.get("memberID"), params.get("refID", ""))
+        if key[1] and key in self._orders:
+            return self._orders[key]
+        reply = 200, self._order_body(params)
+        if key[1]:
+            self._orders[key] = reply
+        return reply
+
+    def _take_token(self, member_id: str) -> bool:
+        """Token bucket per member ID, one second of burst"""
+        if not self.account_rate_limit:
+            return True
+        now = time.monotonic()
+        tokens, last = self._buckets.get(member_id, (self.account_rate_limit, now))
+        tokens = min(self.account_rate_limit, tokens + (now - last) * self.account_rate_limit)
+        if tokens < 1:
+            self._buckets[member_id] = (tokens, now)
+            return False
+        self._buckets[member_id] = (tokens - 1, now)
+        return True
+
+    def balance_of(self, member_id: Optional[str]) -> int:
+        return self.balances[member_id] if member_id in self.balances else self.balance
+
+    def _charge(self, member_id: Optional[str]) -> None:
+        if member_id in self.balances:
+            self.balances[member_id] -= self.price
+        else:
+            self.balance -= self.price
+
+    def _balance_body(self, member_id: Optional[str] = None) -> str:
+        balance = self.balance_of(member_id)
+        if self.body_format == "pipe":
+            return f"20|{balance}|Saldo Rp {balance:,}"
+        if self.body_format == "ok":
+            return "OK"
+        return json.dumps({"status": "success", "balance": balance})
+
+    def _order_body(self, params: dict) -> str:
+        ref_id = params.get("refID", "")
+        member_id = params.get("memberID")
+        failed = self.failure_rate and random.random() < self.failure_rate
+        if not failed and self.balance_of(member_id) < self.price:
+            if self.body_format == "ok":
+                return "Error: saldo tidak cukup"
+            return json.dumps({"status": "failed", "message": "Saldo tidak cukup"})
+        if not failed:
+            self._charge(member_id)
+            self.orders_by_account[member_id] = self.orders_by_account.get(member_id, 0) + 1
+        if self.body_format == "ok":
+            return "Error: produk gangguan" if failed else "OK"
+        if failed:
+            return json.dumps({"status": "failed", "message": "Produk sedang gangguan"})
+        return json.dumps({
+            "status": self.order_status,
+            "trx_id": f"T{ref_id}",
+            "dest": params.get("dest"),
+            "product": params.get("product"),
+            "product_name": params.get("product"),
+            "price": self.price,
+            "message": "Transaksi sukses"
+        })
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                # Drain headers; GET requests carry no body
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                url = urlsplit(target)
+                params = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                self.requests += 1
+                self.paths[url.path] = self.paths.get(url.path, 0) + 1
+
+                await asyncio.sleep(self.delay())
+                status, body = self.respond(url.path, params)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                payload = body.encode()
+                content_type = "application/json" if body[:1] == "{" else "text/plain"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args) -> None:
+    options = dict(
+        latency=parse_latency(args.latency), host=args.host, error_rate=args.error_rate,
+        failure_rate=args.failure_rate, hang_rate=args.hang_rate, body_format=args.format,
+        order_status=args.order_status, member_id=args.member_id, pin=args.pin, password=args.password
+    )
+    stubs = [StubUpstream(port=args.port, **options)]
+    if args.backup_port:
+        stubs.append(StubUpstream(port=args.backup_port, **options))
+    for stub in stubs:
+        await stub.start()
+        print(f"Stub listening on {stub.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for stub in stubs:
+            await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Omega Tronik API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6968)
+    parser.add_argument("--backup-port", type=int, default=0)
+    parser.add_argument("--latency", default="0.2", help="0.2, uniform:A:B, exp:MEAN, lognormal:MEDIAN:SIGMA, bimodal:FAST:SLOW:SHARE")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--format", choices=["json", "pipe", "ok"], default="json")
+    parser.add_argument("--order-status", choices=["success", "pending"], default="success")
+    parser.add_argument("--member-id")
+    parser.add_argument("--pin")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
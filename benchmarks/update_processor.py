@@ -0,0 +1,145 @@
+"""
+Update throughput and ordering with many active chats, per update processor.
+
+Updates go through a real Application's update queue to a handler that
+awaits 0.2-1.8x ``--latency`` seconds, like a handler waiting on the
+upstream or the Bot API. It records the order it saw each chat's messages
+in and whether two of one chat's updates ran at the same time. Three
+processors are compared:
+
+- sequential: PTB's default, one update at a time
+- concurrent: PTB's ``concurrent_updates(N)``, no ordering per chat
+- per-chat: :class:`ChatUpdateProcessor` with the same cap
+
+The first run has ``--chats`` chats sending ``--per-chat`` messages each.
+The second adds one noisy chat that sends ``--flood`` messages at once
+before the others; the quiet chats' latency and completion time show
+whether it starves them. The noisy chat itself can only go one update at
+a time with per-chat ordering.
+
+Usage:
+    python -m benchmarks.update_processor [--chats 200] [--per-chat 5] [--latency 0.05] [--cap 32]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, List
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, SimpleUpdateProcessor, filters
+
+from benchmarks.load_bot import FakeBot, percentile
+from services.updates import ChatUpdateProcessor
+
+NOISY_CHAT = 1
+
+
+def make_processor(name: str, cap: int):
+    if name == "sequential":
+        return SimpleUpdateProcessor(1)
+    if name == "concurrent":
+        return SimpleUpdateProcessor(cap)
+    return ChatUpdateProcessor(max_concurrent=cap)
+
+
+async def run_case(name: str, args, flood: int) -> None:
+    bot = FakeBot()
+    processor = make_processor(name, args.cap)
+    app = Application.builder().bot(bot).updater(None).concurrent_updates(processor).build()
+
+    seen: Dict[int, List[int]] = {}
+    sent_at: Dict[int, float] = {}
+    latencies: Dict[bool, List[float]] = {True: [], False: []}
+    active: Dict[int, int] = {}
+    overlaps = 0
+    quiet_done = 0.0
+    done = asyncio.Event()
+    expected = args.chats * args.per_chat + flood
+
+    async def handle(update, context):
+        nonlocal overlaps, quiet_done
+        message = update.message
+        active[message.chat_id] = active.get(message.chat_id, 0) + 1
+        overlaps += active[message.chat_id] > 1
+        await asyncio.sleep(random.uniform(0.2, 1.8) * args.latency)
+        active[message.chat_id] -= 1
+        seen.setdefault(message.chat_id, []).append(int(message.text))
+        latencies[message.chat_id == NOISY_CHAT].append(time.perf_counter() - sent_at[update.update_id])
+        if message.chat_id != NOISY_CHAT:
+            quiet_done = time.perf_counter()
+        if sum(len(values) for values in latencies.values()) == expected:
+            done.set()
+
+    app.add_handler(MessageHandler(filters.TEXT, handle))
+    update_ids = itertools.count(1)
+
+    def message(chat_id: int, number: int) -> Update:
+        update_id = next(update_ids)
+        sent_at[update_id] = time.perf_counter()
+        return Update.de_json({"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": str(number),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+        }}, bot)
+
+    await app.initialize()
+    await app.start()
+    started = time.perf_counter()
+    for number in range(flood):
+        await app.update_queue.put(message(NOISY_CHAT, number))
+    # Quiet chats interleave their messages, as separate users typing would
+    for number in range(args.per_chat):
+        for chat in range(args.chats):
+            await app.update_queue.put(message(1000 + chat, number))
+    try:
+        await asyncio.wait_for(done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    await app.stop()
+    await app.shutdown()
+
+    handled = sum(len(values) for values in latencies.values())
+    out_of_order = sum(
+        sum(1 for a, b in zip(numbers, numbers[1:]) if b < a) for numbers in seen.values()
+    )
+    quiet = latencies[False]
+    line = (f"{name:<11} {handled / elapsed:7.1f} updates/s  handled={handled}/{expected} "
+            f"out_of_order={out_of_order:<4} overlapping={overlaps:<4} "
+            f"quiet p50={percentile(quiet, 50):6.2f}s p95={percentile(quiet, 95):6.2f}s")
+    if flood:
+        line += f" all quiet done={quiet_done - started:5.1f}s noisy done={elapsed:5.1f}s"
+    if isinstance(processor, ChatUpdateProcessor):
+        line += f" chat queues left={processor.chats}"
+    print(line)
+
+
+async def run(args) -> None:
+    random.seed(args.seed)
+    print(f"chats={args.chats} per_chat={args.per_chat} latency={args.latency}s cap={args.cap}")
+    for name in args.processors:
+        await run_case(name, args, flood=0)
+    print(f"\n+ one chat sending {args.flood} messages first")
+    for name in args.processors:
+        await run_case(name, args, flood=args.flood)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--per-chat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each handler awaits")
+    parser.add_argument("--cap", type=int, default=32, help="Updates handled at once")
+    parser.add_argument("--flood", type=int, default=500, help="Messages of the noisy chat")
+    parser.add_argument("--processors", type=lambda value: value.split(","),
+                        default=["sequential", "concurrent", "per-chat"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Webhook throughput with 1, 2, 4... worker processes behind the front.
+
+Starts ``bot.py`` in webhook mode with WEBHOOK_WORKERS=N, pointed at a
+local fake Telegram Bot API (TELEGRAM_API_URL), and POSTs /start updates
+from many chats to the front's /webhook, as Telegram would. An update
+counts as handled when its reply reaches the fake API. A share of updates
+is delivered twice to check that redeliveries are dropped.
+
+Workers are separate processes, so the speed-up is bounded by the CPU
+cores available: on a single core, more workers only add overhead.
+
+Usage:
+    python -m benchmarks.webhook_scaling [--workers 1,2,4] [--updates 4000] [--chats 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import tornado.httpserver
+import tornado.web
+
+TOKEN = "123456:SCALETEST"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeTelegramApi:
+    """Answers Bot API calls and counts replies per chat"""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.replies: Dict[str, int] = {}
+        self.port = free_port()
+        self._server = None
+        self._changed = asyncio.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def handled(self) -> int:
+        return sum(self.replies.values())
+
+    async def wait_for(self, predicate, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self._changed.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+        return True
+
+    def start(self) -> None:
+        api = self
+
+        class MethodHandler(tornado.web.RequestHandler):
+            def post(self, method: str) -> None:
+                api.calls[method] = api.calls.get(method, 0) + 1
+                if method == "getMe":
+                    result = {"id": 123456, "is_bot": True, "first_name": "Scale", "username": "scale_test_bot"}
+                elif method == "sendMessage":
+                    if "json" in self.request.headers.get("Content-Type", ""):
+                        params = json.loads(self.request.body)
+                    else:
+                        params = {key: self.get_body_argument(key) for key in self.request.body_arguments}
+                    chat_id = str(params.get("chat_id"))
+                    api.replies[chat_id] = api.replies.get(chat_id, 0) + 1
+                    result = {"message_id": api.calls[method], "date": int(time.time()),
+                              "chat": {"id": int(chat_id), "type": "private"}, "text": params.get("text", "")}
+                else:
+                    result = True
+                api._changed.set()
+                self.write({"ok": True, "result": result})
+
+            get = post
+
+        app = tornado.web.Application([(r"/bot[^/]+/(\w+)", MethodHandler)], log_function=lambda handler: None)
+        self._server = tornado.httpserver.HTTPServer(app)
+        self._server.listen(self.port, address="127.0.0.1")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+
+
+def start_message(update_id: int, chat_id: int) -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }).encode()
+
+
+async def run_workers(workers: int, args, api: FakeTelegramApi) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"webhook_scaling_{workers}_")
+    port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN, TELEGRAM_API_URL=api.base_url,
+        WEBHOOK_MODE="true", WEBHOOK_WORKERS=str(workers), WEBHOOK_URL="https://example.invalid/webhook",
+        WEB_SERVER_PORT=str(port), WORKER_BASE_PORT=str(free_port()),
+        MEMBER_ID="M0001", PIN="1234", PASSWORD="secret", OMEGA_ENDPOINTS="http://127.0.0.1:9",
+        JOURNAL_PATH=os.path.join(workdir, "orders.journal"),
+        REFID_STATE_PATH=os.path.join(workdir, "refid.state"),
+        SESSION_DB_PATH=os.path.join(workdir, "sessions.db"),
+        CATALOG_PATH=os.path.join(workdir, "products.csv"),
+        METRICS_ENABLED="false", LOG_LEVEL="ERROR",
+    )
+    env.pop("WORKER_INDEX", None)
+    process = subprocess.Popen([sys.executable, "bot.py"], cwd=ROOT, env=env)
+    api.calls.clear()
+    api.replies.clear()
+    url = f"http://127.0.0.1:{port}/webhook"
+
+    try:
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency * 2)) as client:
+            # One warm-up update per worker, retried until every worker answers
+            update_ids = iter(range(1, 10**9))
+            warm_chats = list(range(1, 64))
+            deadline = time.monotonic() + 60
+            while len(api.replies) < min(workers * 4, len(warm_chats)) and time.monotonic() < deadline:
+                chat_id = random.choice(warm_chats)
+                try:
+                    await client.post(url, content=start_message(next(update_ids), chat_id),
+                                      headers={"Content-Type": "application/json"})
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.2)
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(1)
+            api.replies.clear()
+
+            # Updates in the order Telegram would send them; some go out twice
+            updates: List[bytes] = []
+            for i in range(args.updates):
+                body = start_message(next(update_ids), 1_000_000 + i % args.chats)
+                updates.append(body)
+                if random.random() < args.duplicates:
+                    updates.append(body)
+            statuses: Dict[int, int] = {}
+            pending = iter(updates)
+
+            async def sender() -> None:
+                for body in pending:
+                    try:
+                        response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    except httpx.HTTPError:
+                        statuses[0] = statuses.get(0, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[sender() for _ in range(args.concurrency)])
+            accepted = time.perf_counter() - started
+            complete = await api.wait_for(lambda: api.handled() >= args.updates, args.timeout)
+            elapsed = time.perf_counter() - started
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.to_thread(process.wait, 30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        "workers": workers, "elapsed": elapsed, "accepted": accepted, "complete": complete,
+        "handled": api.handled(), "sent": len(updates), "statuses": statuses,
+    }
+
+
+async def run(args) -> None:
+    api = FakeTelegramApi()
+    api.start()
+    results = []
+    try:
+        for workers in args.workers:
+            results.append(await run_workers(workers, args, api))
+    finally:
+        api.stop()
+
+    print(f"updates={args.updates} chats={args.chats} duplicates={args.duplicates:.0%} "
+          f"concurrency={args.concurrency} cpus={os.cpu_count()}")
+    print(f"{'workers':>7} {'handled':>8} {'posted':>7} {'elapsed':>8} {'updates/s':>10} {'speed-up':>9}  statuses")
+    baseline = None
+    for result in results:
+        rate = result["handled"] / result["elapsed"]
+        baseline = baseline or rate or 1
+        print(f"{result['workers']:>7} {result['handled']:>8} {result['sent']:>7} {result['elapsed']:>7.2f}s "
+              f"{rate:>10.0f} {rate / baseline:>8.2f}x  {result['statuses']}"
+              + ("" if result["complete"] else "  (timed out)"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="Share of updates delivered twice")
+    parser.add_argument("--concurrency", type=int, default=40, help="Webhook requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
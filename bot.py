@@ -1,37 +1,259 @@
+import atexit
 import os
+import secrets
+import signal
+import time
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram import (Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile,
+                      InlineQueryResultArticle, InputTextMessageContent)
+from telegram.helpers import escape_markdown
+from telegram.ext import (Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler,
+                          MessageHandler, filters, ContextTypes)
 from dotenv import load_dotenv
+from services.accounts import AccountPool
+from services.bulk import BulkOrderBatch, BulkRow, parse_bulk_orders
+from services.catalog import ProductCatalog
+from services.destination import (DestinationKind, classify_destination, mismatch_message, narrow_products,
+                                  product_matches)
+from services.dispatcher import DispatcherFull, OrderDispatcher
+from services.governor import TelegramRateGovernor
+from services.history import OrderHistory
+from services.idempotency import OrderGuard
+from services.journal import OrderState, TransactionJournal
+from services.ledger import BalanceLedger
 from services.omegatronik import OmegatronikService
+from services.reports import ReportHandler, ReportPoller
+from services.router import CIRCUIT_OPEN
+from services.schedules import OrderScheduler, ScheduleStore, parse_schedule
+from services.scaleout import FrontReceiver, FrontWebhookHandler, WorkerMetricsHandler, WorkerPool, worker_command
+from services.sessions import Session, SessionState, create_session_store
+from services.updates import ChatUpdateProcessor
+from services.webserver import WebServer
+from utils import metrics
+from utils.log import setup_logging
+from utils.profiling import MemoryTracker, SamplingProfiler, dump_tasks, profile_calls
+from utils.ratelimit import Priority
+from utils.refid import RefIdAllocator
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Setup logging; records are written by a background thread, off the event loop
+log_listener = setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    json_format=os.getenv('LOG_FORMAT', 'text').lower() == 'json',
+    sample_rate=float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
 )
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 logging.getLogger('httpx').setLevel(logging.WARNING)
 
 # Global variables
 application = None
+web_server = None
 
-# Initialize service
-omega_service = OmegatronikService(
-    member_id=os.getenv('MEMBER_ID'),
-    pin=os.getenv('PIN'),
-    password=os.getenv('PASSWORD')
+# Port the webhook/report server listens on inside the container
+WEB_SERVER_PORT = int(os.getenv('WEB_SERVER_PORT', '8095'))
+
+# Set in processes started by the webhook front (see WEBHOOK_WORKERS)
+WORKER_INDEX = int(os.environ['WORKER_INDEX']) if os.getenv('WORKER_INDEX') else None
+REFID_NODE = int(os.getenv('REFID_NODE', '0'))
+
+
+def worker_path(path: str) -> str:
+    """Per-worker variant of a state file path; unchanged outside worker processes"""
+    return path if WORKER_INDEX is None else f"{path}.w{WORKER_INDEX}"
+
+
+# refIDs are unique per node and stay monotonic across restarts; each
+# webhook worker is its own node, so reports can be routed back to it
+ref_ids = RefIdAllocator(
+    node_id=REFID_NODE + (WORKER_INDEX or 0),
+    state_path=worker_path(os.getenv('REFID_STATE_PATH', 'data/refid.state'))
+)
+
+# Durable record of every order, replayed on startup
+journal = TransactionJournal(
+    path=worker_path(os.getenv('JOURNAL_PATH', 'data/orders.journal')),
+    fsync=os.getenv('JOURNAL_FSYNC', 'true').lower() == 'true'
+)
+
+
+def create_omega_service(member_id: str, pin: str, password: str) -> OmegatronikService:
+    """Upstream client for one account; every account gets its own rate limit and connection pool"""
+    return OmegatronikService(
+        member_id=member_id,
+        pin=pin,
+        password=password,
+        base_url=os.getenv('OMEGA_BASE_URL', 'https://apiomega.id'),
+        backup_base_url=os.getenv('OMEGA_BACKUP_URL', 'http://188.166.178.169:6969'),
+        endpoints=[url.strip() for url in os.getenv('OMEGA_ENDPOINTS', '').split(',') if url.strip()],
+        max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+        max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE', '20')),
+        keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30')),
+        hedge_orders=os.getenv('OMEGA_HEDGE_ORDERS', 'true').lower() == 'true',
+        balance_cache_ttl=float(os.getenv('BALANCE_CACHE_TTL', '10')),
+        balance_serve_stale=os.getenv('BALANCE_SERVE_STALE', 'false').lower() == 'true',
+        ref_ids=ref_ids,
+        order_timeout=float(os.getenv('ORDER_TIMEOUT', '60')),
+        rate_limit=float(os.getenv('UPSTREAM_RATE_LIMIT', '0')),
+        rate_burst=float(os.getenv('UPSTREAM_RATE_BURST', '0')) or None
+    )
+
+
+def parse_accounts(value: str) -> list:
+    """(member_id, pin, password) tuples from OMEGA_ACCOUNTS=member:pin:password,..."""
+    accounts = []
+    for entry in value.split(','):
+        if entry.strip():
+            member_id, pin, password = entry.strip().split(':', 2)
+            accounts.append((member_id, pin, password))
+    return accounts
+
+
+# Upstream accounts: MEMBER_ID/PIN/PASSWORD plus any in OMEGA_ACCOUNTS;
+# orders are spread over them and journaled with the account used
+omega_pool = AccountPool(
+    [create_omega_service(os.getenv('MEMBER_ID'), os.getenv('PIN'), os.getenv('PASSWORD'))]
+    + [create_omega_service(*account) for account in parse_accounts(os.getenv('OMEGA_ACCOUNTS', ''))],
+    policy=os.getenv('ACCOUNT_POLICY', 'least_loaded'),
+    journal=journal,
+    ref_ids=ref_ids,
+    price_of=lambda code: getattr(product_catalog.get(code), 'price', None),
+    group_of=lambda code: getattr(product_catalog.get(code), 'group', None),
+    rate_limit_cooldown=float(os.getenv('ACCOUNT_RATE_LIMIT_COOLDOWN', '30')),
+    recheck_interval=float(os.getenv('ACCOUNT_RECHECK_INTERVAL', '60'))
+)
+journal.listeners.append(omega_pool.on_record)
+
+# Per-user order history, kept up to date from the journal; webhook
+# workers share one database
+order_history = OrderHistory(os.getenv('HISTORY_DB_PATH', 'data/history.db'))
+journal.listeners.append(order_history.record)
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '5'))
+
+# User sessions; webhook workers need a store they all share, so a
+# restarted or re-pinned worker still sees the conversation
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+if WORKER_INDEX is not None and SESSION_BACKEND == 'memory':
+    logger.warning("SESSION_BACKEND=memory is per process; webhook workers use sqlite instead")
+    SESSION_BACKEND = 'sqlite'
+session_store = create_session_store(
+    backend=SESSION_BACKEND,
+    ttl=float(os.getenv('SESSION_TTL', '900')),
+    path=os.getenv('SESSION_DB_PATH', 'data/sessions.db'),
+    url=os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+)
+
+# Order queue
+order_dispatcher = OrderDispatcher(
+    workers=int(os.getenv('ORDER_WORKERS', '8')),
+    max_pending=int(os.getenv('ORDER_QUEUE_SIZE', '200'))
+)
+
+# Repeated submissions of the same destination + product by one user join
+# the running order, or need confirmation within the window
+order_guard = OrderGuard(
+    window=float(os.getenv('ORDER_DEDUP_WINDOW', '120')),
+    max_keys=int(os.getenv('ORDER_DEDUP_MAX_KEYS', '10000'))
 )
 
-# User sessions
-user_sessions = {}
+# Product price list for local validation, search and product keyboards
+product_catalog = ProductCatalog(
+    path=os.getenv('CATALOG_PATH', 'data/products.csv'),
+    url=os.getenv('CATALOG_URL') or None,
+    refresh_interval=float(os.getenv('CATALOG_REFRESH_INTERVAL', '3600'))
+)
+PRODUCTS_PER_PAGE = int(os.getenv('PRODUCTS_PER_PAGE', '8'))
+# Classify destinations locally: reject impossible numbers and only offer
+# products of the number's operator
+DESTINATION_CHECK = os.getenv('DESTINATION_CHECK', 'true').lower() == 'true'
+narrowed_products = {}
+
+# Running balance moved by order results, checked against /CekSaldo on a
+# schedule, so balance reads and affordability checks need no round trip
+balance_ledger = None
+if os.getenv('BALANCE_LEDGER', 'true').lower() == 'true':
+    balance_ledger = BalanceLedger(
+        fetch=lambda: omega_pool.check_balance(fresh=True),
+        price_of=lambda code: getattr(product_catalog.get(code), 'price', None),
+        reconcile_interval=float(os.getenv('BALANCE_RECONCILE_INTERVAL', '300')),
+        reconcile_every=int(os.getenv('BALANCE_RECONCILE_EVERY', '50'))
+    )
+    journal.listeners.append(balance_ledger.on_record)
+
+# Scheduled and recurring orders (/jadwal); chats are pinned to webhook
+# workers, so each worker keeps and fires its own chats' schedules
+order_scheduler = OrderScheduler(
+    ScheduleStore(worker_path(os.getenv('SCHEDULE_DB_PATH', 'data/schedules.db'))),
+    fire=lambda schedule: fire_scheduled_order(schedule),
+    on_missed=lambda schedule, due: notify_missed_schedule(schedule, due),
+    utc_offset=float(os.getenv('SCHEDULE_UTC_OFFSET', '7')),
+    jitter=float(os.getenv('SCHEDULE_JITTER', '300')),
+    fire_rate=float(os.getenv('SCHEDULE_FIRE_RATE', '5')),
+    max_lateness=float(os.getenv('SCHEDULE_MAX_LATENESS', '21600')),
+    max_per_user=int(os.getenv('SCHEDULE_MAX_PER_USER', '20'))
+)
+INLINE_RESULTS_LIMIT = 50
+INLINE_CACHE_TIME = 300
+
+# Bulk orders; the concurrency limit is shared by all running batches
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', '500'))
+BULK_MAX_FILE_SIZE = 1024 * 1024
+bulk_slots = asyncio.Semaphore(int(os.getenv('BULK_CONCURRENCY', '10')))
+bulk_users = set()
+
+# Updates of different chats run concurrently, each chat's in order, so a
+# slow handler only holds up its own chat
+update_processor = ChatUpdateProcessor(
+    max_concurrent=int(os.getenv('UPDATE_CONCURRENCY', '32')),
+    max_pending=int(os.getenv('UPDATE_MAX_PENDING', '4096'))
+)
+
+# Metrics read at scrape time
+HANDLER_SECONDS = metrics.histogram(
+    'bot_handler_seconds', 'Time spent in Telegram update handlers', ('handler',)
+)
+metrics.gauge('bot_sessions', 'Stored user sessions', func=session_store.size)
+metrics.gauge('bot_updates_running', 'Telegram updates being handled', func=lambda: update_processor.running)
+metrics.gauge('bot_updates_waiting', 'Telegram updates waiting for their chat or a free slot',
+              func=lambda: update_processor.waiting)
+metrics.gauge('bot_order_queue_depth', 'Orders waiting for a worker', func=lambda: order_dispatcher.queued)
+metrics.gauge('bot_orders_running', 'Orders being sent upstream', func=lambda: order_dispatcher.running)
+metrics.gauge('bot_order_schedules', 'Stored order schedules', func=lambda: len(order_scheduler))
+metrics.gauge('bot_orders_unsettled', 'Journaled orders without a final status', func=lambda: len(journal.pending()))
+
+
+def open_circuits() -> dict:
+    """1 for endpoints whose circuit breaker is open for any account, else 0"""
+    states = {}
+    for account in omega_pool.accounts:
+        for ep in account.service.router.endpoints:
+            states[(ep.base_url,)] = max(states.get((ep.base_url,), 0), int(ep.state == CIRCUIT_OPEN))
+    return states
+
+
+metrics.gauge(
+    'omega_circuit_open', 'Whether the circuit breaker of an upstream endpoint is open', ('endpoint',),
+    func=open_circuits
+)
+metrics.gauge(
+    'omega_account_active', 'Whether an upstream account takes orders (not out of funds or rate limited)',
+    ('account',), func=lambda: {(a.name,): int(a.status == 'active') for a in omega_pool.accounts}
+)
+metrics.gauge(
+    'omega_account_balance', 'Last known balance of an upstream account', ('account',),
+    func=lambda: {(a.name,): a.balance for a in omega_pool.accounts if a.balance is not None}
+)
+metrics.gauge(
+    'omega_account_orders_in_flight', 'Orders waiting for an upstream account', ('account',),
+    func=lambda: {(a.name,): a.in_flight for a in omega_pool.accounts}
+)
 
 # Constants for session states
-STATE_WAITING_DESTINATION = 'waiting_destination'
-STATE_WAITING_PRODUCT_CODE = 'waiting_product_code'
+STATE_WAITING_DESTINATION = SessionState.WAITING_DESTINATION
+STATE_WAITING_PRODUCT_CODE = SessionState.WAITING_PRODUCT_CODE
 
 
 def get_main_menu():
@@ -39,11 +261,14 @@ def get_main_menu():
     keyboard = [
         [InlineKeyboardButton("💰 Cek Saldo", callback_data="cek_saldo")],
         [InlineKeyboardButton("📦 Order Produk", callback_data="order_produk")],
+        [InlineKeyboardButton("📜 Riwayat Order", callback_data="riwayat")],
+        [InlineKeyboardButton("⏰ Jadwal Order", callback_data="jadwal")],
         [InlineKeyboardButton("❓ Bantuan", callback_data="bantuan")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
 
+@HANDLER_SECONDS.time('start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
     user = update.effective_user
@@ -55,6 +280,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+ACCOUNT_STATUS_TEXT = {'active': 'aktif', 'no_funds': 'saldo habis', 'rate_limited': 'dibatasi'}
+
+
 async def cek_saldo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check balance handler"""
     query = update.callback_query
@@ -62,7 +290,12 @@ async def cek_saldo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.edit_message_text("⏳ Mengecek saldo...")
     
-    result = await omega_service.check_balance()
+    if balance_ledger is not None:
+        # The ledger adopts unfinished orders before its first snapshot
+        await state_loaded.wait()
+        result = await balance_ledger.get()
+    else:
+        result = await omega_pool.check_balance()
     
     if result['success']:
         data = result['data']
@@ -77,7 +310,16 @@ async def cek_saldo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 message += f"Saldo: Rp {saldo_int}\n"
             except (ValueError, TypeError):
                 message += f"Saldo: Rp {saldo}\n"
+            if data.get('available') is not None and data['available'] != data['saldo']:
+                message += f"Tersedia: Rp {data['available']} (sisanya untuk order yang sedang diproses)\n"
             message += f"Status: {data.get('status', '-')}"
+            if data.get('reconciled_ago') is not None:
+                message += f"\nDicocokkan ke server {int(data['reconciled_ago'] // 60)} menit lalu"
+            if len(omega_pool) > 1:
+                message += "\n\nPer akun:"
+                for account in omega_pool.accounts:
+                    balance = f"Rp {account.balance}" if account.balance is not None else "-"
+                    message += f"\n• {account.name}: {balance} ({ACCOUNT_STATUS_TEXT[account.status]})"
         else:
             # API returned OK without balance data
             message += "Cek saldo berhasil!\n"
@@ -106,9 +348,7 @@ async def start_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Set session state
-    user_sessions[user_id] = {
-        'state': STATE_WAITING_DESTINATION
-    }
+    await session_store.set(user_id, Session(STATE_WAITING_DESTINATION))
     
     await query.edit_message_text(
         "📦 *Order Produk*\n\n"
@@ -121,72 +361,904 @@ async def start_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+def products_for(destination: str):
+    """
+    Products that can be sent to a destination, its operator's first
+
+    Lists are cached per operator and rebuilt when the catalog changes.
+    Returns None (all products) when nothing narrower applies.
+    """
+    if not DESTINATION_CHECK or not destination:
+        return None
+    checked = classify_destination(destination)
+    cached = narrowed_products.get(checked.operator)
+    if cached is None or cached[0] != product_catalog.version:
+        products = narrow_products(product_catalog.products, checked)
+        cached = narrowed_products[checked.operator] = (product_catalog.version, products or None)
+    return cached[1]
+
+
+def get_product_keyboard(page: int = 0, destination: str = None):
+    """Generate a paginated product picker keyboard, narrowed to the destination's products"""
+    products, pages = product_catalog.page(page, PRODUCTS_PER_PAGE, products_for(destination))
+    page = min(max(page, 0), pages - 1)
+    
+    keyboard = [
+        [InlineKeyboardButton(f"{product.code} - {product.name} (Rp {product.price:,})",
+                              callback_data=f"prod:{product.code}")]
+        for product in products
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=f"prodpage:{page - 1}"))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("➡️", callback_data=f"prodpage:{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("🔍 Cari Produk", switch_inline_query_current_chat="")])
+    keyboard.append([InlineKeyboardButton("🔙 Batal", callback_data="menu_utama")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+@HANDLER_SECONDS.time('handle_message')
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages for order process"""
     user_id = update.effective_user.id
     text = update.message.text
+    await state_loaded.wait()
     
-    if user_id not in user_sessions:
+    session = await session_store.get(user_id)
+    
+    if session is None:
         await update.message.reply_text(
             "Silakan mulai dengan /start",
             reply_markup=get_main_menu()
         )
         return
     
-    session = user_sessions[user_id]
-    
-    if session['state'] == STATE_WAITING_DESTINATION:
-        # Store destination and ask for product code
-        session['destination'] = text
-        session['state'] = STATE_WAITING_PRODUCT_CODE
+    if session.state == STATE_WAITING_DESTINATION:
+        destination = text.strip()
+        label = ""
+        if DESTINATION_CHECK:
+            # Impossible numbers are caught here instead of failing upstream
+            checked = classify_destination(destination)
+            if not checked.valid:
+                await update.message.reply_text(
+                    f"❌ {checked.error}.\n\nSilakan masukkan nomor tujuan yang benar:",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Batal", callback_data="menu_utama")
+                    ]])
+                )
+                return
+            destination = checked.number
+            label = f" ({checked.label})" if checked.kind != DestinationKind.OTHER else ""
         
-        await update.message.reply_text(
-            f"📱 Nomor tujuan: {text}\n\n"
-            "Silakan masukkan kode produk:",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Batal", callback_data="menu_utama")
-            ]])
-        )
-    
-    elif session['state'] == STATE_WAITING_PRODUCT_CODE:
-        # Process order
-        destination = session['destination']
-        product_code = text
-        
-        await update.message.reply_text("⏳ Memproses order...")
-        
-        result = await omega_service.order_product(destination, product_code)
+        # Store destination and ask for product code
+        session.destination = destination
+        session.state = STATE_WAITING_PRODUCT_CODE
+        await session_store.set(user_id, session)
         
-        if result['success']:
-            data = result['data']
-            message = f"✅ *Order Berhasil!*\n\n"
-            message += f"Trx ID: {data.get('trx_id', '-')}\n"
-            message += f"Tujuan: {data.get('destination', '-')}\n"
-            message += f"Produk: {data.get('product_name', data.get('product_code', '-'))}\n"
-            message += f"Harga: Rp {data.get('price', 0):,}\n"
-            message += f"Status: {data.get('status', '-')}\n"
-            message += f"Pesan: {data.get('message', '-')}"
-            
+        if len(product_catalog):
             await update.message.reply_text(
-                message,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")
-                ]]),
-                parse_mode='Markdown'
+                f"📱 Nomor tujuan: {destination}{label}\n\n"
+                "Pilih produk di bawah, cari dengan 🔍, atau ketik kode produk:",
+                reply_markup=get_product_keyboard(destination=destination)
             )
         else:
             await update.message.reply_text(
-                f"❌ *Order Gagal*\n\n"
-                f"Error: {result['error']}\n\n"
-                "Silakan coba lagi.",
+                f"📱 Nomor tujuan: {destination}{label}\n\n"
+                "Silakan masukkan kode produk:",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")
-                ]]),
-                parse_mode='Markdown'
+                    InlineKeyboardButton("🔙 Batal", callback_data="menu_utama")
+                ]])
+            )
+    
+    elif session.state == STATE_WAITING_PRODUCT_CODE:
+        await place_order(update, context, session.destination, text.strip())
+
+
+async def place_order(update: Update, context: ContextTypes.DEFAULT_TYPE, destination: str, product_code: str,
+                      repeat: bool = False):
+    """
+    Validate the product and queue the order; a worker edits the result into the status message
+
+    Args:
+        destination: Destination number
+        product_code: Product code as entered or picked
+        repeat: The user confirmed repeating an order that just finished
+    """
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    message = update.effective_message
+    
+    # Reject unknown codes locally instead of paying for an upstream round trip
+    if len(product_catalog):
+        product = product_catalog.get(product_code)
+        if product is None:
+            suggestions = product_catalog.search(product_code, limit=5)
+            text = f"❌ Kode produk {product_code} tidak ditemukan."
+            if suggestions:
+                text += "\n\nMungkin maksud Anda:\n" + "\n".join(
+                    f"• {p.code} - {p.name}" for p in suggestions
+                )
+            await message.reply_text(text, reply_markup=get_product_keyboard(destination=destination))
+            return
+        product_code = product.code
+        
+        # An XL product cannot top up a Telkomsel number, whatever the upstream says
+        checked = classify_destination(destination) if DESTINATION_CHECK else None
+        if checked is not None and not product_matches(checked, product):
+            await message.reply_text(
+                f"❌ {mismatch_message(checked, product)}\n"
+                "Pilih produk lain:",
+                reply_markup=get_product_keyboard(destination=destination)
             )
+            return
         
-        # Clear session
-        del user_sessions[user_id]
+        # Orders the balance cannot cover would only be rejected upstream
+        if balance_ledger is not None and not balance_ledger.can_afford(product.price):
+            await message.reply_text(
+                f"❌ Saldo tidak cukup untuk {product.code} (Rp {product.price:,}).\n"
+                f"Saldo tersedia: Rp {balance_ledger.available:,}",
+                reply_markup=get_product_keyboard(destination=destination)
+            )
+            return
+    
+    # Double taps and resends must not send the same order twice
+    guard_key = (user_id, destination, product_code)
+    duplicate = order_guard.check(guard_key)
+    if duplicate is not None and (duplicate.in_flight or not repeat):
+        await session_store.delete(user_id)
+        await reply_duplicate_order(context, message, chat_id, duplicate)
+        return
+    
+    ref_id = ref_ids.next()
+    status_message = asyncio.get_running_loop().create_future()
+    order_guard.begin(guard_key, ref_id)
+    
+    try:
+        await journal.record(
+            ref_id, OrderState.CREATED, user_id=user_id, chat_id=chat_id,
+            destination=destination, product_code=product_code
+        )
+    except Exception as e:
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': str(e)})
+        raise
+    
+    try:
+        queued = order_dispatcher.submit(
+            user_id,
+            lambda: process_order(context.bot, chat_id, status_message, ref_id, destination, product_code, guard_key)
+        )
+    except DispatcherFull:
+        await journal.record(ref_id, OrderState.FAILED, message="Antrian order penuh")
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': "Antrian order penuh"})
+        # Keep the session so the user can resend the product code
+        await message.reply_text(
+            "⚠️ Antrian order sedang penuh.\n"
+            "Silakan kirim ulang kode produk beberapa saat lagi."
+        )
+        return
+    
+    # Clear session
+    await session_store.delete(user_id)
+    
+    try:
+        sent = await message.reply_text(
+            f"⏳ Order diterima ({queued} order dalam antrian)\n"
+            f"Tujuan: {destination}\n"
+            f"Produk: {product_code}"
+        )
+    except Exception as e:
+        logger.error(f"Failed to send order status message: {e}")
+        sent = None
+    status_message.set_result(sent)
+
+
+async def reply_duplicate_order(context: ContextTypes.DEFAULT_TYPE, message, chat_id: int, entry):
+    """Answer an order identical to one still running or just finished"""
+    if entry.in_flight:
+        sent = await message.reply_text(
+            f"⏳ Order yang sama masih diproses (Ref ID: {entry.ref_id}).\n"
+            "Hasilnya juga akan dikirim ke pesan ini."
+        )
+        
+        async def forward_result():
+            result = await order_guard.join(entry)
+            await send_order_result(context.bot, chat_id, sent.message_id, result)
+        
+        context.application.create_task(forward_result())
+        return
+    
+    keyboard = [
+        [InlineKeyboardButton("🔁 Ya, Order Lagi", callback_data=f"ulang:{entry.ref_id}")],
+        [InlineKeyboardButton("❌ Tidak", callback_data="menu_utama")]
+    ]
+    await message.reply_text(
+        format_order_result(entry.result) + "\n\n"
+        "⚠️ Order yang sama baru saja dibuat. Order lagi?",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+
+
+async def repeat_order(update: Update, context: ContextTypes.DEFAULT_TYPE, ref_id: str):
+    """Place an order again after the user confirmed the duplicate"""
+    query = update.callback_query
+    record = journal.get(ref_id)
+    if record is None or record.user_id != update.effective_user.id:
+        await query.answer("Order tidak ditemukan, silakan order ulang dari menu.", show_alert=True)
+        return
+    await query.answer()
+    # Drop the buttons so a second tap cannot confirm twice
+    await query.edit_message_reply_markup(None)
+    await place_order(update, context, record.destination, record.product_code, repeat=True)
+
+
+async def select_product(update: Update, context: ContextTypes.DEFAULT_TYPE, product_code: str):
+    """Order the product picked from the product keyboard"""
+    query = update.callback_query
+    session = await session_store.get(update.effective_user.id)
+    
+    if session is None or session.state != STATE_WAITING_PRODUCT_CODE:
+        await query.answer("Sesi order sudah berakhir, silakan mulai lagi.", show_alert=True)
+        return
+    
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=None)
+    await place_order(update, context, session.destination, product_code)
+
+
+async def show_product_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Switch the product keyboard to another page"""
+    query = update.callback_query
+    await query.answer()
+    session = await session_store.get(update.effective_user.id)
+    destination = session.destination if session is not None else None
+    await query.edit_message_reply_markup(reply_markup=get_product_keyboard(page, destination))
+
+
+@HANDLER_SECONDS.time('handle_inline_query')
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Search the product catalog from inline mode; picking a result sends its code"""
+    query = update.inline_query
+    await state_loaded.wait()
+    products = product_catalog.search(query.query, limit=INLINE_RESULTS_LIMIT)
+    
+    results = [
+        InlineQueryResultArticle(
+            id=product.code,
+            title=f"{product.code} - {product.name}",
+            description=f"Rp {product.price:,}" + (f" • {product.group}" if product.group else ""),
+            input_message_content=InputTextMessageContent(product.code)
+        )
+        for product in products
+    ]
+    # Results only change when the catalog refreshes, so Telegram may cache them
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
+
+
+def resolve_product_code(code: str):
+    """Canonical product code, or None when the catalog is loaded and lacks it"""
+    if not len(product_catalog):
+        return code.upper()
+    product = product_catalog.get(code)
+    return product.code if product is not None else None
+
+
+def check_bulk_destination(destination: str, product_code: str):
+    """Normalised destination of a bulk row and why it cannot be ordered, if it cannot"""
+    checked = classify_destination(destination)
+    if not checked.valid:
+        return destination, checked.error
+    product = product_catalog.get(product_code)
+    if product is not None and not product_matches(checked, product):
+        return checked.number, mismatch_message(checked, product)
+    return checked.number, None
+
+
+async def order_bulk_row(row: BulkRow, user_id: int, chat_id: int):
+    """Place one bulk row under the same duplicate guard as place_order"""
+    # A batch has no confirmation step, so a recent identical order skips the row too
+    guard_key = (user_id, row.destination, row.product_code)
+    duplicate = order_guard.check(guard_key)
+    if duplicate is not None:
+        state = "masih diproses" if duplicate.in_flight else "baru saja dibuat"
+        return {
+            'success': False, 'ref_id': duplicate.ref_id,
+            'error': f"Dilewati, order yang sama {state} (Ref ID: {duplicate.ref_id})"
+        }
+    
+    ref_id = ref_ids.next()
+    order_guard.begin(guard_key, ref_id)
+    try:
+        result = await omega_pool.order_product(
+            row.destination, row.product_code, ref_id=ref_id, meta={'user_id': user_id, 'chat_id': chat_id}
+        )
+    except Exception as e:
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': str(e)})
+        raise
+    order_guard.finish(guard_key, result)
+    return result
+
+
+async def bulk_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Run a batch of orders from a pasted list (/bulk) or an uploaded CSV file"""
+    message = update.effective_message
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    await state_loaded.wait()
+    
+    if message.document is not None:
+        if (message.document.file_size or 0) > BULK_MAX_FILE_SIZE:
+            await message.reply_text("❌ File terlalu besar, maksimal 1 MB.")
+            return
+        file = await message.document.get_file()
+        text = (await file.download_as_bytearray()).decode('utf-8-sig', errors='replace')
+    else:
+        parts = message.text.split(maxsplit=1)
+        text = parts[1] if len(parts) > 1 else ''
+    
+    if not text.strip():
+        await message.reply_text(
+            "📋 *Bulk Order*\n\n"
+            "Kirim /bulk diikuti daftar order, satu per baris:\n"
+            "```\n/bulk\n081234567890,S10\n081298765432,I25\n```\n"
+            f"Atau upload file CSV berisi kolom tujuan,kode\\_produk (maks. {BULK_MAX_ROWS} baris).",
+            parse_mode='Markdown'
+        )
+        return
+    
+    if user_id in bulk_users:
+        await message.reply_text("⚠️ Bulk order Anda sebelumnya masih berjalan, tunggu hingga selesai.")
+        return
+    
+    rows, errors = parse_bulk_orders(
+        text, max_rows=BULK_MAX_ROWS, resolve_product=resolve_product_code,
+        check_destination=check_bulk_destination if DESTINATION_CHECK else None
+    )
+    if errors:
+        shown = "\n".join(errors[:20])
+        more = f"\n... dan {len(errors) - 20} kesalahan lain" if len(errors) > 20 else ""
+        await message.reply_text(f"❌ Bulk order ditolak, perbaiki dulu:\n\n{shown}{more}")
+        return
+    if not rows:
+        await message.reply_text("❌ Tidak ada baris order yang ditemukan.")
+        return
+    
+    if balance_ledger is not None:
+        total = sum(getattr(product_catalog.get(row.product_code), 'price', 0) for row in rows)
+        if not balance_ledger.can_afford(total):
+            await message.reply_text(
+                f"❌ Saldo tidak cukup untuk {len(rows)} order (total Rp {total:,}).\n"
+                f"Saldo tersedia: Rp {balance_ledger.available:,}"
+            )
+            return
+    
+    bulk_users.add(user_id)
+    try:
+        progress = await message.reply_text(f"⏳ Bulk order: 0/{len(rows)} selesai")
+        
+        async def report_progress(batch: BulkOrderBatch):
+            await context.bot.edit_message_text(
+                format_bulk_progress(batch), chat_id=progress.chat_id, message_id=progress.message_id,
+                **rate_limit(context.bot, Priority.LOW)
+            )
+        
+        batch = BulkOrderBatch(
+            rows,
+            order=lambda row: order_bulk_row(row, user_id, chat_id),
+            semaphore=bulk_slots,
+            on_progress=report_progress
+        )
+        await batch.run()
+        
+        await context.bot.send_document(
+            chat_id,
+            document=InputFile(batch.results_csv(), filename=f"bulk-{progress.message_id}.csv"),
+            caption=f"📄 Hasil {len(rows)} order"
+        )
+    finally:
+        bulk_users.discard(user_id)
+
+
+def format_bulk_progress(batch: BulkOrderBatch) -> str:
+    """Render a bulk batch's progress counters"""
+    total = len(batch.rows)
+    title = "✅ Bulk order selesai" if batch.done == total else "⏳ Bulk order berjalan"
+    return (
+        f"{title}: {batch.done}/{total} ({batch.elapsed:.0f} detik)\n\n"
+        f"Berhasil: {batch.counts['success']}\n"
+        f"Diproses: {batch.counts['accepted']}\n"
+        f"Belum pasti: {batch.counts['pending']}\n"
+        f"Gagal: {batch.counts['failed']}"
+    )
+
+
+HISTORY_ICONS = {
+    OrderState.SUCCESS.value: "✅",
+    OrderState.FAILED.value: "❌",
+}
+
+
+def format_history_line(order: dict) -> str:
+    """One line of the /riwayat list"""
+    icon = HISTORY_ICONS.get(order['state'], "⏳")
+    when = time.strftime('%d/%m %H:%M', time.localtime(order['created_at']))
+    price = f" Rp {order['price']:,}" if order['price'] else ""
+    line = f"{icon} {when} {order['product_code'] or '-'} → {order['destination'] or '-'}{price}"
+    return escape_markdown(line)
+
+
+def format_history_order(order: dict) -> str:
+    """Full details of one order from the history"""
+    product = product_catalog.get(order['product_code']) if order['product_code'] else None
+    text = f"{HISTORY_ICONS.get(order['state'], '⏳')} *Detail Order*\n\n"
+    text += f"Ref ID: {order['ref_id']}\n"
+    text += f"Trx ID: {order['trx_id'] or '-'}\n"
+    text += f"Waktu: {time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(order['created_at']))}\n"
+    text += f"Tujuan: {escape_markdown(order['destination'] or '-')}\n"
+    text += f"Produk: {escape_markdown(product.name if product else order['product_code'] or '-')}\n"
+    text += f"Harga: Rp {order['price'] or 0:,}\n"
+    text += f"Status: {order['state']}\n"
+    if order['sn']:
+        text += f"SN: {escape_markdown(order['sn'])}\n"
+    if order['message']:
+        text += f"Pesan: {escape_markdown(order['message'])}"
+    return text
+
+
+async def history_page(user_id: int, before: str = None, after: str = None):
+    """Text and keyboard of one /riwayat page"""
+    orders, has_older, has_newer = await order_history.page(
+        user_id, before=before, after=after, limit=HISTORY_PAGE_SIZE
+    )
+    if not orders:
+        text = "📜 *Riwayat Order*\n\nBelum ada order."
+        keyboard = [[InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")]]
+        return text, InlineKeyboardMarkup(keyboard)
+    
+    text = "📜 *Riwayat Order*\n\n" + "\n".join(format_history_line(order) for order in orders)
+    text += "\n\nPilih order untuk melihat detail."
+    keyboard = [
+        [InlineKeyboardButton(
+            f"🔎 {order['product_code'] or '-'} {order['destination'] or ''}".strip(),
+            callback_data=f"hist:v:{order['ref_id']}"
+        )]
+        for order in orders
+    ]
+    # Keyset cursors: the first and last refID shown on this page
+    nav = []
+    if has_newer:
+        nav.append(InlineKeyboardButton("⬅️ Lebih baru", callback_data=f"hist:n:{orders[0]['ref_id']}"))
+    if has_older:
+        nav.append(InlineKeyboardButton("Lebih lama ➡️", callback_data=f"hist:o:{orders[-1]['ref_id']}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+@HANDLER_SECONDS.time('riwayat')
+async def riwayat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/riwayat shows recent orders; /riwayat <refID atau Trx ID> shows one order"""
+    user_id = update.effective_user.id
+    await state_loaded.wait()
+    if context.args:
+        order = await order_history.get(context.args[0], user_id=user_id)
+        if order is None:
+            await update.message.reply_text(f"❌ Order {context.args[0]} tidak ditemukan.")
+            return
+        keyboard = [[InlineKeyboardButton("📜 Riwayat Order", callback_data="riwayat")]]
+        await update.message.reply_text(
+            format_history_order(order), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown'
+        )
+        return
+    
+    text, reply_markup = await history_page(user_id)
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
+    """Handle history pagination and detail buttons"""
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_user.id
+    
+    if data.startswith("hist:v:"):
+        order = await order_history.get(data[len("hist:v:"):], user_id=user_id)
+        if order is None:
+            await query.edit_message_text("❌ Order tidak ditemukan.")
+            return
+        keyboard = [[InlineKeyboardButton("🔙 Riwayat Order", callback_data="riwayat")]]
+        await query.edit_message_text(
+            format_history_order(order), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown'
+        )
+        return
+    
+    if data.startswith("hist:o:"):
+        text, reply_markup = await history_page(user_id, before=data[len("hist:o:"):])
+    elif data.startswith("hist:n:"):
+        text, reply_markup = await history_page(user_id, after=data[len("hist:n:"):])
+    else:
+        text, reply_markup = await history_page(user_id)
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+def schedule_list(user_id: int):
+    """Text and keyboard of a user's order schedules"""
+    schedules = order_scheduler.for_user(user_id)
+    if not schedules:
+        text = (
+            "⏰ *Jadwal Order*\n\n"
+            "Belum ada jadwal. Buat dengan:\n"
+            "/jadwal <tujuan> <kode> harian 07:00\n"
+            "/jadwal <tujuan> <kode> mingguan senin 07:00\n"
+            "/jadwal <tujuan> <kode> bulanan 1 07:00\n"
+            "/jadwal <tujuan> <kode> sekali 2026-11-01 07:00"
+        )
+        return text, None
+
+    lines = []
+    keyboard = []
+    for schedule in schedules:
+        lines.append(escape_markdown(
+            f"#{schedule.id} {schedule.product_code} → {schedule.destination}\n"
+            f"   {schedule.describe()}, berikutnya {order_scheduler.local_time(schedule.next_due):%d/%m %H:%M}"
+        ))
+        keyboard.append([InlineKeyboardButton(f"🗑 Hapus #{schedule.id}", callback_data=f"jadwal:hapus:{schedule.id}")])
+    keyboard.append([InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")])
+    text = "⏰ *Jadwal Order*\n\n" + "\n".join(lines)
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+@HANDLER_SECONDS.time('jadwal')
+async def jadwal(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/jadwal lists schedules; /jadwal <tujuan> <kode> <harian|mingguan|bulanan|sekali> ... adds one"""
+    message = update.effective_message
+    user_id = update.effective_user.id
+    await schedules_loaded.wait()
+
+    if not context.args:
+        text, reply_markup = schedule_list(user_id)
+        await message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        return
+    if len(context.args) < 4:
+        await message.reply_text(
+            "❌ Format: /jadwal <tujuan> <kode> harian 07:00\n"
+            "Contoh: /jadwal 081234567890 S10 bulanan 1 08:00"
+        )
+        return
+
+    destination, product_code = context.args[0], context.args[1]
+    try:
+        when = parse_schedule(context.args[2:])
+    except ValueError as e:
+        await message.reply_text(f"❌ {e}")
+        return
+
+    checked = classify_destination(destination) if DESTINATION_CHECK else None
+    if checked is not None:
+        if not checked.valid:
+            await message.reply_text(f"❌ {checked.error}")
+            return
+        destination = checked.number
+    if len(product_catalog):
+        product = product_catalog.get(product_code)
+        if product is None:
+            await message.reply_text(f"❌ Kode produk {product_code} tidak ditemukan.")
+            return
+        product_code = product.code
+        if checked is not None and not product_matches(checked, product):
+            await message.reply_text(f"❌ {mismatch_message(checked, product)}")
+            return
+
+    try:
+        schedule = order_scheduler.add(
+            user_id, update.effective_chat.id, destination, product_code, **when
+        )
+    except ValueError as e:
+        await message.reply_text(f"❌ {e}")
+        return
+
+    await message.reply_text(
+        f"✅ Jadwal #{schedule.id} dibuat\n"
+        f"Tujuan: {destination}\n"
+        f"Produk: {product_code}\n"
+        f"{schedule.describe()}\n\n"
+        "Order dikirim dalam beberapa menit setelah jam yang dijadwalkan. "
+        "Lihat atau hapus jadwal dengan /jadwal."
+    )
+
+
+async def show_schedules(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
+    """Handle the schedule list and its delete buttons"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    await schedules_loaded.wait()
+
+    if data.startswith("jadwal:hapus:"):
+        schedule_id = int(data[len("jadwal:hapus:"):])
+        if order_scheduler.remove(schedule_id, user_id=user_id):
+            await query.answer(f"Jadwal #{schedule_id} dihapus")
+        else:
+            await query.answer("Jadwal tidak ditemukan", show_alert=True)
+    else:
+        await query.answer()
+
+    text, reply_markup = schedule_list(user_id)
+    if reply_markup is None:
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")]])
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+async def fire_scheduled_order(schedule):
+    """Place the order of a due schedule the way place_order does; returns its refID"""
+    bot = application.bot
+    label = f"⏰ Order terjadwal #{schedule.id}\nTujuan: {schedule.destination}\nProduk: {schedule.product_code}\n"
+
+    product = product_catalog.get(schedule.product_code)
+    if balance_ledger is not None and product is not None and not balance_ledger.can_afford(product.price):
+        await bot.send_message(
+            schedule.chat_id,
+            label + f"\n❌ Dilewati, saldo tidak cukup (Rp {product.price:,}).",
+            **rate_limit(bot, Priority.LOW)
+        )
+        return None
+
+    # A scheduled run is its own confirmation, but never doubles an order still running
+    guard_key = (schedule.user_id, schedule.destination, schedule.product_code)
+    duplicate = order_guard.check(guard_key)
+    if duplicate is not None and duplicate.in_flight:
+        await bot.send_message(
+            schedule.chat_id,
+            label + f"\n⚠️ Dilewati, order yang sama masih diproses (Ref ID: {duplicate.ref_id}).",
+            **rate_limit(bot, Priority.LOW)
+        )
+        return None
+
+    ref_id = ref_ids.next()
+    status_message = asyncio.get_running_loop().create_future()
+    order_guard.begin(guard_key, ref_id)
+    try:
+        await journal.record(
+            ref_id, OrderState.CREATED, user_id=schedule.user_id, chat_id=schedule.chat_id,
+            destination=schedule.destination, product_code=schedule.product_code
+        )
+        order_dispatcher.submit(
+            schedule.user_id,
+            lambda: process_order(bot, schedule.chat_id, status_message, ref_id,
+                                  schedule.destination, schedule.product_code, guard_key)
+        )
+    except DispatcherFull:
+        await journal.record(ref_id, OrderState.FAILED, message="Antrian order penuh")
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': "Antrian order penuh"})
+        await bot.send_message(
+            schedule.chat_id, label + "\n⚠️ Gagal, antrian order sedang penuh.", **rate_limit(bot, Priority.LOW)
+        )
+        return ref_id
+    except Exception as e:
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': str(e)})
+        raise
+
+    try:
+        sent = await bot.send_message(schedule.chat_id, label + "\n⏳ Order diproses...",
+                                      **rate_limit(bot, Priority.LOW))
+    except Exception as e:
+        logger.error(f"Failed to send scheduled order status message: {e}")
+        sent = None
+    status_message.set_result(sent)
+    return ref_id
+
+
+async def notify_missed_schedule(schedule, due: float):
+    """Tell the user a scheduled run was skipped because the bot was down too long"""
+    try:
+        await application.bot.send_message(
+            schedule.chat_id,
+            f"⚠️ Order terjadwal #{schedule.id} ({schedule.product_code} → {schedule.destination}) "
+            f"untuk {order_scheduler.local_time(due):%d/%m %H:%M} dilewati karena bot sedang tidak aktif.\n"
+            "Silakan order manual bila masih diperlukan.",
+            **rate_limit(application.bot, Priority.LOW)
+        )
+    except Exception as e:
+        logger.error(f"Failed to notify chat {schedule.chat_id} of missed schedule {schedule.id}: {e}")
+
+
+def format_order_result(result: dict) -> str:
+    """Render an order result as a chat message"""
+    if result.get('pending'):
+        return (
+            f"⚠️ *Status Order Belum Pasti*\n\n"
+            f"Ref ID: {result.get('ref_id', '-')}\n"
+            f"Error: {result['error']}\n\n"
+            "Order mungkin sudah diproses. Status akan dicek ulang otomatis "
+            "dan dikirim ke chat ini; jangan ulangi order dulu."
+        )
+    
+    if result.get('accepted'):
+        data = result['data']
+        return (
+            f"⏳ *Order Diproses*\n\n"
+            f"Ref ID: {result.get('ref_id', '-')}\n"
+            f"Tujuan: {data.get('destination') or '-'}\n"
+            f"Produk: {data.get('product_name') or data.get('product_code') or '-'}\n\n"
+            "Status akhir akan dikirim otomatis ke chat ini."
+        )
+    
+    if result['success']:
+        data = result['data']
+        message = f"✅ *Order Berhasil!*\n\n"
+        message += f"Trx ID: {data.get('trx_id', '-')}\n"
+        message += f"Tujuan: {data.get('destination', '-')}\n"
+        message += f"Produk: {data.get('product_name', data.get('product_code', '-'))}\n"
+        message += f"Harga: Rp {data.get('price') or 0:,}\n"
+        message += f"Status: {data.get('status', '-')}\n"
+        if data.get('sn'):
+            message += f"SN: {data['sn']}\n"
+        message += f"Pesan: {data.get('message', '-')}"
+        return message
+    
+    return (
+        f"❌ *Order Gagal*\n\n"
+        f"Error: {result['error']}\n\n"
+        "Silakan coba lagi."
+    )
+
+
+async def process_order(bot, chat_id: int, status_message: asyncio.Future, ref_id: str,
+                        destination: str, product_code: str, guard_key: tuple):
+    """Run a queued order and edit the result into its status message"""
+    sent = await status_message
+    meta = {'message_id': sent.message_id} if sent is not None else None
+    
+    try:
+        result = await omega_pool.order_product(destination, product_code, ref_id=ref_id, meta=meta)
+    except Exception as e:
+        order_guard.finish(guard_key, {'success': False, 'ref_id': ref_id, 'error': str(e)})
+        raise
+    order_guard.finish(guard_key, result)
+    await send_order_result(bot, chat_id, sent.message_id if sent else None, result)
+
+
+def rate_limit(bot, priority: Priority) -> dict:
+    """Keyword arguments giving a Bot API call a rate governor priority; empty without a governor"""
+    if getattr(bot, 'rate_limiter', None) is None:
+        return {}
+    return {'rate_limit_args': priority}
+
+
+async def send_order_result(bot, chat_id: int, message_id, result: dict):
+    """Edit an order result into its status message, or send it as a new message"""
+    message = format_order_result(result)
+    reply_markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔙 Menu Utama", callback_data="menu_utama")
+    ]])
+    
+    if message_id is not None:
+        await bot.edit_message_text(
+            message, chat_id=chat_id, message_id=message_id,
+            reply_markup=reply_markup, parse_mode='Markdown', **rate_limit(bot, Priority.HIGH)
+        )
+    else:
+        await bot.send_message(
+            chat_id, message, reply_markup=reply_markup, parse_mode='Markdown', **rate_limit(bot, Priority.HIGH)
+        )
+
+
+async def reconcile_orders(bot, pending: list):
+    """
+    Settle orders left unfinished by a crash or restart.
+
+    Orders never sent upstream are failed. Sent orders are re-queried with
+    their original refID, which the upstream answers with the existing
+    transaction's status instead of charging again.
+    """
+    semaphore = asyncio.Semaphore(5)
+    
+    async def reconcile(record):
+        async with semaphore:
+            if record.state == OrderState.CREATED:
+                await journal.record(record.ref_id, OrderState.FAILED,
+                                     message="Order tidak terkirim sebelum bot restart")
+                result = {
+                    'success': False,
+                    'ref_id': record.ref_id,
+                    'error': "Order tidak terkirim sebelum bot restart, silakan order ulang."
+                }
+            else:
+                result = await omega_pool.order_product(
+                    record.destination, record.product_code, ref_id=record.ref_id,
+                    account=record.account or omega_pool.default.name
+                )
+            logger.info(f"Reconciled order {record.ref_id}: {record.state.value}")
+            await notify_order_settled(bot, record, result)
+    
+    await asyncio.gather(*[reconcile(record) for record in pending])
+
+
+def order_result_from_record(record) -> dict:
+    """Build an order result dict from a finished journal record"""
+    if record.state == OrderState.SUCCESS:
+        return {
+            'success': True,
+            'ref_id': record.ref_id,
+            'data': {
+                'trx_id': record.trx_id,
+                'destination': record.destination,
+                'product_code': record.product_code,
+                'price': record.price,
+                'status': 'success',
+                'sn': record.sn,
+                'message': record.message
+            }
+        }
+    return {
+        'success': False,
+        'ref_id': record.ref_id,
+        'error': record.message or 'Transaksi gagal'
+    }
+
+
+async def notify_order_settled(bot, record, result: dict):
+    """Push an order's final status to its chat once the order is finished"""
+    if record.pending or record.chat_id is None or result.get('pending') or result.get('accepted'):
+        return
+    try:
+        await send_order_result(bot, record.chat_id, record.message_id, result)
+    except Exception as e:
+        logger.error(f"Failed to notify chat {record.chat_id} for order {record.ref_id}: {e}")
+
+
+async def handle_report(report: dict) -> bool:
+    """
+    Apply a transaction report from the upstream callback.
+
+    Returns False when the refID is unknown. Repeated reports for an order
+    that is already finished are acknowledged and ignored.
+    """
+    await state_loaded.wait()
+    record = journal.get(report['ref_id'])
+    if record is None:
+        logger.warning(f"Report for unknown refID {report['ref_id']}")
+        return False
+    if not record.pending:
+        return True
+    
+    await journal.record(
+        record.ref_id, report['state'],
+        trx_id=report['trx_id'], sn=report['sn'], price=report['price'], message=report['message']
+    )
+    logger.info(f"Report for order {record.ref_id}: {record.state.value}")
+    
+    if not record.pending:
+        await notify_order_settled(application.bot, record, order_result_from_record(record))
+    return True
+
+
+async def check_order_status(record) -> dict:
+    """Ask the upstream for an order's status by re-sending it with its original refID"""
+    return await omega_pool.order_product(
+        record.destination, record.product_code, ref_id=record.ref_id,
+        account=record.account or omega_pool.default.name
+    )
+
+
+async def on_status_checked(record, result: dict):
+    """Notify the user when a fallback status check finds the order finished"""
+    await notify_order_settled(application.bot, record, result)
+
+
+# Fallback for orders that never receive a report callback
+report_poller = ReportPoller(
+    journal,
+    check=check_order_status,
+    on_result=on_status_checked,
+    interval=float(os.getenv('STATUS_POLL_INTERVAL', '30')),
+    min_age=float(os.getenv('STATUS_POLL_MIN_AGE', '60'))
+)
 
 
 async def show_bantuan(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -201,8 +1273,11 @@ async def show_bantuan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text += "📝 *Cara Order:*\n"
     help_text += "1. Pilih menu Order Produk\n"
     help_text += "2. Masukkan nomor tujuan\n"
-    help_text += "3. Masukkan kode produk\n"
+    help_text += "3. Pilih produk dari daftar, atau ketik kode produk\n"
     help_text += "4. Tunggu konfirmasi order\n\n"
+    help_text += "📋 *Bulk Order:* kirim /bulk untuk order banyak nomor sekaligus\n"
+    help_text += "📜 *Riwayat:* kirim /riwayat, atau /riwayat <Ref ID> untuk detail satu order\n"
+    help_text += "⏰ *Jadwal:* kirim /jadwal <tujuan> <kode> harian 07:00 untuk order rutin\n\n"
     help_text += "📞 *Hubungi Admin:* @admin_username"
     
     keyboard = [[InlineKeyboardButton("🔙 Kembali", callback_data="menu_utama")]]
@@ -221,8 +1296,7 @@ async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Clear session if exists
-    if user_id in user_sessions:
-        del user_sessions[user_id]
+    await session_store.delete(user_id)
     
     await query.edit_message_text(
         "🤖 *Bot Auto Order Omega Tronik*\n\n"
@@ -232,6 +1306,7 @@ async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@HANDLER_SECONDS.time('handle_callback')
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all callback queries"""
     query = update.callback_query
@@ -245,39 +1320,420 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_bantuan(update, context)
     elif data == "menu_utama":
         await back_to_menu(update, context)
+    elif data == "riwayat" or data.startswith("hist:"):
+        await state_loaded.wait()
+        await show_history(update, context, data)
+    elif data == "jadwal" or data.startswith("jadwal:"):
+        await show_schedules(update, context, data)
+    elif data.startswith("ulang:"):
+        await state_loaded.wait()
+        await repeat_order(update, context, data[len("ulang:"):])
+    elif data.startswith("prod:"):
+        await state_loaded.wait()
+        await select_product(update, context, data[len("prod:"):])
+    elif data.startswith("prodpage:"):
+        await state_loaded.wait()
+        await show_product_page(update, context, int(data[len("prodpage:"):]))
+    elif data == "noop":
+        await query.answer()
+
+
+# Set once the journal, history and catalog are loaded, and once schedules
+# are; handlers that need them wait, the rest answer right after a restart
+state_loaded = asyncio.Event()
+schedules_loaded = asyncio.Event()
+state_loader = None
+
+
+async def load_state(bot):
+    """Load what a restart carries over, off the critical path of the first update"""
+    started = time.perf_counter()
+    try:
+        pending = await journal.open()
+        await asyncio.to_thread(order_history.import_records, journal.records())
+        if balance_ledger is not None:
+            balance_ledger.track(pending)
+            balance_ledger.start()
+        await product_catalog.reload_file()
+        product_catalog.start(load_file=False)
+        report_poller.start()
+        state_loaded.set()
+        
+        await order_scheduler.start()
+        schedules_loaded.set()
+    except Exception:
+        # Handlers would wait forever; stop so the process is restarted
+        logger.critical("Loading state failed", exc_info=True)
+        os.kill(os.getpid(), signal.SIGTERM)
+        return
+    logger.info(f"State loaded in {time.perf_counter() - started:.2f}s")
+    
+    if pending:
+        logger.warning(f"Reconciling {len(pending)} unfinished orders from the journal")
+        await reconcile_orders(bot, pending)
+
+
+async def on_startup(app: Application):
+    """
+    Open shared upstream resources once the application is initialised
+
+    Only what the first update needs is started here. The journal, history,
+    catalog and schedules load in the background; see :func:`load_state`.
+    """
+    global state_loader
+    
+    await omega_pool.start()
+    session_store.start_sweeper(float(os.getenv('SESSION_SWEEP_INTERVAL', '60')))
+    order_guard.start_sweeper(float(os.getenv('SESSION_SWEEP_INTERVAL', '60')))
+    order_dispatcher.start()
+    if web_server is not None:
+        await web_server.start()
+    state_loader = asyncio.create_task(load_state(app.bot))
+
+
+async def on_shutdown(app: Application):
+    """Release shared upstream resources when the application stops"""
+    if web_server is not None:
+        await web_server.stop()
+    if state_loader is not None:
+        state_loader.cancel()
+        await asyncio.gather(state_loader, return_exceptions=True)
+    await report_poller.stop()
+    if balance_ledger is not None:
+        await balance_ledger.stop()
+    await product_catalog.stop()
+    await order_scheduler.stop()
+    await order_dispatcher.stop()
+    await order_guard.stop()
+    await omega_pool.close()
+    await session_store.close()
+    await journal.close()
+    order_history.close()
+    order_scheduler.store.close()
+
+
+def stop_on_signal() -> asyncio.Event:
+    """Event set on SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    return stop_event
+
+
+async def run_webhook(app: Application, webhook_url: str = None, secret_token=None):
+    """
+    Run the bot behind our own web server in webhook mode.
+
+    Mirrors Application.run_webhook, but the server also serves the
+    upstream report callback next to the Telegram webhook. Without
+    ``webhook_url`` (webhook workers) the webhook is left to the front.
+    """
+    stop_event = stop_on_signal()
+    
+    await app.initialize()
+    await on_startup(app)
+    try:
+        # Serve queued updates while the webhook is being set
+        await app.start()
+        if webhook_url:
+            await app.bot.set_webhook(
+                webhook_url,
+                allowed_updates=Update.ALL_TYPES,
+                secret_token=secret_token
+            )
+        await stop_event.wait()
+    finally:
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await on_shutdown(app)
+
+
+async def run_front(bot: Bot, server: WebServer, front: FrontReceiver, pool: WorkerPool,
+                    webhook_url: str, secret_token=None):
+    """
+    Run the webhook front: receive updates and reports, forward them to worker processes.
+
+    The front only parses update JSON far enough to pick a worker and drop
+    redeliveries; handlers run in the workers.
+    """
+    stop_event = stop_on_signal()
+    
+    pool.start()
+    await front.start()
+    await server.start()
+    try:
+        async with bot:
+            await bot.set_webhook(
+                webhook_url,
+                allowed_updates=Update.ALL_TYPES,
+                secret_token=secret_token
+            )
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        await pool.stop()
+        await front.close()
+
+
+# Admin-only introspection of the running process; nothing is traced or
+# sampled unless one of these commands asked for it
+ADMIN_IDS = {int(value) for value in os.getenv('ADMIN_IDS', '').replace(' ', '').split(',') if value}
+PROFILE_MAX_SECONDS = 300
+profile_lock = asyncio.Lock()
+memory_tracker = MemoryTracker()
+
+
+def is_admin(update: Update) -> bool:
+    user = update.effective_user
+    return user is not None and user.id in ADMIN_IDS
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [detik] [pstats] profiles the process and sends the result as a file"""
+    if not is_admin(update):
+        return
+    message = update.effective_message
+    args = context.args or []
+    seconds = 30
+    if args and args[0].isdigit():
+        seconds = min(max(int(args[0]), 1), PROFILE_MAX_SECONDS)
+    exact = 'pstats' in args
+
+    if profile_lock.locked():
+        await message.reply_text("⚠️ Profiling lain masih berjalan.")
+        return
+    async with profile_lock:
+        await message.reply_text(
+            f"⏱ {'cProfile' if exact else 'Sampling profile'} {seconds} detik dimulai..."
+        )
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        if exact:
+            data, report = await profile_calls(seconds)
+            await message.reply_document(
+                InputFile(data, filename=f"profile-{stamp}.pstats"),
+                caption="Buka dengan: python -m pstats <file>"
+            )
+            await message.reply_document(InputFile(report.encode(), filename=f"profile-{stamp}.txt"))
+            return
+
+        sampler = SamplingProfiler()
+        await sampler.run(seconds)
+        top = "\n".join(f"{share:6.1%} {name}" for name, share in sampler.top(8))
+        await message.reply_document(
+            InputFile(sampler.folded().encode(), filename=f"profile-{stamp}.folded"),
+            caption=f"{sampler.samples} sampel. Teratas:\n{top}"[:1024]
+        )
+
+
+async def mem(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/mem start|stop, or /mem for a tracemalloc snapshot compared with the previous one"""
+    if not is_admin(update):
+        return
+    message = update.effective_message
+    action = context.args[0].lower() if context.args else 'snapshot'
+
+    if action == 'start':
+        memory_tracker.start()
+        await message.reply_text("🧠 tracemalloc aktif. Kirim /mem untuk snapshot, /mem stop untuk berhenti.")
+        return
+    if action == 'stop':
+        memory_tracker.stop()
+        await message.reply_text("🧠 tracemalloc dimatikan.")
+        return
+    if not memory_tracker.tracing:
+        await message.reply_text("🧠 tracemalloc belum aktif. Kirim /mem start dulu.")
+        return
+
+    report = memory_tracker.snapshot()
+    report += (
+        f"\n\nsessions={await session_store.size()} product_lists={len(narrowed_products)} "
+        f"order_guard={len(order_guard)} journal_unsettled={len(journal.pending())} "
+        f"schedules={len(order_scheduler)} update_chats={update_processor.chats}"
+    )
+    await message.reply_document(
+        InputFile(report.encode(), filename=f"mem-{time.strftime('%Y%m%d-%H%M%S')}.txt"),
+        caption=report.split('\n', 1)[0]
+    )
+
+
+async def tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/tasks sends every live asyncio task and where it waits"""
+    if not is_admin(update):
+        return
+    report = dump_tasks()
+    await update.effective_message.reply_document(
+        InputFile(report.encode(), filename=f"tasks-{time.strftime('%Y%m%d-%H%M%S')}.txt"),
+        caption=report.split('\n', 1)[0]
+    )
+
+
+def register_handlers(app: Application):
+    """Register the bot's update handlers on an application"""
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("bulk", bulk_order))
+    app.add_handler(CommandHandler("riwayat", riwayat))
+    app.add_handler(CommandHandler("jadwal", jadwal))
+    app.add_handler(CommandHandler("profile", profile))
+    app.add_handler(CommandHandler("mem", mem))
+    app.add_handler(CommandHandler("tasks", tasks))
+    app.add_handler(MessageHandler(filters.Document.FileExtension("csv"), bulk_order))
+    app.add_handler(CallbackQueryHandler(handle_callback))
+    app.add_handler(InlineQueryHandler(handle_inline_query))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+
+
+def build_application(bot_token: str, telegram_api_url: str = None, polling: bool = True) -> Application:
+    """
+    Build the bot application with its lifecycle hooks, update processor and outbound rate governor
+
+    Args:
+        bot_token: Bot token from @BotFather
+        telegram_api_url: Alternative Bot API base URL
+        polling: Whether PTB's updater is needed; webhook modes feed updates themselves
+
+    Returns:
+        The application, not yet initialised
+    """
+    builder = (
+        Application.builder()
+        .token(bot_token)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .concurrent_updates(update_processor)
+    )
+    if telegram_api_url:
+        builder = builder.base_url(telegram_api_url)
+    if os.getenv('TELEGRAM_RATE_LIMIT', 'true').lower() == 'true':
+        # Webhook workers split the bot-wide limit; chats are pinned to one worker
+        global_rate = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+        if WORKER_INDEX is not None:
+            global_rate /= int(os.getenv('WEBHOOK_WORKERS', '1'))
+        builder = builder.rate_limiter(TelegramRateGovernor(
+            global_rate=global_rate,
+            chat_rate=float(os.getenv('TELEGRAM_CHAT_RATE', '1')),
+            chat_burst=float(os.getenv('TELEGRAM_CHAT_BURST', '3')),
+            group_rate=float(os.getenv('TELEGRAM_GROUP_RATE', '20')) / 60
+        ))
+    if not polling:
+        builder = builder.updater(None)
+    return builder.build()
+
+
+def run_worker(bot_token: str, telegram_api_url: str = None):
+    """
+    Run one webhook worker started by the front.
+
+    The worker serves forwarded updates and reports on a loopback port,
+    guarded by the front's INTERNAL_TOKEN, and never touches the webhook.
+    """
+    global application, web_server
+    
+    internal_token = os.environ['INTERNAL_TOKEN']
+    application = build_application(bot_token, telegram_api_url, polling=False)
+    
+    web_server = WebServer(port=int(os.environ['WORKER_PORT']), host='127.0.0.1')
+    web_server.add_telegram_webhook('/update', application, secret_token=internal_token)
+    web_server.add_route('/report', ReportHandler, on_report=handle_report, secret=internal_token)
+    web_server.add_metrics('/metrics')
+    register_handlers(application)
+    
+    logger.info(f"Starting webhook worker {WORKER_INDEX} (refID node {ref_ids.node_id})...")
+    asyncio.run(run_webhook(application, secret_token=internal_token))
 
 
 def main():
     """Main function to run the bot"""
-    global application, update_queue, bot_loop
+    global application, web_server
     
     bot_token = os.getenv('BOT_TOKEN')
     webhook_mode = os.getenv('WEBHOOK_MODE', 'false').lower() == 'true'
     webhook_url = os.getenv('WEBHOOK_URL', '')
+    webhook_secret = os.getenv('WEBHOOK_SECRET_TOKEN') or None
+    report_secret = os.getenv('REPORT_SECRET') or None
+    metrics_enabled = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    webhook_workers = int(os.getenv('WEBHOOK_WORKERS', '1'))
+    telegram_api_url = os.getenv('TELEGRAM_API_URL') or None
     
     if not bot_token:
         logger.error("BOT_TOKEN not found in environment variables")
         return
     
-    # Create application
-    application = Application.builder().token(bot_token).build()
+    trusted_proxy = os.getenv('TRUSTED_PROXY', 'false').lower() == 'true'
     
-    # Register handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CallbackQueryHandler(handle_callback))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    report_ips = [ip.strip() for ip in os.getenv('REPORT_ALLOWED_IPS', '').split(',') if ip.strip()]
+    if report_ips and not report_secret:
+        logger.error("REPORT_ALLOWED_IPS requires REPORT_SECRET; transaction reports are disabled")
+    reports_enabled = bool(report_secret)
+    
+    if WORKER_INDEX is not None:
+        run_worker(bot_token, telegram_api_url)
+        return
+    if webhook_mode and webhook_workers > 1:
+        # Front process: the webhook and report endpoints forward to workers
+        # that share an internal token and listen on loopback ports
+        internal_token = secrets.token_urlsafe(32)
+        pool = WorkerPool(
+            webhook_workers,
+            base_port=int(os.getenv('WORKER_BASE_PORT', '8100')),
+            command=worker_command(),
+            env={'INTERNAL_TOKEN': internal_token}
+        )
+        front = FrontReceiver(
+            [pool.url(index) for index in range(webhook_workers)],
+            internal_token,
+            base_node=REFID_NODE
+        )
+        web_server = WebServer(port=WEB_SERVER_PORT, trusted_proxy=trusted_proxy)
+        web_server.add_route('/webhook', FrontWebhookHandler, front=front, secret_token=webhook_secret)
+        if metrics_enabled:
+            metrics_token = os.getenv('METRICS_TOKEN') or None
+            web_server.add_metrics('/metrics', token=metrics_token)
+            web_server.add_route(r'/metrics/worker/(\d+)', WorkerMetricsHandler, front=front, token=metrics_token)
+        if reports_enabled:
+            web_server.add_route(
+                os.getenv('REPORT_PATH', '/omega/report'),
+                ReportHandler,
+                on_report=front.forward_report,
+                secret=report_secret,
+                allowed_ips=report_ips
+            )
+        
+        logger.info(f"Starting webhook front with {webhook_workers} workers...")
+        bot = Bot(bot_token, base_url=telegram_api_url) if telegram_api_url else Bot(bot_token)
+        asyncio.run(run_front(bot, web_server, front, pool, webhook_url, secret_token=webhook_secret))
+        return
+    
+    # Create application; in webhook mode our WebServer replaces PTB's updater
+    application = build_application(bot_token, telegram_api_url, polling=not webhook_mode)
+    
+    # Web server for the Telegram webhook, upstream report callbacks and
+    # metrics. Reports are only accepted with the shared secret, and from an
+    # allowed IP when a list is set; in polling mode the server runs for
+    # reports and /metrics only.
+    if webhook_mode or reports_enabled or metrics_enabled:
+        web_server = WebServer(port=WEB_SERVER_PORT, trusted_proxy=trusted_proxy)
+        if metrics_enabled:
+            web_server.add_metrics('/metrics', token=os.getenv('METRICS_TOKEN') or None)
+        if webhook_mode:
+            web_server.add_telegram_webhook('/webhook', application, secret_token=webhook_secret)
+        if reports_enabled:
+            web_server.add_route(
+                os.getenv('REPORT_PATH', '/omega/report'),
+                ReportHandler,
+                on_report=handle_report,
+                secret=report_secret,
+                allowed_ips=report_ips
+            )
+    
+    register_handlers(application)
     
     if webhook_mode:
         # Webhook mode
         logger.info("Starting bot in webhook mode...")
         
-        # Set webhook
-        application.run_webhook(
-            listen='0.0.0.0',
-            port=8095,
-            url_path='webhook',
-            webhook_url=webhook_url
-        )
+        asyncio.run(run_webhook(application, webhook_url, secret_token=webhook_secret))
     else:
         # Polling mode
         logger.info("Starting bot in polling mode...")
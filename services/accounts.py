@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.journal import OrderRecord, OrderState, TransactionJournal
+from services.ledger import parse_amount, parse_balance
+from services.omegatronik import OmegatronikService, journal_order_result
+from utils import metrics
+from utils.refid import RefIdAllocator
+
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_ORDERS = metrics.counter(
+    'omega_account_orders_total', 'Orders sent per upstream account', ('account', 'result')
+)
+ACCOUNT_FAILOVERS = metrics.counter(
+    'omega_account_failovers_total', 'Orders moved to another account after a rejection', ('reason',)
+)
+
+POLICIES = ('least_loaded', 'balance', 'sticky')
+
+# Rejections that say nothing about the order itself, only about the account
+_NO_FUNDS_PATTERN = re.compile(r'saldo\s+(tidak\s+cukup|kurang|habis)|insufficient', re.IGNORECASE)
+_RATE_LIMITED_PATTERN = re.compile(r'^HTTP 429\b|rate.?limit|terlalu banyak', re.IGNORECASE)
+
+
+class Account:
+    """One upstream account of the pool and what is known about it"""
+
+    __slots__ = ('name', 'service', 'balance', 'reserved', 'in_flight', 'no_funds', 'limited_until')
+
+    def __init__(self, service: OmegatronikService):
+        self.name = service.member_id
+        self.service = service
+        self.balance: Optional[int] = None  # last CekSaldo minus orders charged since
+        self.reserved = 0                   # catalog price of orders in flight
+        self.in_flight = 0
+        self.no_funds = False               # rejected for balance, until a fresh CekSaldo
+        self.limited_until = 0.0            # rate limited by the upstream until then
+
+    def __repr__(self) -> str:
+        return f"<Account {self.name} {self.status}>"
+
+    @property
+    def status(self) -> str:
+        """'active', 'no_funds' or 'rate_limited'"""
+        if self.no_funds:
+            return 'no_funds'
+        if self.limited_until > time.monotonic():
+            return 'rate_limited'
+        return 'active'
+
+    def can_take(self, price: int, now: float) -> bool:
+        if self.no_funds or self.limited_until > now:
+            return False
+        return self.balance is None or self.balance - self.reserved >= price
+
+
+class AccountPool:
+    """
+    Orders spread over several upstream accounts (member IDs).
+
+    Each account has its own :class:`OmegatronikService`, so its own rate
+    limiter, endpoint health and balance cache; throughput grows with the
+    number of accounts instead of stopping at one account's limits. Every
+    order goes to one account chosen by ``policy``:
+
+    - ``least_loaded``: fewest orders in flight, then the highest balance
+    - ``balance``: highest known balance
+    - ``sticky``: the same account for every product of a product group,
+      by rendezvous hashing, so removing an account only moves its groups
+
+    An account rejected for lack of funds leaves the rotation until a fresh
+    balance check shows money again; one rate limited by the upstream leaves
+    it for ``rate_limit_cooldown`` seconds. Both rejections happen before the
+    order is charged, so the order is retried on the next account under the
+    same refID. The account that placed an order is journaled with it, since
+    its status can only be asked from that account.
+
+    Accepted and successful orders are taken off the account's known
+    balance at once; an order that later fails (see :meth:`on_record`) is
+    given back, so the balance policy does not drift until the next check.
+    """
+
+    # Charged orders remembered for refunds
+    max_tracked = 10_000
+
+    def __init__(self, services: List[OmegatronikService], policy: str = 'least_loaded',
+                 journal: Optional[TransactionJournal] = None,
+                 ref_ids: Optional[RefIdAllocator] = None,
+                 price_of: Callable[[str], Optional[int]] = lambda code: None,
+                 group_of: Callable[[str], Optional[str]] = lambda code: None,
+                 rate_limit_cooldown: float = 30.0, recheck_interval: float = 60.0):
+        """
+        Initialize pool
+
+        Args:
+            services: One service per account, the default account first
+            policy: 'least_loaded', 'balance' or 'sticky'
+            journal: Transaction journal that records every order's state;
+                the services themselves should not journal
+            ref_ids: refID allocator shared with the rest of the process
+            price_of: Catalog price of a product code, to skip accounts that
+                cannot pay for it
+            group_of: Product group of a product code, for the sticky policy
+            rate_limit_cooldown: Seconds a rate limited account is skipped
+            recheck_interval: Seconds between balance checks of accounts
+                taken out of rotation for lack of funds
+        """
+        if not services:
+            raise ValueError("AccountPool needs at least one account")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown account policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.accounts = [Account(service) for service in services]
+        self.policy = policy
+        self.journal = journal
+        self.ref_ids = ref_ids or RefIdAllocator()
+        self.price_of = price_of
+        self.group_of = group_of
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.recheck_interval = recheck_interval
+
+        self._by_name = {account.name: account for account in self.accounts}
+        if len(self._by_name) != len(self.accounts):
+            raise ValueError("Duplicate member ID in account pool")
+        self._task: Optional[asyncio.Task] = None
+        self._charged: OrderedDict[str, Tuple[Account, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def get(self, name: str) -> Optional[Account]:
+        return self._by_name.get(name)
+
+    @property
+    def default(self) -> Account:
+        """Account of orders journaled before the pool recorded accounts"""
+        return self.accounts[0]
+
+    async def start(self) -> None:
+        for account in self.accounts:
+            await account.service.start()
+        if len(self.accounts) > 1 and self._task is None:
+            self._task = asyncio.create_task(self._recheck_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for account in self.accounts:
+            await account.service.close()
+
+    def choose(self, product_code: str, exclude: tuple = ()) -> Account:
+        """
+        Account for the next order of ``product_code``
+
+        When no account is known to be able to take it, every account not
+        yet tried is a candidate; the upstream has the final word.
+        """
+        now = time.monotonic()
+        price = self.price_of(product_code) or 0
+        candidates = [a for a in self.accounts if a not in exclude and a.can_take(price, now)]
+        if not candidates:
+            candidates = [a for a in self.accounts if a not in exclude] or self.accounts
+
+        if self.policy == 'balance':
+            return max(candidates, key=lambda a: (a.balance or 0) - a.reserved)
+        if self.policy == 'sticky':
+            group = (self.group_of(product_code) or product_code).encode()
+            return max(candidates, key=lambda a: zlib.crc32(group + a.name.encode()))
+        return min(candidates, key=lambda a: (a.in_flight, -((a.balance or 0) - a.reserved)))
+
+    async def check_balance(self, fresh: bool = False) -> Dict[str, Any]:
+        """
+        Total balance of all accounts, in check_balance's result format
+
+        Fails when any account cannot be checked, as a partial total would
+        look like a drop in balance. 'accounts' maps member IDs to balances.
+        """
+        results = await asyncio.gather(*[self._check(account, fresh) for account in self.accounts])
+        if len(self.accounts) == 1:
+            return results[0]
+
+        total = 0
+        balances = {}
+        for account, result in zip(self.accounts, results):
+            if not result['success']:
+                return {'success': False, 'error': f"Akun {account.name}: {result['error']}"}
+            balances[account.name] = parse_balance(result['data'])
+            total += balances[account.name] or 0
+        return {
+            'success': True,
+            'data': {
+                'saldo': total,
+                'status': 'active',
+                'message': f"Total saldo {len(self.accounts)} akun",
+                'accounts': balances
+            }
+        }
+
+    async def _check(self, account: Account, fresh: bool) -> Dict[str, Any]:
+        result = await account.service.check_balance(fresh=fresh)
+        balance = parse_balance(result['data']) if result['success'] else None
+        if balance is not None:
+            account.balance = balance
+            if account.no_funds:
+                account.no_funds = False
+                logger.info(f"Account {account.name} back in rotation, balance Rp {balance:,}")
+        return result
+
+    async def order_product(self, destination: str, product_code: str,
+                            ref_id: Optional[str] = None,
+                            meta: Optional[Dict[str, Any]] = None,
+                            account: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Order a product through one of the accounts
+
+        Args:
+            destination: Destination number
+            product_code: Product code to order
+            ref_id: refID to send; a new one is allocated when omitted
+            meta: Extra fields for the journal record (user_id, chat_id, message_id)
+            account: Account that placed an earlier order with this refID,
+                to ask for its status; a new order goes to the account the
+                policy picks when omitted
+
+        Returns:
+            OmegatronikService.order_product's result dict
+        """
+        if ref_id is None:
+            ref_id = self.ref_ids.next()
+
+        pinned = None
+        if account is not None:
+            pinned = self._by_name.get(account)
+            if pinned is None:
+                # Re-sending the refID to another account would place a new order
+                return {
+                    'success': False, 'pending': True, 'ref_id': ref_id,
+                    'error': f"Akun {account} tidak lagi dikonfigurasi, status order tidak bisa dicek"
+                }
+
+        tried = []
+        while True:
+            current = pinned or self.choose(product_code, exclude=tuple(tried))
+            result = await self._send(current, destination, product_code, ref_id, meta)
+            reason = self._rejection(result)
+            if reason is None or pinned is not None or len(tried) + 1 >= len(self.accounts):
+                break
+            tried.append(current)
+            ACCOUNT_FAILOVERS.inc(reason)
+            logger.warning(f"Order {ref_id} rejected by account {current.name} ({reason}), trying another account")
+
+        if self.journal is not None:
+            await journal_order_result(self.journal, ref_id, result)
+        return result
+
+    async def _send(self, account: Account, destination: str, product_code: str, ref_id: str,
+                    meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Counted before the first await, so orders placed together spread out
+        price = self.price_of(product_code) or 0
+        account.in_flight += 1
+        account.reserved += price
+        try:
+            if self.journal is not None:
+                # Durable before the request goes out, so a crash leaves a trace to reconcile
+                await self.journal.record(
+                    ref_id, OrderState.SENT, account=account.name,
+                    destination=destination, product_code=product_code, **(meta or {})
+                )
+            result = await account.service.send_order(destination, product_code, ref_id)
+        finally:
+            account.in_flight -= 1
+            account.reserved -= price
+
+        if result['success'] or result.get('accepted'):
+            # An unreadable reported price skips the local debit; the next balance check corrects it
+            reported = result['data'].get('price')
+            charged = parse_amount(reported) if reported else price
+            if charged and account.balance is not None:
+                account.balance -= charged
+                self._charged[ref_id] = (account, charged)
+                while len(self._charged) > self.max_tracked:
+                    self._charged.popitem(last=False)
+            ACCOUNT_ORDERS.inc(account.name, 'accepted' if result.get('accepted') else 'success')
+        elif result.get('pending'):
+            ACCOUNT_ORDERS.inc(account.name, 'pending')
+        else:
+            reason = self._rejection(result)
+            if reason == 'no_funds' and not account.no_funds:
+                account.no_funds = True
+                logger.warning(f"Account {account.name} is out of funds, taking it out of rotation")
+            elif reason == 'rate_limited':
+                account.limited_until = time.monotonic() + self.rate_limit_cooldown
+                logger.warning(f"Account {account.name} is rate limited, "
+                               f"skipping it for {self.rate_limit_cooldown:.0f}s")
+            ACCOUNT_ORDERS.inc(account.name, reason or 'failed')
+        return result
+
+    def on_record(self, record: OrderRecord) -> None:
+        """Refund the account of an order that failed after it was charged; registered as a journal listener"""
+        if record.state == OrderState.FAILED:
+            charged = self._charged.pop(record.ref_id, None)
+            if charged is not None:
+                account, amount = charged
+                if account.balance is not None:
+                    account.balance += amount
+        elif record.state == OrderState.SUCCESS:
+            self._charged.pop(record.ref_id, None)
+
+    @staticmethod
+    def _rejection(result: Dict[str, Any]) -> Optional[str]:
+        """'no_funds' or 'rate_limited' when the account, not the order, was refused"""
+        if result['success'] or result.get('pending') or result.get('accepted'):
+            return None
+        error = result.get('error') or ''
+        if _NO_FUNDS_PATTERN.search(error):
+            return 'no_funds'
+        if _RATE_LIMITED_PATTERN.search(error):
+            return 'rate_limited'
+        return None
+
+    async def _recheck_loop(self) -> None:
+        # Every balance once at startup, then only accounts out of funds
+        accounts = self.accounts
+        while True:
+            for account in accounts:
+                try:
+                    await self._check(account, fresh=True)
+                except Exception as e:
+                    logger.error(f"Balance check of account {account.name} failed: {e}")
+            await asyncio.sleep(self.recheck_interval)
+            accounts = [account for account in self.accounts if account.no_funds]
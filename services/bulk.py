@@ -0,0 +1,226 @@
+import asyncio
+import csv
+import io
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+_DESTINATION_PATTERN = re.compile(r'^\+?\d{5,24}$')
+_SEPARATOR_PATTERN = re.compile(r'[,;\t ]+')
+_HEADER_WORDS = {'dest', 'destination', 'tujuan', 'nomor', 'no', 'msisdn'}
+
+RESULT_COLUMNS = ('line', 'destination', 'product', 'status', 'ref_id', 'trx_id', 'price', 'message')
+
+
+class BulkRow:
+    """One order line of a bulk batch and, once run, its result"""
+
+    __slots__ = ('line', 'destination', 'product_code', 'result')
+
+    def __init__(self, line: int, destination: str, product_code: str):
+        self.line = line
+        self.destination = destination
+        self.product_code = product_code
+        self.result: Optional[Dict[str, Any]] = None
+
+    def __repr__(self) -> str:
+        return f"<BulkRow {self.line} {self.destination} {self.product_code}>"
+
+    @property
+    def status(self) -> str:
+        """'queued', 'success', 'accepted', 'pending' or 'failed'"""
+        result = self.result
+        if result is None:
+            return 'queued'
+        if result.get('pending'):
+            return 'pending'
+        if result.get('accepted'):
+            return 'accepted'
+        return 'success' if result['success'] else 'failed'
+
+
+def parse_bulk_orders(text: str, max_rows: int = 500,
+                      resolve_product: Optional[Callable[[str], Optional[str]]] = None,
+                      check_destination: Optional[Callable[[str, str], Tuple[str, Optional[str]]]] = None
+                      ) -> Tuple[List[BulkRow], List[str]]:
+    """
+    Parse and validate a pasted list or CSV of ``dest,product`` rows
+
+    Columns may be separated by commas, semicolons, tabs or spaces. Blank
+    lines, ``#`` comments and a header row are skipped. Every row is checked
+    before anything is ordered, so a batch either runs whole or not at all.
+
+    Args:
+        text: Order list, one ``dest,product`` pair per line
+        max_rows: Largest batch accepted
+        resolve_product: Returns the canonical product code, or None for an
+            unknown code; codes are only upper-cased when omitted
+        check_destination: Called with the destination and the resolved
+            product code; returns the normalised destination and an error
+            message, or None when the pair can be ordered
+
+    Returns:
+        Tuple of (rows, errors); errors name the offending line numbers
+    """
+    rows: List[BulkRow] = []
+    errors: List[str] = []
+    seen: Dict[Tuple[str, str], int] = {}
+
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        cells = [cell.strip('"\' ') for cell in _SEPARATOR_PATTERN.split(line) if cell.strip('"\' ')]
+        if not rows and not errors and cells and cells[0].lower() in _HEADER_WORDS:
+            continue
+        if len(cells) != 2:
+            errors.append(f"Baris {number}: format harus tujuan,kode_produk")
+            continue
+
+        destination, product_code = cells
+        if not _DESTINATION_PATTERN.match(destination):
+            errors.append(f"Baris {number}: nomor tujuan {destination} tidak valid")
+            continue
+
+        if resolve_product is not None:
+            resolved = resolve_product(product_code)
+            if resolved is None:
+                errors.append(f"Baris {number}: kode produk {product_code} tidak ditemukan")
+                continue
+            product_code = resolved
+        else:
+            product_code = product_code.upper()
+
+        if check_destination is not None:
+            destination, error = check_destination(destination, product_code)
+            if error is not None:
+                errors.append(f"Baris {number}: {error}")
+                continue
+
+        # The same top-up twice in one batch is almost always a paste mistake
+        key = (destination, product_code)
+        if key in seen:
+            errors.append(f"Baris {number}: duplikat dari baris {seen[key]}")
+            continue
+        seen[key] = number
+        rows.append(BulkRow(number, destination, product_code))
+
+    if len(rows) > max_rows:
+        errors.append(f"Maksimal {max_rows} order per batch, diterima {len(rows)}")
+    return rows, errors
+
+
+class BulkOrderBatch:
+    """
+    Runs the rows of a bulk order concurrently and reports progress.
+
+    At most ``concurrency`` orders are in flight; pass a shared semaphore to
+    bound several batches together. ``on_progress`` is called at most once
+    per ``progress_interval`` seconds while orders finish, and once more at
+    the end, so a chat message can be edited in place without hitting
+    Telegram's edit limits.
+    """
+
+    def __init__(self, rows: List[BulkRow],
+                 order: Callable[[BulkRow], Awaitable[Dict[str, Any]]],
+                 concurrency: int = 10,
+                 semaphore: Optional[asyncio.Semaphore] = None,
+                 on_progress: Optional[Callable[['BulkOrderBatch'], Awaitable[None]]] = None,
+                 progress_interval: float = 2.0):
+        """
+        Initialize batch
+
+        Args:
+            rows: Validated rows from parse_bulk_orders
+            order: Coroutine that places one row's order and returns its result dict
+            concurrency: Orders in flight when no semaphore is given
+            semaphore: Shared limit across batches; overrides concurrency
+            on_progress: Coroutine called with the batch as orders finish
+            progress_interval: Minimum seconds between progress calls
+        """
+        self.rows = rows
+        self.order = order
+        self.semaphore = semaphore or asyncio.Semaphore(concurrency)
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+
+        self.counts = {'success': 0, 'accepted': 0, 'pending': 0, 'failed': 0}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._last_progress = 0.0
+        self._progress_task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    async def run(self) -> List[BulkRow]:
+        """Place every order and return the rows with their results"""
+        self.started_at = time.monotonic()
+        await asyncio.gather(*[self._run_row(row) for row in self.rows])
+        self.finished_at = time.monotonic()
+
+        if self._progress_task is not None:
+            await asyncio.gather(self._progress_task, return_exceptions=True)
+        if self.on_progress is not None:
+            await self._report()
+        logger.info(f"Bulk batch of {len(self.rows)} orders finished in {self.elapsed:.1f}s: {self.counts}")
+        return self.rows
+
+    async def _run_row(self, row: BulkRow) -> None:
+        async with self.semaphore:
+            try:
+                row.result = await self.order(row)
+            except Exception as e:
+                logger.error(f"Bulk order line {row.line} failed: {e}")
+                row.result = {'success': False, 'error': f"Unexpected error: {e}"}
+        self.counts[row.status] += 1
+        self._maybe_report()
+
+    def _maybe_report(self) -> None:
+        # One progress update in flight at a time, spaced by progress_interval
+        if self.on_progress is None or self.done == len(self.rows):
+            return
+        if self._progress_task is not None and not self._progress_task.done():
+            return
+        now = time.monotonic()
+        if now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self._progress_task = asyncio.create_task(self._report())
+
+    async def _report(self) -> None:
+        try:
+            await self.on_progress(self)
+        except Exception as e:
+            logger.warning(f"Bulk progress update failed: {e}")
+
+    def results_csv(self) -> bytes:
+        """Per-row results as a CSV file body"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(RESULT_COLUMNS)
+        for row in self.rows:
+            result = row.result or {}
+            data = result.get('data') or {}
+            writer.writerow((
+                row.line,
+                row.destination,
+                row.product_code,
+                row.status,
+                result.get('ref_id', ''),
+                data.get('trx_id') or '',
+                data.get('price') or '',
+                result.get('error') or data.get('message') or '',
+            ))
+        return buffer.getvalue().encode('utf-8')
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightCache:
+    """
+    Cache a single async result with a TTL and single-flight loading.
+
+    Concurrent callers that miss the cache share one in-flight load instead
+    of each calling the loader. Only successful results (``success`` is
+    True) are cached, so errors are retried on the next call.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Dict[str, Any]]],
+                 ttl: float = 10.0, serve_stale: bool = False, max_stale: float = 300.0):
+        """
+        Initialize cache
+
+        Args:
+            loader: Coroutine function that fetches a fresh result
+            ttl: Seconds a cached result stays fresh; 0 disables caching but
+                keeps request coalescing
+            serve_stale: Return an expired result immediately while a
+                background refresh runs
+            max_stale: Oldest age (seconds) a result may have to be served stale
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self.serve_stale = serve_stale
+        self.max_stale = max_stale
+
+        self._value: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._inflight: Optional[asyncio.Future] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the cached result was loaded, or None if empty"""
+        if self._value is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def invalidate(self) -> None:
+        """
+        Drop the cached result.
+
+        A load already in flight still answers its waiters, but its result
+        is not stored, since it may predate whatever caused the invalidation.
+        """
+        self._value = None
+        self._generation += 1
+
+    async def get(self, fresh: bool = False) -> Dict[str, Any]:
+        """
+        Return the cached result, loading it if missing or expired
+
+        Args:
+            fresh: Skip the cache and wait for a new load (still coalesced)
+        """
+        age = self.age
+        if not fresh and age is not None:
+            if age < self.ttl:
+                return self._value
+            if self.serve_stale and age < self.max_stale:
+                self._start_load()
+                return self._value
+
+        return await asyncio.shield(self._start_load())
+
+    def _start_load(self) -> asyncio.Future:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load(self._generation))
+            # Background refreshes may have no waiter; retrieve errors so they are not reported as unhandled
+            self._inflight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return self._inflight
+
+    async def _load(self, generation: int) -> Dict[str, Any]:
+        try:
+            result = await self._loader()
+            if result.get("success") and generation == self._generation:
+                self._value = result
+                self._loaded_at = time.monotonic()
+            return result
+        except Exception as e:
+            logger.error(f"Cache loader failed: {e}")
+            raise
+        finally:
+            self._inflight = None
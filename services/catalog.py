@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import csv
+import io
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+class Product:
+    """One entry of the price list"""
+
+    __slots__ = ('code', 'name', 'price', 'group', 'active')
+
+    def __init__(self, code: str, name: str, price: int = 0, group: str = '', active: bool = True):
+        self.code = code
+        self.name = name
+        self.price = price
+        self.group = group
+        self.active = active
+
+    def __repr__(self) -> str:
+        return f"<Product {self.code} {self.name!r} Rp {self.price}>"
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over product codes and name words.
+
+    Keys are kept in one sorted list, so a prefix lookup is a binary search
+    to the first match followed by a scan of the matching range. Compact
+    compared with a node-per-character trie, with the same O(log n + k) cost.
+    """
+
+    def __init__(self, products: Iterable[Product]):
+        entries: List[Tuple[str, int]] = []
+        self.products: List[Product] = list(products)
+        for i, product in enumerate(self.products):
+            keys = {product.code.lower()}
+            keys.update(word for word in product.name.lower().split() if word)
+            if product.group:
+                keys.add(product.group.lower())
+            entries.extend((key, i) for key in keys)
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ids = [i for _, i in entries]
+
+    def prefix(self, prefix: str, limit: int) -> List[int]:
+        """Indices of products with a key starting with ``prefix``, in key order"""
+        start = bisect.bisect_left(self._keys, prefix)
+        seen = set()
+        found = []
+        for pos in range(start, len(self._keys)):
+            if not self._keys[pos].startswith(prefix):
+                break
+            i = self._ids[pos]
+            if i not in seen:
+                seen.add(i)
+                found.append(i)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+class ProductCatalog:
+    """
+    Product price list with local code validation and search.
+
+    Loads from a local CSV/JSON file and/or a price list URL, refreshes in
+    the background, and answers lookups from memory. Search results are
+    cached per query until the next refresh.
+    """
+
+    def __init__(self, path: Optional[str] = None, url: Optional[str] = None,
+                 refresh_interval: float = 3600.0, search_cache_size: int = 1024):
+        """
+        Initialize catalog
+
+        Args:
+            path: Local price list file (.csv with code,name,price[,group] or .json list)
+            url: Price list URL (JSON or CSV body), preferred over the file when reachable
+            refresh_interval: Seconds between background refreshes
+            search_cache_size: Number of distinct search queries kept cached
+        """
+        self.path = path
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.search_cache_size = search_cache_size
+
+        self._by_code: Dict[str, Product] = {}
+        self._products: List[Product] = []
+        self._index = PrefixIndex([])
+        self._search_cache: OrderedDict = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    @property
+    def products(self) -> List[Product]:
+        """Active products, sorted by group, price and code"""
+        return self._products
+
+    def get(self, code: str) -> Optional[Product]:
+        """Look up an active product by code (case-insensitive)"""
+        return self._by_code.get(code.strip().upper())
+
+    def search(self, query: str, limit: int = 20) -> List[Product]:
+        """
+        Find products whose code, group or a name word starts with each query word
+
+        Args:
+            query: Search text, e.g. "tsel 10" or "s10"
+            limit: Maximum results
+        """
+        words = query.lower().split()
+        if not words:
+            return self._products[:limit]
+
+        key = (' '.join(words), limit)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            self._search_cache.move_to_end(key)
+            return cached
+
+        # Narrow with the most selective (longest) word, then filter by the rest
+        words.sort(key=len, reverse=True)
+        candidates = self._index.prefix(words[0], limit=limit * 20 if len(words) > 1 else limit)
+        results = []
+        for i in candidates:
+            product = self._index.products[i]
+            if len(words) > 1:
+                haystack = f"{product.code} {product.group} {product.name}".lower().split()
+                if not all(any(token.startswith(word) for token in haystack) for word in words[1:]):
+                    continue
+            results.append(product)
+            if len(results) >= limit:
+                break
+
+        self._search_cache[key] = results
+        if len(self._search_cache) > self.search_cache_size:
+            self._search_cache.popitem(last=False)
+        return results
+
+    def page(self, page: int, per_page: int = 8,
+             products: Optional[List[Product]] = None) -> Tuple[List[Product], int]:
+        """
+        Return one page of products and the total page count
+
+        Args:
+            page: Zero-based page number, clamped to the valid range
+            per_page: Products per page
+            products: Subset to paginate; defaults to all active products
+        """
+        products = self._products if products is None else products
+        pages = max(1, -(-len(products) // per_page))
+        page = min(max(page, 0), pages - 1)
+        return products[page * per_page:(page + 1) * per_page], pages
+
+    def replace(self, products: Iterable[Product]) -> None:
+        """Swap in a new product list and rebuild the index"""
+        self._swap(self._build(products))
+
+    @staticmethod
+    def _build(products: Iterable[Product]) -> Tuple[Dict[str, Product], List[Product], PrefixIndex]:
+        """Lookup structures for a product list; touches no state, so it may run in a thread"""
+        active = sorted(
+            (product for product in products if product.active and product.code),
+            key=lambda product: (product.group, product.price, product.code)
+        )
+        return {product.code.upper(): product for product in active}, active, PrefixIndex(active)
+
+    def _swap(self, built: Tuple[Dict[str, Product], List[Product], PrefixIndex]) -> None:
+        # Event loop thread only: search() reorders the cache without locking
+        self._by_code, self._products, self._index = built
+        self._search_cache.clear()
+        self.version += 1
+
+    @staticmethod
+    def parse(body: str) -> List[Product]:
+        """Parse a price list in JSON (list of objects) or CSV (with header) form"""
+        body = body.strip()
+        if not body:
+            return []
+        if body[0] in '[{':
+            rows = json.loads(body)
+            if isinstance(rows, dict):
+                rows = rows.get('data') or rows.get('products') or []
+        else:
+            rows = list(csv.DictReader(io.StringIO(body)))
+
+        products = []
+        for row in rows:
+            row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+            code = str(row.get('code') or row.get('kode') or '').strip().upper()
+            if not code:
+                continue
+            try:
+                price = int(float(row.get('price') or row.get('harga') or 0))
+            except (TypeError, ValueError):
+                price = 0
+            status = str(row.get('status', row.get('active', '1'))).strip().lower()
+            products.append(Product(
+                code=code,
+                name=str(row.get('name') or row.get('nama') or code).strip(),
+                price=price,
+                group=str(row.get('group') or row.get('operator') or row.get('kategori') or '').strip(),
+                active=status not in ('0', 'false', 'off', 'gangguan', 'nonaktif')
+            ))
+        return products
+
+    def _parse_and_build(self, body: str) -> Optional[Tuple[Dict[str, Product], List[Product], PrefixIndex]]:
+        products = self.parse(body)
+        return self._build(products) if products else None
+
+    def _read_file(self) -> Optional[Tuple[Dict[str, Product], List[Product], PrefixIndex]]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            return self._build(self.parse(f.read()))
+
+    def _apply_file(self, built) -> int:
+        if built is None:
+            return 0
+        self._swap(built)
+        logger.info(f"Loaded {len(self)} products from {self.path}")
+        return len(self)
+
+    def load_file(self) -> int:
+        """Load the local price list file, returning the product count"""
+        return self._apply_file(self._read_file())
+
+    async def reload_file(self) -> int:
+        """
+        Load the local price list file without blocking the event loop
+
+        Reading, parsing and indexing run in a thread; the new list is
+        swapped in on the event loop, where searches run.
+
+        Returns:
+            Number of active products
+        """
+        return self._apply_file(await asyncio.to_thread(self._read_file))
+
+    async def refresh(self, client: Optional[httpx.AsyncClient] = None) -> int:
+        """
+        Reload the price list from the URL, falling back to the local file
+
+        Returns:
+            Number of active products after the refresh
+        """
+        if self.url:
+            try:
+                if client is None:
+                    async with httpx.AsyncClient() as own_client:
+                        response = await own_client.get(self.url, timeout=30)
+                else:
+                    response = await client.get(self.url, timeout=30)
+                response.raise_for_status()
+                # Parsing and indexing 20k products takes ~0.5s; keep it off the loop
+                built = await asyncio.to_thread(self._parse_and_build, response.text)
+                if built is not None:
+                    self._swap(built)
+                    logger.info(f"Loaded {len(self)} products from {self.url}")
+                    return len(self)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Price list refresh from {self.url} failed: {e}")
+            if self._products:
+                # Keep serving the last good list
+                return len(self)
+        return await self.reload_file()
+
+    def start(self, client: Optional[httpx.AsyncClient] = None, load_file: bool = True) -> None:
+        """Load now from the file, unless already done, then refresh in the background"""
+        if load_file:
+            self.load_file()
+        if self._task is None and (self.url or self.path):
+            self._task = asyncio.create_task(self._refresh_loop(client))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self, client: Optional[httpx.AsyncClient]) -> None:
+        # The file was just loaded by start(); only the URL needs an immediate fetch
+        delay = 0 if self.url else self.refresh_interval
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.refresh_interval
+            try:
+                await self.refresh(client)
+            except Exception as e:
+                logger.error(f"Price list refresh failed: {e}")
@@ -0,0 +1,241 @@
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class DestinationKind(str, Enum):
+    """What an order destination looks like"""
+    MOBILE = 'mobile'               # Indonesian mobile number (MSISDN)
+    PLN_METER = 'pln_meter'         # PLN prepaid meter number, 11 digits
+    PLN_CUSTOMER = 'pln_customer'   # PLN customer ID (ID pelanggan), 12 digits
+    OTHER = 'other'                 # game IDs, landlines, account numbers, ...
+    INVALID = 'invalid'
+
+
+# Mobile number prefixes per operator (national format)
+OPERATOR_PREFIXES = {
+    'telkomsel': ('0811', '0812', '0813', '0821', '0822', '0823', '0851', '0852', '0853'),
+    'indosat': ('0814', '0815', '0816', '0855', '0856', '0857', '0858'),
+    'xl': ('0817', '0818', '0819', '0859', '0877', '0878'),
+    'axis': ('0831', '0832', '0833', '0838'),
+    'tri': ('0895', '0896', '0897', '0898', '0899'),
+    'smartfren': ('0881', '0882', '0883', '0884', '0885', '0886', '0887', '0888', '0889'),
+}
+
+OPERATOR_NAMES = {
+    'telkomsel': 'Telkomsel',
+    'indosat': 'Indosat',
+    'xl': 'XL',
+    'axis': 'Axis',
+    'tri': 'Tri',
+    'smartfren': 'Smartfren',
+    'pln': 'PLN',
+}
+
+# Words in a product's group or name that tie it to an operator
+OPERATOR_ALIASES = {
+    'telkomsel': ('telkomsel', 'tsel', 'simpati', 'loop', 'byu', 'by.u'),
+    'indosat': ('indosat', 'isat', 'im3', 'mentari', 'ooredoo'),
+    'xl': ('xl',),
+    'axis': ('axis',),
+    'tri': ('tri', 'three'),
+    'smartfren': ('smartfren', 'smart'),
+    'pln': ('pln',),
+}
+_ALIAS_TO_OPERATOR = {alias: operator for operator, aliases in OPERATOR_ALIASES.items() for alias in aliases}
+
+MOBILE_MIN_LENGTH = 10
+MOBILE_MAX_LENGTH = 13
+MAX_DESTINATION_LENGTH = 32
+
+
+class PrefixTrie:
+    """
+    Digit trie of number prefixes, compiled into a single lookup table.
+
+    Prefixes go into a nested-dict trie. :meth:`compile` then expands every
+    prefix to the depth of the longest one and stores the expansion in one
+    dict keyed by fixed-length prefix, so a lookup is a slice and a single
+    hash probe instead of a walk. Where prefixes overlap, the longer one
+    wins. Only subtrees that hold a prefix are expanded, so the table stays
+    small for sparse prefix sets like operator ranges.
+    """
+
+    _VALUE = '$'
+
+    def __init__(self, prefixes: Optional[Dict[str, Any]] = None):
+        self._root: Dict[str, Any] = {}
+        self._table: Dict[str, Any] = {}
+        self.depth = 0
+        for prefix, value in (prefixes or {}).items():
+            self.insert(prefix, value)
+        self.compile()
+
+    def insert(self, prefix: str, value: Any) -> None:
+        """Add a prefix; takes effect after the next :meth:`compile`"""
+        if not prefix.isdigit():
+            raise ValueError(f"prefix must be digits, got {prefix!r}")
+        node = self._root
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        node[self._VALUE] = value
+        self.depth = max(self.depth, len(prefix))
+
+    def compile(self) -> None:
+        table: Dict[str, Any] = {}
+
+        def expand(node: Dict[str, Any], prefix: str, best: Any) -> None:
+            if len(prefix) == self.depth:
+                if best is not None:
+                    table[prefix] = best
+                return
+            for digit in '0123456789':
+                child = node.get(digit) if node is not None else None
+                if child is None and best is None:
+                    continue
+                expand(child, prefix + digit, child.get(self._VALUE, best) if child is not None else best)
+
+        expand(self._root, '', self._root.get(self._VALUE))
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def lookup(self, number: str) -> Any:
+        """Value of the longest prefix of ``number``, or None"""
+        return self._table.get(number[:self.depth])
+
+
+OPERATOR_TRIE = PrefixTrie({
+    prefix: operator for operator, prefixes in OPERATOR_PREFIXES.items() for prefix in prefixes
+})
+
+
+class Destination:
+    """Classified order destination"""
+
+    __slots__ = ('kind', 'number', 'operator', 'error')
+
+    def __init__(self, kind: DestinationKind, number: str, operator: Optional[str] = None,
+                 error: Optional[str] = None):
+        self.kind = kind
+        self.number = number
+        self.operator = operator
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"<Destination {self.kind.value} {self.number}>"
+
+    @property
+    def valid(self) -> bool:
+        return self.kind != DestinationKind.INVALID
+
+    @property
+    def label(self) -> str:
+        """Short description for chat messages"""
+        if self.kind == DestinationKind.MOBILE:
+            return OPERATOR_NAMES[self.operator]
+        if self.kind == DestinationKind.PLN_METER:
+            return "PLN No. Meter"
+        if self.kind == DestinationKind.PLN_CUSTOMER:
+            return "PLN ID Pelanggan"
+        return "Lainnya"
+
+
+def normalize_number(text: str) -> Optional[str]:
+    """
+    Digits of a number in national format, or None if it is not a number
+
+    Spaces, dashes and dots are dropped; +62 and 62 before a mobile prefix
+    become 0, so "+62 812-3456-7890" gives "081234567890". Brackets are
+    kept, as game IDs are written with a zone like "12345678(2001)".
+    """
+    # Chained replace beats str.translate several times over on short strings
+    digits = text.replace(' ', '').replace('-', '').replace('.', '')
+    if digits[:1] == '+':
+        digits = digits[1:]
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+    if digits[:3] == '628':
+        return '0' + digits[2:]
+    return digits
+
+
+def classify_destination(text: str) -> Destination:
+    """
+    Normalise and classify an order destination
+
+    Numbers that look like mobile numbers must have a valid length and a
+    known operator prefix. Other all-digit destinations of 11 or 12 digits
+    are taken as PLN meter numbers or customer IDs. Anything else is left
+    as OTHER for the upstream to judge, since games and e-wallets accept
+    all kinds of IDs.
+    """
+    text = text.strip()
+    if not text:
+        return Destination(DestinationKind.INVALID, text, error="Nomor tujuan kosong")
+    if len(text) > MAX_DESTINATION_LENGTH:
+        return Destination(DestinationKind.INVALID, text[:MAX_DESTINATION_LENGTH],
+                           error=f"Nomor tujuan terlalu panjang (maks. {MAX_DESTINATION_LENGTH} karakter)")
+
+    number = normalize_number(text)
+    if number is None:
+        return Destination(DestinationKind.OTHER, text)
+
+    if number[:2] == '08':
+        if not MOBILE_MIN_LENGTH <= len(number) <= MOBILE_MAX_LENGTH:
+            return Destination(DestinationKind.INVALID, number,
+                               error=f"Nomor HP {number} harus {MOBILE_MIN_LENGTH}-{MOBILE_MAX_LENGTH} digit "
+                                     f"(sekarang {len(number)})")
+        operator = OPERATOR_TRIE.lookup(number)
+        if operator is None:
+            return Destination(DestinationKind.INVALID, number,
+                               error=f"Awalan {number[:4]} bukan nomor operator seluler Indonesia")
+        return Destination(DestinationKind.MOBILE, number, operator)
+
+    if number[:1] != '0':
+        if len(number) == 11:
+            return Destination(DestinationKind.PLN_METER, number, 'pln')
+        if len(number) == 12:
+            return Destination(DestinationKind.PLN_CUSTOMER, number, 'pln')
+    return Destination(DestinationKind.OTHER, number)
+
+
+def product_operator(product) -> Optional[str]:
+    """Operator a product belongs to, from its group or the first word of its name"""
+    if product.group:
+        operator = _ALIAS_TO_OPERATOR.get(product.group.lower())
+        if operator is not None:
+            return operator
+    words = product.name.lower().split(None, 1)
+    return _ALIAS_TO_OPERATOR.get(words[0]) if words else None
+
+
+def product_matches(destination: Destination, product) -> bool:
+    """
+    Whether a product can be sent to the destination
+
+    Products without an operator (e-wallets, games, ...) match anything.
+    Operator and PLN products only match their own kind of destination.
+    """
+    operator = product_operator(product)
+    if operator is None:
+        return True
+    return operator == destination.operator
+
+
+def mismatch_message(destination: Destination, product) -> str:
+    operator = OPERATOR_NAMES.get(product_operator(product), '')
+    return (f"Produk {product.code} adalah produk {operator}, "
+            f"tidak bisa untuk tujuan {destination.number} ({destination.label}).")
+
+
+def narrow_products(products: Iterable, destination: Destination) -> List:
+    """Products that match the destination, those of its own operator first"""
+    own, neutral = [], []
+    for product in products:
+        operator = product_operator(product)
+        if operator is None:
+            neutral.append(product)
+        elif operator == destination.operator:
+            own.append(product)
+    return own + neutral
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class DispatcherFull(Exception):
+    """Raised when the order queue has no room left"""
+
+
+class OrderDispatcher:
+    """
+    Bounded job queue served by a fixed pool of worker tasks.
+
+    Jobs submitted under the same key (a user ID) run one at a time, in
+    submission order. Different keys run in parallel, up to the number of
+    workers, and take turns so one busy user cannot hog the pool.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 200):
+        """
+        Initialize dispatcher
+
+        Args:
+            workers: Number of jobs that may run at the same time
+            max_pending: Maximum jobs waiting to start; further submissions
+                raise DispatcherFull
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[Hashable, Deque[Callable[[], Awaitable[Any]]]] = {}
+        self._scheduled = set()
+        self._queued = 0
+        self._running = 0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def queued(self) -> int:
+        """Jobs waiting to start"""
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        """Jobs currently running"""
+        return self._running
+
+    @property
+    def full(self) -> bool:
+        return self._queued >= self.max_pending
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> int:
+        """
+        Queue a job
+
+        Args:
+            key: Serialization key; jobs with the same key never overlap
+            job: Coroutine function to run
+
+        Returns:
+            Jobs waiting to start, this one included. This is not the job's
+            place in line: keys take turns, and a key rejoins the rotation
+            only when its running job finishes.
+
+        Raises:
+            DispatcherFull: If max_pending jobs are already waiting
+        """
+        if self.full:
+            raise DispatcherFull(f"{self._queued} orders already queued")
+
+        self._jobs.setdefault(key, deque()).append(job)
+        self._queued += 1
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+        return self._queued
+
+    def start(self) -> None:
+        """Start the worker tasks"""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"order-worker-{i}")
+                for i in range(self.workers)
+            ]
+
+    async def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        Stop the workers, first waiting up to ``timeout`` seconds for queued jobs to finish
+        """
+        if timeout:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Stopping order dispatcher with {self._queued} queued orders")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self) -> None:
+        while self._queued or self._running:
+            await asyncio.sleep(0.1)
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            job = self._jobs[key].popleft()
+            self._queued -= 1
+            self._running += 1
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order job for {key} failed: {e}", exc_info=True)
+            finally:
+                self._running -= 1
+                # Requeue the key behind other users so keys take turns
+                if self._jobs[key]:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._jobs[key]
+                    self._scheduled.discard(key)
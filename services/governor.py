@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils import metrics
+from utils.ratelimit import Priority, TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_SECONDS = metrics.histogram(
+    'telegram_throttle_seconds', 'Time Bot API requests waited for the rate governor', ('priority',),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+COALESCED_EDITS = metrics.counter(
+    'telegram_edits_coalesced_total', 'Queued message edits replaced by a newer edit of the same message'
+)
+RETRY_AFTER = metrics.counter(
+    'telegram_retry_after_total', 'Bot API requests answered with 429 retry_after', ('endpoint',)
+)
+
+# Endpoints that change an existing message; a newer queued edit makes an older one pointless
+EDIT_ENDPOINTS = frozenset({'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'})
+
+JSONResult = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+
+class _QueuedEdit:
+    """An edit waiting for tokens; later edits of the same message replace its arguments"""
+
+    __slots__ = ('args', 'priority', 'future', 'superseded_by')
+
+    def __init__(self, args: Tuple, priority: int):
+        self.args = args
+        self.priority = priority
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.superseded_by: Optional['_QueuedEdit'] = None
+
+
+class TelegramRateGovernor(BaseRateLimiter[int]):
+    """
+    Throttle outgoing Bot API requests below Telegram's flood limits.
+
+    Requests addressed to a chat take a token from that chat's bucket
+    (private chats and groups have different limits) and then from the
+    global bucket. Requests without a chat (callback and inline query
+    answers, getMe, ...) are not throttled. Waiters are served by priority,
+    passed per call as ``rate_limit_args=Priority.HIGH`` and defaulting to
+    NORMAL. Queued edits of the same message are merged so only the newest
+    content is sent, and every caller gets that result. A 429 reply pauses
+    the affected bucket for ``retry_after`` and the request is sent again.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_rate: float = 20 / 60, group_burst: float = 3.0, max_retries: int = 2):
+        """
+        Initialize governor
+
+        Args:
+            global_rate: Messages per second across all chats
+            chat_rate: Messages per second to one private chat
+            chat_burst: Messages a private chat may receive back to back
+            group_rate: Messages per second to one group or channel
+            group_burst: Messages a group may receive back to back
+            max_retries: Times a request is re-sent after a 429 before the
+                RetryAfter error reaches the caller
+        """
+        self.global_bucket = TokenBucket(global_rate, burst=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._prune_at = 1024
+        self._edits: Dict[Tuple, _QueuedEdit] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle}
+                self._prune_at = max(1024, 2 * len(self._chats))
+            # Group and channel ids are negative or @usernames
+            private = isinstance(chat_id, int) or str(chat_id).lstrip('-').isdigit()
+            if private and int(chat_id) > 0:
+                bucket = TokenBucket(self.chat_rate, burst=self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, burst=self.group_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat: TokenBucket, priority: int) -> None:
+        waited = await chat.acquire(priority)
+        waited += await self.global_bucket.acquire(priority)
+        THROTTLE_SECONDS.observe(waited, priority)
+
+    async def _call(self, callback: Callable[..., Coroutine[Any, Any, JSONResult]], args: Tuple,
+                    kwargs: Dict[str, Any], endpoint: str, chat: Optional[TokenBucket],
+                    priority: int) -> JSONResult:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                RETRY_AFTER.inc(endpoint)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{endpoint} hit the flood limit, retrying in {e.retry_after}s")
+                if chat is None:
+                    await asyncio.sleep(e.retry_after)
+                else:
+                    chat.pause(e.retry_after)
+                    await self._acquire(chat, priority)
+
+    async def process_request(self, callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+                              args: Any, kwargs: Dict[str, Any], endpoint: str, data: Dict[str, Any],
+                              rate_limit_args: Optional[int]) -> JSONResult:
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await self._call(callback, args, kwargs, endpoint, None, Priority.NORMAL)
+
+        priority = rate_limit_args or Priority.NORMAL
+        chat = self.chat_bucket(chat_id)
+        if endpoint not in EDIT_ENDPOINTS or data.get('message_id') is None:
+            await self._acquire(chat, priority)
+            return await self._call(callback, args, kwargs, endpoint, chat, priority)
+
+        key = (endpoint, chat_id, data['message_id'])
+        queued = self._edits.get(key)
+        if queued is not None and priority >= queued.priority:
+            # Same or lower urgency: send the newest content in the queued slot
+            queued.args = args
+            COALESCED_EDITS.inc()
+            return await asyncio.shield(queued.future)
+
+        edit = self._edits[key] = _QueuedEdit(args, priority)
+        if queued is not None:
+            # A more urgent edit overtakes the queued one, which then just waits for it
+            queued.superseded_by = edit
+            COALESCED_EDITS.inc()
+        try:
+            await self._acquire(chat, priority)
+            if edit.superseded_by is not None:
+                result = await asyncio.shield(edit.superseded_by.future)
+            else:
+                del self._edits[key]
+                result = await self._call(callback, edit.args, kwargs, endpoint, chat, priority)
+        except BaseException as e:
+            if self._edits.get(key) is edit:
+                del self._edits[key]
+            if not edit.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    edit.future.cancel()
+                else:
+                    edit.future.set_exception(e)
+                    # Merged callers may not exist; don't warn about an unretrieved exception
+                    edit.future.exception()
+            raise
+        edit.future.set_result(result)
+        return result
+
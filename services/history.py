@@ -0,0 +1,157 @@
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.journal import OrderRecord
+
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ('ref_id', 'user_id', 'chat_id', 'destination', 'product_code', 'state',
+            'trx_id', 'sn', 'price', 'message', 'created_at', 'updated_at')
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM orders"
+
+
+class OrderHistory:
+    """
+    Per-user order history in a SQLite database (WAL mode).
+
+    Rows mirror the transaction journal: every state change of an order
+    upserts its row, so the history holds the latest state of all orders,
+    including those the journal has already compacted away.
+
+    Pages are read with keyset pagination on (created_at, ref_id) through
+    the (user_id, created_at, ref_id) index, so every page costs one index
+    seek plus ``limit`` rows however long the history is. Like the session
+    store, queries take microseconds and run directly on the event loop.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "ref_id TEXT PRIMARY KEY, "
+            "user_id INTEGER, "
+            "chat_id INTEGER, "
+            "destination TEXT, "
+            "product_code TEXT, "
+            "state TEXT NOT NULL, "
+            "trx_id TEXT, "
+            "sn TEXT, "
+            "price INTEGER, "
+            "message TEXT, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at, ref_id)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_orders_trx ON orders (trx_id) WHERE trx_id IS NOT NULL")
+
+    @staticmethod
+    def _row(record: OrderRecord) -> Tuple:
+        return (
+            record.ref_id, record.user_id, record.chat_id, record.destination, record.product_code,
+            record.state.value, None if record.trx_id is None else str(record.trx_id), record.sn,
+            record.price, record.message, record.created_at, record.updated_at,
+        )
+
+    _UPSERT = (
+        f"INSERT INTO orders ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+        "ON CONFLICT(ref_id) DO UPDATE SET "
+        + ', '.join(f"{name} = excluded.{name}" for name in _COLUMNS[1:])
+    )
+
+    def record(self, record: OrderRecord) -> None:
+        """Store the current state of an order; called by the journal on every change"""
+        try:
+            self._db.execute(self._UPSERT, self._row(record))
+        except sqlite3.Error as e:
+            # History is a convenience copy; the journal stays authoritative
+            logger.error(f"Failed to store order {record.ref_id} in history: {e}")
+
+    def import_records(self, records: Iterable[OrderRecord]) -> int:
+        """Upsert many orders in one transaction, e.g. everything replayed from the journal"""
+        rows = [self._row(record) for record in records]
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(self._UPSERT, rows)
+        return len(rows)
+
+    @staticmethod
+    def _to_dict(row: Tuple) -> Dict[str, Any]:
+        return dict(zip(_COLUMNS, row))
+
+    async def page(self, user_id: int, before: Optional[str] = None, after: Optional[str] = None,
+                   limit: int = 5) -> Tuple[List[Dict[str, Any]], bool, bool]:
+        """
+        One page of a user's orders, newest first
+
+        Args:
+            user_id: Telegram user ID
+            before: refID of the last order on the current page; returns older orders
+            after: refID of the first order on the current page; returns newer orders
+            limit: Orders per page
+
+        Returns:
+            Tuple of (orders, has_older, has_newer)
+        """
+        if after is not None:
+            rows = self._db.execute(
+                f"{_SELECT} WHERE user_id = ? AND (created_at, ref_id) > "
+                "(SELECT created_at, ref_id FROM orders WHERE ref_id = ?) "
+                "ORDER BY created_at, ref_id LIMIT ?",
+                (user_id, after, limit + 1)
+            ).fetchall()
+            has_newer = len(rows) > limit
+            # The cursor order itself is older than this page
+            return [self._to_dict(row) for row in rows[:limit][::-1]], True, has_newer
+
+        if before is not None:
+            rows = self._db.execute(
+                f"{_SELECT} WHERE user_id = ? AND (created_at, ref_id) < "
+                "(SELECT created_at, ref_id FROM orders WHERE ref_id = ?) "
+                "ORDER BY created_at DESC, ref_id DESC LIMIT ?",
+                (user_id, before, limit + 1)
+            ).fetchall()
+        else:
+            rows = self._db.execute(
+                f"{_SELECT} WHERE user_id = ? ORDER BY created_at DESC, ref_id DESC LIMIT ?",
+                (user_id, limit + 1)
+            ).fetchall()
+        has_older = len(rows) > limit
+        return [self._to_dict(row) for row in rows[:limit]], has_older, before is not None
+
+    async def get(self, order_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up one order by refID or upstream trx_id
+
+        Args:
+            order_id: refID or trx_id
+            user_id: When given, only that user's order is returned
+        """
+        row = self._db.execute(f"{_SELECT} WHERE ref_id = ?", (order_id,)).fetchone()
+        if row is None:
+            row = self._db.execute(f"{_SELECT} WHERE trx_id = ? LIMIT 1", (order_id,)).fetchone()
+        if row is None:
+            return None
+        order = self._to_dict(row)
+        if user_id is not None and order['user_id'] != user_id:
+            return None
+        return order
+
+    async def count(self, user_id: Optional[int] = None) -> int:
+        if user_id is None:
+            return self._db.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        return self._db.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
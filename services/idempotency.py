@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Hashable, Optional
+
+from utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_ORDERS = metrics.counter(
+    'bot_duplicate_orders_total', 'Order submissions matching an in-flight or recent order', ('kind',)
+)
+
+
+class GuardEntry:
+    """An order placed under a guard key, and its result once known"""
+
+    __slots__ = ('ref_id', 'future', 'result', 'expires_at')
+
+    def __init__(self, ref_id: str):
+        self.ref_id = ref_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.result: Optional[Dict[str, Any]] = None
+        self.expires_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"<GuardEntry {self.ref_id} {'done' if self.future.done() else 'in flight'}>"
+
+    @property
+    def in_flight(self) -> bool:
+        return not self.future.done()
+
+
+class OrderGuard:
+    """
+    Idempotency guard for orders keyed on (user, destination, product).
+
+    While an order is in flight, a repeated submission gets its entry and
+    can wait for the same result instead of sending another request. Once
+    finished, orders that succeeded, were accepted or have an unknown
+    outcome stay for ``window`` seconds so a repeat can be confirmed first;
+    failed orders are dropped at once, so they can be retried right away.
+
+    Finished entries are kept in expiry order, at most ``max_keys`` of
+    them; :meth:`sweep` only walks the expired ones at the front.
+    """
+
+    def __init__(self, window: float = 120.0, max_keys: int = 10_000):
+        """
+        Initialize guard
+
+        Args:
+            window: Seconds a finished order blocks an identical one; 0 only
+                collapses concurrent submissions
+            max_keys: Maximum finished orders remembered; the oldest go first
+        """
+        self.window = window
+        self.max_keys = max_keys
+
+        self._inflight: Dict[Hashable, GuardEntry] = {}
+        self._recent: Dict[Hashable, GuardEntry] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._inflight) + len(self._recent)
+
+    def check(self, key: Hashable) -> Optional[GuardEntry]:
+        """
+        The in-flight or recent order under ``key``, if any
+
+        Counts the hit as a duplicate, so call it once per submission.
+        """
+        entry = self._inflight.get(key)
+        if entry is not None:
+            DUPLICATE_ORDERS.inc('joined')
+            return entry
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._recent[key]
+            return None
+        DUPLICATE_ORDERS.inc('recent')
+        return entry
+
+    def begin(self, key: Hashable, ref_id: str) -> GuardEntry:
+        """Register an order about to be sent; replaces a recent one the user chose to repeat"""
+        self._recent.pop(key, None)
+        entry = self._inflight[key] = GuardEntry(ref_id)
+        return entry
+
+    def finish(self, key: Hashable, result: Dict[str, Any]) -> None:
+        """Hand the result to waiting duplicates and start the window for later ones"""
+        entry = self._inflight.pop(key, None)
+        if entry is None:
+            return
+        entry.future.set_result(result)
+        if not self.window or not (result['success'] or result.get('accepted') or result.get('pending')):
+            return
+
+        entry.result = result
+        entry.expires_at = time.monotonic() + self.window
+        self._recent[key] = entry
+        while len(self._recent) > self.max_keys:
+            del self._recent[next(iter(self._recent))]
+
+    async def join(self, entry: GuardEntry) -> Dict[str, Any]:
+        """Wait for the result of an in-flight order"""
+        return await asyncio.shield(entry.future)
+
+    def sweep(self) -> int:
+        """Remove expired entries and return how many were removed"""
+        now = time.monotonic()
+        expired = []
+        for key, entry in self._recent.items():
+            if entry.expires_at > now:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._recent[key]
+        return len(expired)
+
+    def start_sweeper(self, interval: float = 60.0) -> None:
+        """Run :meth:`sweep` every ``interval`` seconds in the background"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(interval))
+
+    async def _sweep_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.sweep()
+            if removed:
+                logger.debug(f"Expired {removed} order guard entries")
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class OrderState(str, Enum):
+    """Lifecycle of an order in the journal"""
+    CREATED = 'created'     # queued, not sent upstream yet
+    SENT = 'sent'           # request sent, outcome unknown
+    ACCEPTED = 'accepted'   # upstream accepted, final status pending
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+
+TERMINAL_STATES = (OrderState.SUCCESS, OrderState.FAILED)
+
+# States only move forward; records may be journaled out of order by concurrent tasks
+_STATE_RANK = {
+    OrderState.CREATED: 0,
+    OrderState.SENT: 1,
+    OrderState.ACCEPTED: 2,
+    OrderState.SUCCESS: 3,
+    OrderState.FAILED: 3,
+}
+
+
+class OrderRecord:
+    """Current state of one order, rebuilt from the journal"""
+
+    __slots__ = ('ref_id', 'state', 'created_at', 'updated_at', 'user_id', 'chat_id',
+                 'message_id', 'destination', 'product_code', 'trx_id', 'price', 'sn', 'message', 'account')
+
+    FIELDS = __slots__[2:]
+
+    def __init__(self, ref_id: str, state: OrderState, created_at: float):
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        self.ref_id = ref_id
+        self.state = state
+        self.created_at = created_at
+        self.updated_at = created_at
+
+    def __repr__(self) -> str:
+        return f"<OrderRecord {self.ref_id} {self.state.value}>"
+
+    @property
+    def pending(self) -> bool:
+        return self.state not in TERMINAL_STATES
+
+    def apply(self, fields: Dict[str, Any]) -> None:
+        for name, value in fields.items():
+            if name in self.FIELDS and value is not None:
+                setattr(self, name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'ref_id': self.ref_id, 'state': self.state.value}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+
+class TransactionJournal:
+    """
+    Append-only, fsync-batched order journal with an in-memory index.
+
+    Every state change is appended as one JSON line. Writers wait until
+    their line is on disk; lines queued while an fsync is running are
+    written together by the next one (group commit), so durability costs
+    one fsync per batch rather than one per order.
+
+    On :meth:`open` the log is replayed to rebuild the index by refID and
+    trx_id, and compacted to one line per retained order. While running,
+    finished orders older than ``retention`` are dropped from the index
+    every ``expire_interval`` seconds, so it stays bounded.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, retention: float = 7 * 86400,
+                 expire_interval: float = 3600):
+        """
+        Initialize journal
+
+        Args:
+            path: Journal file
+            fsync: Wait for fsync before a record counts as written
+            retention: Seconds finished orders are kept in the index and
+                when compacting
+            expire_interval: Seconds between drops of expired orders from
+                the index
+        """
+        self.path = path
+        self.fsync = fsync
+        self.retention = retention
+        self.expire_interval = expire_interval
+        self._next_expiry = 0.0
+
+        self._by_ref: Dict[str, OrderRecord] = {}
+        self._by_trx: Dict[str, OrderRecord] = {}
+        self._buffer: List[str] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._file = None
+        # Called with the updated record after every state change; errors are logged
+        self.listeners: List[Callable[[OrderRecord], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._by_ref)
+
+    async def open(self) -> List[OrderRecord]:
+        """
+        Replay and compact the journal, then start accepting records
+
+        Replay and compaction run in a thread, so the event loop keeps
+        serving updates that do not need the journal meanwhile.
+
+        Returns:
+            Orders that were not finished when the journal was last written
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        await asyncio.to_thread(self._load)
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+        pending = self.pending()
+        logger.info(f"Journal loaded: {len(self._by_ref)} orders, {len(pending)} pending")
+        return pending
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            # Barrier: resolves once every earlier batch is on disk
+            barrier = asyncio.get_running_loop().create_future()
+            self._waiters.append(barrier)
+            self._wakeup.set()
+            await barrier
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get(self, ref_id: str) -> Optional[OrderRecord]:
+        return self._by_ref.get(ref_id)
+
+    def by_trx_id(self, trx_id: str) -> Optional[OrderRecord]:
+        return self._by_trx.get(str(trx_id))
+
+    def pending(self) -> List[OrderRecord]:
+        return [record for record in self._by_ref.values() if record.pending]
+
+    def records(self) -> List[OrderRecord]:
+        return list(self._by_ref.values())
+
+    async def record(self, ref_id: str, state: OrderState, **fields) -> OrderRecord:
+        """
+        Append a state change and wait until it is durable
+
+        Args:
+            ref_id: Order refID
+            state: New state
+            **fields: Order details to store (user_id, chat_id, trx_id, price, ...)
+
+        Returns:
+            The updated order record
+        """
+        now = time.time()
+        record = self._apply(ref_id, OrderState(state), now, fields)
+        entry = {'ref_id': ref_id, 'state': record.state.value, 'ts': now}
+        entry.update({k: v for k, v in fields.items() if v is not None})
+        self._buffer.append(json.dumps(entry, separators=(',', ':')))
+
+        # The line is queued before listeners run, so a failing listener
+        # cannot leave the index ahead of the log
+        for listener in self.listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logger.error(f"Journal listener {listener!r} failed for {ref_id}: {e}", exc_info=True)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wakeup.set()
+        await waiter
+        return record
+
+    def _apply(self, ref_id: str, state: OrderState, ts: float, fields: Dict[str, Any]) -> OrderRecord:
+        record = self._by_ref.get(ref_id)
+        if record is None:
+            record = OrderRecord(ref_id, state, ts)
+            self._by_ref[ref_id] = record
+        elif record.pending and _STATE_RANK[state] >= _STATE_RANK[record.state]:
+            # A late lower state never moves an order back, and a finished order stays finished
+            record.state = state
+        record.updated_at = ts
+        record.apply(fields)
+        if record.trx_id:
+            self._by_trx[str(record.trx_id)] = record
+        return record
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._waiters:
+                continue
+
+            lines, self._buffer = self._buffer, []
+            waiters, self._waiters = self._waiters, []
+            try:
+                if lines:
+                    self._file.write('\n'.join(lines) + '\n')
+                    self._file.flush()
+                if lines and self.fsync:
+                    # fsync off the event loop; new records queue up for the next batch
+                    await asyncio.to_thread(os.fsync, self._file.fileno())
+            except Exception as e:
+                logger.error(f"Journal write failed: {e}")
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+            if time.monotonic() >= self._next_expiry:
+                self._next_expiry = time.monotonic() + self.expire_interval
+                expired = self._expire()
+                if expired:
+                    logger.info(f"Dropped {expired} finished orders older than the journal retention")
+
+    def _expire(self) -> int:
+        """Drop finished orders last updated before the retention window; returns how many"""
+        cutoff = time.time() - self.retention
+        expired = [record for record in self._by_ref.values()
+                   if not record.pending and record.updated_at < cutoff]
+        for record in expired:
+            del self._by_ref[record.ref_id]
+            if record.trx_id and self._by_trx.get(str(record.trx_id)) is record:
+                del self._by_trx[str(record.trx_id)]
+        return len(expired)
+
+    def _load(self) -> None:
+        self._replay()
+        self._compact()
+
+    def _replay(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                ref_id = entry.pop('ref_id')
+                state = OrderState(entry.pop('state'))
+                ts = entry.pop('ts', None) or entry.get('updated_at') or time.time()
+            except (ValueError, KeyError) as e:
+                # A torn last line from a crash mid-write is expected; anything else is logged
+                if number != len(lines):
+                    logger.error(f"Skipping corrupt journal line {number}: {e}")
+                continue
+            self._apply(ref_id, state, ts, entry)
+
+    def _compact(self) -> None:
+        self._expire()
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self._by_ref.values():
+                entry = record.to_dict()
+                entry['ts'] = record.updated_at
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
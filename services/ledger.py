@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from services.journal import OrderRecord, OrderState
+from utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+RECONCILIATIONS = metrics.counter(
+    'omega_balance_reconciliations_total', 'Ledger balance checks against the upstream', ('result',)
+)
+BALANCE_DRIFT = metrics.gauge(
+    'omega_balance_drift', 'Upstream minus ledger balance found by the last reconciliation'
+)
+
+
+_DOT_THOUSANDS = re.compile(r'\d{1,3}(\.\d{3})+')
+
+
+def parse_amount(value: Any) -> Optional[int]:
+    """
+    Rupiah amount from an upstream price or balance field
+
+    Accepts 10150, '10150.0', '10,150', '10.150' and 'Rp10.150'; returns
+    None for anything else instead of raising.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text[:2].lower() == 'rp':
+        text = text[2:].strip()
+    if _DOT_THOUSANDS.fullmatch(text):
+        text = text.replace('.', '')
+    try:
+        return int(float(text.replace(',', '')))
+    except ValueError:
+        return None
+
+
+def parse_balance(data: Dict[str, Any]) -> Optional[int]:
+    """Balance in rupiah from a check_balance result's data, or None when not reported"""
+    return parse_amount(data.get('saldo'))
+
+
+class BalanceLedger:
+    """
+    Running account balance kept locally between upstream balance checks.
+
+    A snapshot from /CekSaldo is the starting point. Orders then move the
+    balance as the journal records them: an order is charged when the
+    upstream accepts it or reports success, and refunded if it fails after
+    being charged. Orders that are queued or sent but not answered yet hold
+    their catalog price, so :meth:`can_afford` also accounts for them.
+
+    The ledger is checked against the upstream every ``reconcile_interval``
+    seconds and after ``reconcile_every`` charges or refunds. Drift beyond
+    what in-flight orders explain (e.g. top-ups, orders placed outside this
+    bot or by other workers) is logged, and the upstream value is taken.
+
+    A snapshot cannot tell whether orders answered while it was in flight
+    are already in it. The ledger assumes they are not, so :attr:`balance`
+    errs low, and keeps their charges as slack that :meth:`can_afford` adds
+    back until the next snapshot, so bookkeeping does not refuse orders the
+    account can pay for.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                 price_of: Callable[[str], Optional[int]] = lambda code: None,
+                 reconcile_interval: float = 300.0, reconcile_every: int = 50,
+                 retry_interval: float = 30.0, max_tracked: int = 10_000):
+        """
+        Initialize ledger
+
+        Args:
+            fetch: Coroutine returning a fresh check_balance result
+            price_of: Catalog price of a product code, used until the
+                upstream reports the charged price
+            reconcile_interval: Seconds between upstream balance checks
+            reconcile_every: Charges and refunds after which the balance is
+                checked early; 0 disables
+            retry_interval: Seconds before retrying a failed check
+            max_tracked: Settled orders remembered, so repeated status
+                updates of an order are not charged twice
+        """
+        self.fetch = fetch
+        self.price_of = price_of
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_every = reconcile_every
+        self.retry_interval = retry_interval
+        self.max_tracked = max_tracked
+
+        self._balance: Optional[int] = None
+        self._status: Optional[str] = None
+        self._reconciled_at: Optional[float] = None
+        self._holds: Dict[str, int] = {}
+        self._charged: 'OrderedDict[str, int]' = OrderedDict()
+        self._moved = 0          # net amount charged since start, for in-flight reconciliation
+        self._changes = 0        # charges and refunds since the last reconciliation
+        self._slack = 0          # charges that may already be in the last snapshot
+        self._fetching = False
+        self._fetch_slack = 0
+        self._inflight: Optional[asyncio.Future] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def balance(self) -> Optional[int]:
+        """Balance after every charge seen so far, None before the first snapshot"""
+        return self._balance
+
+    @property
+    def held(self) -> int:
+        """Amount reserved for orders the upstream has not answered yet"""
+        return sum(self._holds.values())
+
+    @property
+    def available(self) -> Optional[int]:
+        if self._balance is None:
+            return None
+        return self._balance - self.held
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the balance was last checked against the upstream"""
+        if self._reconciled_at is None:
+            return None
+        return time.monotonic() - self._reconciled_at
+
+    def can_afford(self, amount: Optional[int]) -> bool:
+        """
+        Whether an order of ``amount`` fits in the available balance
+
+        Without a snapshot or a known price the order is allowed; the
+        upstream still rejects it if the balance runs short.
+        """
+        available = self.available
+        if available is None or not amount:
+            return True
+        return available + self._slack >= amount
+
+    def track(self, records: Iterable[OrderRecord]) -> None:
+        """
+        Adopt orders left unfinished by a restart, before the first snapshot
+
+        Accepted orders were already charged upstream, so their success
+        must not be charged again; sent and queued ones hold their price.
+        """
+        for record in records:
+            if record.state == OrderState.ACCEPTED:
+                self._remember(record.ref_id, self._price(record))
+            elif record.pending:
+                self._holds[record.ref_id] = self._price(record)
+
+    def _price(self, record: OrderRecord) -> int:
+        """Reported price of an order, else its catalog price, else 0"""
+        price = parse_amount(record.price)
+        if price:
+            return price
+        if record.product_code:
+            return parse_amount(self.price_of(record.product_code)) or 0
+        return 0
+
+    def _remember(self, ref_id: str, amount: int) -> None:
+        self._charged[ref_id] = amount
+        self._charged.move_to_end(ref_id)
+        while len(self._charged) > self.max_tracked:
+            self._charged.popitem(last=False)
+
+    def _move(self, amount: int) -> None:
+        if self._fetching and amount > 0:
+            self._fetch_slack += amount
+        self._moved += amount
+        if self._balance is not None:
+            self._balance -= amount
+        self._changes += 1
+        if self.reconcile_every and self._changes >= self.reconcile_every and self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_record(self, record: OrderRecord) -> None:
+        """Apply an order state change; registered as a journal listener"""
+        ref_id = record.ref_id
+        charged = self._charged.get(ref_id)
+
+        if record.state in (OrderState.CREATED, OrderState.SENT):
+            if charged is None and ref_id not in self._holds:
+                self._holds[ref_id] = self._price(record)
+            return
+
+        hold = self._holds.pop(ref_id, None)
+        if record.state == OrderState.FAILED:
+            if charged:
+                self._move(-charged)
+            self._remember(ref_id, 0)
+            return
+
+        # Accepted or successful: charged upstream
+        # An unparseable reported price falls back to what was held or charged
+        amount = parse_amount(record.price) or (charged if charged is not None else hold)
+        if amount is None:
+            amount = self._price(record)
+        if charged is None:
+            self._move(amount)
+        elif amount != charged:
+            # Success reported the actual price of an order charged at catalog price
+            self._move(amount - charged)
+        self._remember(ref_id, amount)
+
+    async def reconcile(self) -> Dict[str, Any]:
+        """
+        Check the balance against the upstream; concurrent calls share one request
+
+        Returns:
+            The check_balance result
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._reconcile())
+            self._inflight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return await asyncio.shield(self._inflight)
+
+    async def _reconcile(self) -> Dict[str, Any]:
+        try:
+            expected = self._balance
+            held = self.held
+            slack = self._slack
+            moved_before = self._moved
+            self._fetching = True
+            self._fetch_slack = 0
+            try:
+                result = await self.fetch()
+            finally:
+                self._fetching = False
+
+            upstream = parse_balance(result['data']) if result['success'] else None
+            if upstream is None:
+                RECONCILIATIONS.inc('failed')
+                logger.warning(f"Balance reconciliation failed: {result.get('error') or 'no balance in reply'}")
+                return result
+
+            moved = self._moved - moved_before
+            if expected is not None:
+                drift = upstream - expected
+                BALANCE_DRIFT.set(drift)
+                # In-flight orders may be charged upstream before they are here,
+                # and slack may have been charged twice here
+                if drift and not -(held + max(moved, 0)) <= drift <= slack:
+                    RECONCILIATIONS.inc('drift')
+                    logger.warning(f"Balance drift of Rp {drift:,}: ledger Rp {expected:,}, "
+                                   f"upstream Rp {upstream:,}, {len(self._holds)} orders in flight")
+                else:
+                    RECONCILIATIONS.inc('ok')
+            else:
+                RECONCILIATIONS.inc('ok')
+                logger.info(f"Balance snapshot: Rp {upstream:,}")
+
+            # Take the answer as predating everything recorded while it was in flight
+            self._balance = upstream - moved
+            self._slack = self._fetch_slack
+            self._status = result['data'].get('status')
+            self._reconciled_at = time.monotonic()
+            self._changes = 0
+            return result
+        finally:
+            self._inflight = None
+
+    async def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Current balance in check_balance's result format, without a round
+        trip unless there is no snapshot yet or it is older than ``max_age``
+        """
+        age = self.age
+        if age is None or (max_age is not None and age > max_age):
+            result = await self.reconcile()
+            if self._balance is None:
+                return result
+        return {
+            'success': True,
+            'data': {
+                'saldo': self._balance,
+                'available': self.available,
+                'status': self._status or 'active',
+                'reconciled_ago': self.age,
+                'message': 'Saldo dari ledger lokal'
+            }
+        }
+
+    def start(self) -> None:
+        """Take a snapshot now, then reconcile in the background"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._wakeup = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                ok = (await self.reconcile())['success']
+            except Exception as e:
+                logger.error(f"Balance reconciliation failed: {e}")
+                ok = False
+            delay = self.reconcile_interval if ok else self.retry_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
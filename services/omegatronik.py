@@ -1,49 +1,182 @@
-import requests
 import logging
-from typing import Dict, Any
-from utils.signature import generate_signature, generate_order_signature
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from services.cache import SingleFlightCache
+from services.journal import OrderState, TransactionJournal
+from services.parser import balance_result, order_result
+from services.router import Endpoint, EndpointRouter
+from utils import metrics
+from utils.log import Redacted
+from utils.ratelimit import Priority, TokenBucket
+from utils.refid import RefIdAllocator
+from utils.signature import SigningContext
 
 
 logger = logging.getLogger(__name__)
 
+OPERATION_SECONDS = metrics.histogram(
+    'omega_operation_seconds', 'Balance checks and orders end to end, including failover',
+    ('operation', 'result')
+)
+
+
+def _result_label(result: Dict[str, Any]) -> str:
+    if result.get("pending"):
+        return "pending"
+    if result.get("accepted"):
+        return "accepted"
+    return "success" if result["success"] else "failed"
+
+
+async def journal_order_result(journal: TransactionJournal, ref_id: str, result: Dict[str, Any]) -> None:
+    """Record the outcome of an order; unknown outcomes stay in the sent state"""
+    if result.get("pending"):
+        return
+    if result.get("accepted"):
+        await journal.record(ref_id, OrderState.ACCEPTED, trx_id=result["data"].get("trx_id"))
+    elif result["success"]:
+        data = result["data"]
+        await journal.record(
+            ref_id, OrderState.SUCCESS,
+            trx_id=data.get("trx_id"), price=data.get("price"), message=data.get("message")
+        )
+    else:
+        await journal.record(ref_id, OrderState.FAILED, message=result["error"])
+
 
 class OmegatronikService:
     """Service for interacting with Omega Tronik H2H API"""
-    
-    def __init__(self, member_id: str, pin: str, password: str):
+
+    def __init__(self, member_id: str, pin: str, password: str,
+                 base_url: str = "https://apiomega.id",
+                 backup_base_url: str = "http://188.166.178.169:6969",
+                 endpoints: Optional[List[str]] = None,
+                 max_connections: int = 100,
+                 max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0,
+                 hedge_orders: bool = True,
+                 balance_cache_ttl: float = 10.0,
+                 balance_serve_stale: bool = False,
+                 ref_ids: Optional[RefIdAllocator] = None,
+                 journal: Optional[TransactionJournal] = None,
+                 order_timeout: float = 60.0,
+                 rate_limit: float = 0.0,
+                 rate_burst: Optional[float] = None):
         """
         Initialize Omega Tronik service
-        
+
         Args:
             member_id: Your Omega Tronik member ID
             pin: Your transaction PIN
             password: Your API password
+            base_url: Primary API base URL
+            backup_base_url: Backup API base URL used for failover
+            endpoints: Full list of base URLs in priority order; overrides
+                base_url and backup_base_url when given
+            max_connections: Maximum open connections in the HTTP pool
+            max_keepalive_connections: Maximum idle keep-alive connections kept in the pool
+            keepalive_expiry: Seconds an idle keep-alive connection is kept open
+            hedge_orders: Whether slow order calls may be hedged to another
+                endpoint. Safe because every attempt carries the same refID,
+                which the upstream deduplicates.
+            balance_cache_ttl: Seconds a balance result is reused; 0 disables
+                caching but still coalesces concurrent checks
+            balance_serve_stale: Answer with the expired balance while a
+                refresh runs in the background
+            ref_ids: refID allocator shared with other services in this
+                process; a private one is created when omitted
+            journal: Transaction journal that records every order's state
+            order_timeout: Per-attempt timeout for /trx. Can be short when
+                final status arrives by report callback, since the call only
+                has to wait for the upstream to accept the order.
+            rate_limit: Maximum upstream requests per second, 0 for no limit.
+                Orders are served before balance checks when requests queue.
+            rate_burst: Requests allowed back to back; defaults to one
+                second worth
 
         """
         self.member_id = member_id
         self.pin = pin
         self.password = password
-        
-        # API endpoints
-        self.base_url = "https://apiomega.id"
-        self.balance_endpoint = f"{self.base_url}/CekSaldo"
-        self.order_endpoint = f"{self.base_url}/trx"
-        
-        # Backup endpoints for failover
-        self.backup_base_url = "http://188.166.178.169:6969"
-        self.backup_balance_endpoint = f"{self.backup_base_url}/CekSaldo"
-        self.backup_order_endpoint = f"{self.backup_base_url}/trx"
-    
-    async def check_balance(self) -> Dict[str, Any]:
+        self.signer = SigningContext(member_id, pin, password)
+        self.hedge_orders = hedge_orders
+        self.ref_ids = ref_ids or RefIdAllocator()
+        self.journal = journal
+        self.order_timeout = order_timeout
+
+        # API endpoints, primary first
+        if not endpoints:
+            endpoints = [base_url, backup_base_url]
+        self.base_url = endpoints[0].rstrip("/")
+        self.backup_base_url = endpoints[1].rstrip("/") if len(endpoints) > 1 else None
+        self.router = EndpointRouter(
+            [Endpoint(url) for url in endpoints],
+            client_factory=self._get_client,
+            rate_limiter=TokenBucket(rate_limit, burst=rate_burst) if rate_limit > 0 else None
+        )
+
+        # Shared HTTP client; httpx keeps a keep-alive pool per origin,
+        # so every endpoint reuses its own connections.
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Shared balance cache; invalidated whenever an order succeeds
+        self.balance_cache = SingleFlightCache(
+            self._fetch_balance,
+            ttl=balance_cache_ttl,
+            serve_stale=balance_serve_stale
+        )
+
+    async def start(self) -> None:
+        """Open the shared HTTP client. Safe to call more than once."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits)
+
+    async def close(self) -> None:
+        """Close the shared HTTP client and release pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client, opening it on first use."""
+        if self._client is None or self._client.is_closed:
+            await self.start()
+        return self._client
+
+    async def check_balance(self, fresh: bool = False) -> Dict[str, Any]:
         """
         Check account balance
-        
+
+        Concurrent callers share one upstream request, and a successful
+        result is reused for the cache TTL.
+
+        Args:
+            fresh: Bypass the cached balance and query the upstream
+
         Returns:
             Dict with 'success' (bool) and either 'data' or 'error'
         """
+        return await self.balance_cache.get(fresh=fresh)
+
+    async def _fetch_balance(self) -> Dict[str, Any]:
+        """Query the upstream /CekSaldo endpoint"""
+        started = time.perf_counter()
+        result = await self._query_balance()
+        OPERATION_SECONDS.observe(time.perf_counter() - started, "balance", _result_label(result))
+        return result
+
+    async def _query_balance(self) -> Dict[str, Any]:
         try:
-            signature = generate_signature(self.member_id, self.pin, self.password)
-            
+            signature = self.signer.balance_signature
+
             # For balance check, include empty product, dest, and refID parameters
             params = {
                 "memberID": self.member_id,
@@ -54,158 +187,30 @@ class OmegatronikService:
                 "refID": "",
                 "sign": signature
             }
-            
-            # Debug logging
-            logger.info(f"=== BALANCE REQUEST DEBUG ===")
-            logger.info(f"Endpoint: {self.balance_endpoint}")
-            logger.info(f"Params: {params}")
-            logger.info(f"Signature: {signature}")
-            
-            response = requests.get(self.balance_endpoint, params=params, timeout=30)
-            
-            logger.info(f"=== BALANCE RESPONSE DEBUG ===")
-            logger.info(f"Status Code: {response.status_code}")
-            logger.info(f"Headers: {dict(response.headers)}")
-            logger.info(f"Response Content: {response.text}")
-            
+
+            # Balance checks are idempotent, so hedge freely
+            started = time.perf_counter()
+            endpoint, response = await self.router.request(
+                "/CekSaldo", params, timeout=30, hedge=True, priority=Priority.NORMAL
+            )
+            elapsed = time.perf_counter() - started
+
             if response.status_code == 200:
-                # Try to parse as JSON first
-                try:
-                    data = response.json()
-                    logger.info(f"Parsed JSON: {data}")
-                    
-                    # Check for success status
-                    if data.get("status") == "success" or data.get("status") == "20":
-                        return {
-                            "success": True,
-                            "data": {
-                                "saldo": data.get("balance", data.get("saldo", 0)),
-                                "status": data.get("account_status", "active"),
-                                "message": data.get("message", "Success")
-                            }
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": data.get("message", data.get("keterangan", "Unknown error"))
-                        }
-                except ValueError:
-                    logger.info("Response is not JSON, trying plain text parsing")
-                
-                # Check if response is plain text with balance
-                response_text = response.text.strip()
-                
-                # If response is just "OK", it might mean success but no balance data
-                if response_text == "OK":
-                    return {
-                        "success": True,
-                        "data": {
-                            "message": "Balance check successful",
-                            "note": "Balance information not returned in response"
-                        }
-                    }
-                
-                # Check if response contains error messages
-                if "Invalid" in response_text or "Error" in response_text or "Gagal" in response_text:
-                    return {
-                        "success": False,
-                        "error": response_text
-                    }
-                
-                # Try to parse as pipe-delimited format (common in H2H APIs)
-                # Format: status|balance|message
-                if "|" in response_text:
-                    parts = response_text.split("|")
-                    if len(parts) >= 2:
-                        status = parts[0]
-                        balance = parts[1] if len(parts) > 1 else "0"
-                        message = parts[2] if len(parts) > 2 else ""
-                        
-                        if status == "20" or status == "success":
-                            return {
-                                "success": True,
-                                "data": {
-                                    "saldo": balance,
-                                    "status": "active",
-                                    "message": message
-                                }
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "error": message or f"Status: {status}"
-                            }
-                
-                # If we can't parse the response, return it as-is
-                return {
-                    "success": False,
-                    "error": f"Unable to parse response: {response_text[:200]}"
-                }
+                result = balance_result(response.text)
             else:
-                # Try backup endpoint
-                logger.warning("Primary endpoint failed, trying backup...")
-                response = requests.get(self.backup_balance_endpoint, params=params, timeout=30)
-                
-                logger.info(f"=== BACKUP BALANCE RESPONSE DEBUG ===")
-                logger.info(f"Status Code: {response.status_code}")
-                logger.info(f"Response Content: {response.text}")
-                
-                if response.status_code == 200:
-                    # Try JSON parsing
-                    try:
-                        data = response.json()
-                        if data.get("status") == "success" or data.get("status") == "20":
-                            return {
-                                "success": True,
-                                "data": {
-                                    "saldo": data.get("balance", data.get("saldo", 0)),
-                                    "status": data.get("account_status", "active")
-                                }
-                            }
-                    except ValueError:
-                        pass
-                    
-                    # Try pipe-delimited parsing
-                    response_text = response.text.strip()
-                    if "|" in response_text:
-                        parts = response_text.split("|")
-                        if len(parts) >= 2 and (parts[0] == "20" or parts[0] == "success"):
-                            return {
-                                "success": True,
-                                "data": {
-                                    "saldo": parts[1],
-                                    "status": "active"
-                                }
-                            }
-                
-                return {
+                result = {
                     "success": False,
                     "error": f"HTTP {response.status_code}: {response.text}"
                 }
-                
-        except requests.exceptions.Timeout:
-            return {
-                "success": False,
-                "error": "Request timeout. Please try again."
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "error": f"Connection error: {str(e)}"
-            }
-        except Exception as e:
-            logger.error(f"Error checking balance: {e}")
-            return {
-                "success": False,
-                "error": f"Unexpected error: {str(e)}"
-            }
-                
-        except requests.exceptions.Timeout:
+            self._log_exchange("CekSaldo", params, endpoint, response, elapsed, result)
+            return result
+
+        except httpx.TimeoutException:
             return {
                 "success": False,
                 "error": "Request timeout. Please try again."
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "success": False,
                 "error": f"Connection error: {str(e)}"
@@ -216,26 +221,85 @@ class OmegatronikService:
                 "success": False,
                 "error": f"Unexpected error: {str(e)}"
             }
-    
-    async def order_product(self, destination: str, product_code: str) -> Dict[str, Any]:
+
+    def _log_exchange(self, name: str, params: Dict[str, Any], endpoint: Endpoint,
+                      response: httpx.Response, elapsed: float, result: Dict[str, Any]) -> None:
+        """
+        Log one upstream call
+
+        Successes are logged as sampled INFO records and failures as
+        WARNING. Full request/response dumps are only built when DEBUG is
+        enabled, with credentials redacted.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s request params=%s", name, Redacted(params))
+            logger.debug("%s response headers=%s body=%s", name, dict(response.headers), response.text)
+
+        fields = {
+            "endpoint": endpoint.base_url,
+            "http_status": response.status_code,
+            "elapsed_ms": round(elapsed * 1000),
+            "ref_id": params.get("refID") or None,
+        }
+        if result["success"]:
+            fields["sampled"] = True
+            logger.info("%s OK from %s in %dms", name, endpoint.base_url, fields["elapsed_ms"], extra=fields)
+        else:
+            logger.warning("%s failed from %s in %dms: %s", name, endpoint.base_url,
+                           fields["elapsed_ms"], result["error"], extra=fields)
+
+    async def order_product(self, destination: str, product_code: str,
+                            ref_id: Optional[str] = None,
+                            meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Order a product
-        
+
         Args:
             destination: Destination number (phone number, meter ID, etc.)
             product_code: Product code to order
-            
+            ref_id: refID to send; a new one is allocated when omitted. Reusing
+                the refID of an earlier order asks the upstream for that
+                order's status instead of placing a new one.
+            meta: Extra fields for the journal record (user_id, chat_id, message_id)
+
         Returns:
-            Dict with 'success' (bool) and either 'data' or 'error'
+            Dict with 'success' (bool), 'ref_id' and either 'data' or 'error'.
+            'pending' is True when the outcome is unknown (timeout or
+            connection error) and the order may still have been charged.
         """
-        try:
-            import time
-            ref_id = str(int(time.time()))
-            
-            signature = generate_order_signature(
-                self.member_id, self.pin, self.password, destination, product_code
+        if ref_id is None:
+            ref_id = self.ref_ids.next()
+
+        if self.journal is not None:
+            # Durable before the request goes out, so a crash leaves a trace to reconcile
+            await self.journal.record(
+                ref_id, OrderState.SENT,
+                destination=destination, product_code=product_code, **(meta or {})
             )
-            
+
+        result = await self.send_order(destination, product_code, ref_id)
+        if self.journal is not None:
+            await journal_order_result(self.journal, ref_id, result)
+        return result
+
+    async def send_order(self, destination: str, product_code: str, ref_id: str) -> Dict[str, Any]:
+        """
+        Send an order with a given refID, without journaling it
+
+        Returns:
+            The same result dict as :meth:`order_product`
+        """
+        started = time.perf_counter()
+        result = await self._send_order(destination, product_code, ref_id)
+        OPERATION_SECONDS.observe(time.perf_counter() - started, "order", _result_label(result))
+        result["ref_id"] = ref_id
+        return result
+
+    async def _send_order(self, destination: str, product_code: str, ref_id: str) -> Dict[str, Any]:
+        """Send a /trx request with the given refID"""
+        try:
+            signature = self.signer.sign_order(destination, product_code, ref_id)
+
             # Build query string for GET request
             params = {
                 "memberID": self.member_id,
@@ -247,116 +311,37 @@ class OmegatronikService:
                 "refID": ref_id,
                 "sign": signature
             }
-            
-            # Debug logging
-            logger.info(f"=== ORDER REQUEST DEBUG ===")
-            logger.info(f"Endpoint: {self.order_endpoint}")
-            logger.info(f"Params: {params}")
-            logger.info(f"Signature: {signature}")
-            
-            response = requests.get(self.order_endpoint, params=params, timeout=60)
-            
-            logger.info(f"=== ORDER RESPONSE DEBUG ===")
-            logger.info(f"Status Code: {response.status_code}")
-            logger.info(f"Headers: {dict(response.headers)}")
-            logger.info(f"Response Content: {response.text}")
-            
+
+            # Every attempt carries the same refID, so a retry or hedge on
+            # another endpoint is deduplicated upstream instead of charged twice
+            started = time.perf_counter()
+            endpoint, response = await self.router.request(
+                "/trx", params, timeout=self.order_timeout, hedge=self.hedge_orders, priority=Priority.HIGH
+            )
+            elapsed = time.perf_counter() - started
+
             if response.status_code == 200:
-                # Check if response is plain text error
-                if "Invalid" in response.text or "Error" in response.text:
-                    return {
-                        "success": False,
-                        "error": response.text.strip()
-                    }
-                
-                # Try to parse as JSON
-                try:
-                    data = response.json()
-                except ValueError as e:
-                    logger.error(f"Failed to parse JSON response: {e}")
-                    return {
-                        "success": False,
-                        "error": f"Invalid API response: {response.text[:200]}"
-                    }
-                
-                if data.get("status") == "success":
-                    return {
-                        "success": True,
-                        "data": {
-                            "trx_id": data.get("trx_id"),
-                            "destination": data.get("dest"),
-                            "product_code": data.get("product"),
-                            "product_name": data.get("product_name"),
-                            "price": data.get("price"),
-                            "status": data.get("status"),
-                            "message": data.get("message")
-                        }
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": data.get("message", "Unknown error")
-                    }
+                result = order_result(response.text)
+                if result["success"]:
+                    self.balance_cache.invalidate()
             else:
-                # Try backup endpoint
-                logger.warning("Primary endpoint failed, trying backup...")
-                response = requests.get(self.backup_order_endpoint, params=params, timeout=60)
-                
-                logger.info(f"=== BACKUP ORDER RESPONSE DEBUG ===")
-                logger.info(f"Status Code: {response.status_code}")
-                logger.info(f"Response Content: {response.text}")
-                
-                if response.status_code == 200:
-                    # Check if response is plain text success
-                    if response.text.strip() == "OK":
-                        return {
-                            "success": True,
-                            "data": {
-                                "message": "Success"
-                            }
-                        }
-                    
-                    if "Invalid" in response.text or "Error" in response.text:
-                        return {
-                            "success": False,
-                            "error": response.text.strip()
-                        }
-                    
-                    try:
-                        data = response.json()
-                    except ValueError as e:
-                        return {
-                            "success": False,
-                            "error": f"Invalid API response: {response.text[:200]}"
-                        }
-                    
-                    if data.get("status") == "success":
-                        return {
-                            "success": True,
-                            "data": {
-                                "trx_id": data.get("trx_id"),
-                                "destination": data.get("dest"),
-                                "product_code": data.get("product"),
-                                "product_name": data.get("product_name"),
-                                "price": data.get("price"),
-                                "status": data.get("status"),
-                                "message": data.get("message")
-                            }
-                        }
-                
-                return {
+                result = {
                     "success": False,
                     "error": f"HTTP {response.status_code}: {response.text}"
                 }
-                
-        except requests.exceptions.Timeout:
+            self._log_exchange("trx", params, endpoint, response, elapsed, result)
+            return result
+
+        except httpx.TimeoutException:
             return {
                 "success": False,
+                "pending": True,
                 "error": "Request timeout. Please try again."
             }
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "success": False,
+                "pending": True,
                 "error": f"Connection error: {str(e)}"
             }
         except Exception as e:
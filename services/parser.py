@@ -0,0 +1,230 @@
+import json
+import re
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseKind(str, Enum):
+    """Shape of an upstream reply body"""
+    JSON = 'json'       # {"status": ..., ...}
+    PIPE = 'pipe'       # status|value|message
+    OK = 'ok'           # bare "OK"
+    ERROR = 'error'     # plain-text error, e.g. "Invalid signature"
+    TEXT = 'text'       # anything else
+
+
+class Outcome(str, Enum):
+    """What an upstream status means for the request"""
+    SUCCESS = 'success'
+    ACCEPTED = 'accepted'   # taken, final status follows later
+    FAILED = 'failed'
+
+
+# Status values of balance replies (JSON and pipe), compared lower-cased
+STATUS_OUTCOMES: Dict[str, Outcome] = {
+    'success': Outcome.SUCCESS,
+    'sukses': Outcome.SUCCESS,
+    '20': Outcome.SUCCESS,
+    'pending': Outcome.ACCEPTED,
+    'process': Outcome.ACCEPTED,
+    'processing': Outcome.ACCEPTED,
+    'accepted': Outcome.ACCEPTED,
+}
+
+# Status values of JSON order replies, compared lower-cased except for
+# ORDER_EXACT_STATUSES. An order only counts as successful on the literal
+# "success" the /trx path has always required; the balance codes '20' and
+# 'sukses' mean nothing here, since a success tells the user the order went
+# through. Any spelling of the in-progress statuses is accepted, as a miss
+# there would report a taken order as failed.
+ORDER_STATUS_OUTCOMES: Dict[str, Outcome] = {
+    'success': Outcome.SUCCESS,
+    'pending': Outcome.ACCEPTED,
+    'process': Outcome.ACCEPTED,
+    'processing': Outcome.ACCEPTED,
+    'accepted': Outcome.ACCEPTED,
+}
+ORDER_EXACT_STATUSES = frozenset({'success'})
+
+# Column names of pipe-delimited balance replies; the first column is the
+# status code, named 'code' because 'status' is the account status
+BALANCE_COLUMNS = ('code', 'saldo', 'message')
+
+# Result field -> JSON keys to read it from, first present wins
+BALANCE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'saldo': ('balance', 'saldo'),
+    'status': ('account_status',),
+    'message': ('message', 'keterangan'),
+}
+ORDER_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'trx_id': ('trx_id', 'trxid'),
+    'destination': ('dest', 'destination'),
+    'product_code': ('product', 'product_code'),
+    'product_name': ('product_name',),
+    'price': ('price', 'harga'),
+    'status': ('status',),
+    'message': ('message', 'keterangan'),
+}
+
+_ERROR_PATTERN = re.compile(r'Invalid|Error|Gagal')
+
+
+class ParsedResponse:
+    """An upstream reply body, classified once"""
+
+    __slots__ = ('kind', 'outcome', 'fields', 'raw')
+
+    def __init__(self, kind: ResponseKind, outcome: Outcome, fields: Dict[str, Any], raw: str):
+        self.kind = kind
+        self.outcome = outcome
+        self.fields = fields
+        self.raw = raw
+
+    def __repr__(self) -> str:
+        return f"<ParsedResponse {self.kind.value} {self.outcome.value}>"
+
+    @property
+    def success(self) -> bool:
+        return self.outcome != Outcome.FAILED
+
+    @property
+    def message(self) -> Optional[str]:
+        return self.fields.get('message')
+
+
+def _status_outcome(status: str, statuses: Dict[str, Outcome], fold_case: bool, exact: frozenset) -> Outcome:
+    outcome = statuses.get(status)
+    if outcome is None and fold_case:
+        folded = status.lower()
+        if folded not in exact:
+            outcome = statuses.get(folded)
+    return outcome or Outcome.FAILED
+
+
+def parse_response(text: str, columns: Tuple[str, ...] = BALANCE_COLUMNS,
+                   fields: Optional[Dict[str, Tuple[str, ...]]] = None,
+                   statuses: Dict[str, Outcome] = STATUS_OUTCOMES, fold_case: bool = True,
+                   exact: frozenset = frozenset()) -> ParsedResponse:
+    """
+    Classify an upstream reply body and extract its fields
+
+    The body is stripped once and dispatched on its first character, so each
+    reply is decoded by exactly one path: JSON objects, pipe-delimited
+    ``status|value|message`` lines, a bare ``OK``, or plain text.
+
+    Args:
+        text: Response body
+        columns: Field names for the pipe-delimited columns
+        fields: Result field -> JSON keys table; JSON keys are kept as-is when omitted
+        statuses: Status value -> outcome table; other values are failures
+        fold_case: Lower-case status values before looking them up
+        exact: Status values that only match in their exact case, even with fold_case
+
+    Returns:
+        ParsedResponse with the body kind, the outcome and the extracted fields
+    """
+    body = text.strip()
+
+    if body[:1] == '{':
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            status = str(data.get('status', ''))
+            if fields is None:
+                values = data
+            else:
+                values = {}
+                for name, keys in fields.items():
+                    for key in keys:
+                        if data.get(key) is not None:
+                            values[name] = data[key]
+                            break
+            return ParsedResponse(
+                ResponseKind.JSON, _status_outcome(status, statuses, fold_case, exact), values, body
+            )
+
+    elif '|' in body:
+        parts = body.split('|')
+        values = {name: part for name, part in zip(columns, parts) if part}
+        status = parts[0].strip()
+        outcome = _status_outcome(status, statuses, fold_case, exact)
+        return ParsedResponse(ResponseKind.PIPE, outcome, values, body)
+
+    elif body == 'OK':
+        return ParsedResponse(ResponseKind.OK, Outcome.SUCCESS, {}, body)
+
+    if _ERROR_PATTERN.search(body):
+        return ParsedResponse(ResponseKind.ERROR, Outcome.FAILED, {'message': body}, body)
+    return ParsedResponse(ResponseKind.TEXT, Outcome.FAILED, {}, body)
+
+
+def balance_result(text: str) -> Dict[str, Any]:
+    """
+    Turn a 200 reply from /CekSaldo into the service's result dict
+
+    Returns:
+        Dict with 'success' (bool) and either 'data' or 'error'
+    """
+    parsed = parse_response(text, BALANCE_COLUMNS, BALANCE_FIELDS)
+
+    if parsed.kind == ResponseKind.OK:
+        return {
+            "success": True,
+            "data": {
+                "message": "Balance check successful",
+                "note": "Balance information not returned in response"
+            }
+        }
+
+    if parsed.kind in (ResponseKind.JSON, ResponseKind.PIPE):
+        if parsed.outcome == Outcome.SUCCESS:
+            return {
+                "success": True,
+                "data": {
+                    "saldo": parsed.fields.get("saldo", 0),
+                    "status": parsed.fields.get("status", "active"),
+                    "message": parsed.fields.get("message", "Success")
+                }
+            }
+        if parsed.kind == ResponseKind.PIPE:
+            error = parsed.message or f"Status: {parsed.fields.get('code', '')}"
+        else:
+            error = parsed.message or "Unknown error"
+        return {"success": False, "error": error}
+
+    if parsed.kind == ResponseKind.ERROR:
+        return {"success": False, "error": parsed.raw}
+    return {"success": False, "error": f"Unable to parse response: {parsed.raw[:200]}"}
+
+
+def order_result(text: str) -> Dict[str, Any]:
+    """
+    Turn a 200 reply from /trx into the service's result dict
+
+    Only a JSON ``"status": "success"`` or a bare ``OK`` is a successful
+    order. Pipe-delimited replies are balance-style and are not accepted
+    as order results.
+
+    Returns:
+        Dict with 'success' (bool) and either 'data' or 'error'. 'accepted'
+        is True when the upstream took the order but has no final status yet.
+    """
+    parsed = parse_response(text, fields=ORDER_FIELDS, statuses=ORDER_STATUS_OUTCOMES,
+                            exact=ORDER_EXACT_STATUSES)
+
+    if parsed.kind == ResponseKind.OK:
+        return {"success": True, "data": {"message": "Success"}}
+
+    if parsed.kind == ResponseKind.JSON:
+        if parsed.outcome == Outcome.FAILED:
+            return {"success": False, "error": parsed.message or "Unknown error"}
+        data = {name: parsed.fields.get(name) for name in ORDER_FIELDS}
+        if parsed.outcome == Outcome.ACCEPTED:
+            return {"success": True, "accepted": True, "data": data}
+        return {"success": True, "data": data}
+
+    if parsed.kind == ResponseKind.ERROR:
+        return {"success": False, "error": parsed.raw}
+    return {"success": False, "error": f"Invalid API response: {parsed.raw[:200]}"}
@@ -0,0 +1,269 @@
+import asyncio
+import hmac
+import json
+import logging
+import re
+import time
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl
+
+import tornado.web
+
+from services.journal import OrderRecord, OrderState, TransactionJournal
+
+
+logger = logging.getLogger(__name__)
+
+
+# Status words used by OtomaX-style H2H reports
+SUCCESS_STATUSES = {'success', 'sukses', 'berhasil', '20'}
+FAILED_STATUSES = {'failed', 'gagal', 'error', 'refund', 'dibatalkan'}
+
+_REF_PATTERN = re.compile(r'R#\s*(\w+)', re.IGNORECASE)
+_SN_PATTERN = re.compile(r'\bSN\s*[:=]?\s*([^\s,;]+)', re.IGNORECASE)
+_TRX_PATTERN = re.compile(r'\bT#\s*(\w+)', re.IGNORECASE)
+_SUCCESS_PATTERN = re.compile(r'\b(SUKSES|SUCCESS|BERHASIL)\b', re.IGNORECASE)
+_FAILED_PATTERN = re.compile(r'\b(GAGAL|FAILED|DIBATALKAN|REFUND)\b', re.IGNORECASE)
+
+
+def _first(params: Dict[str, str], *names: str) -> Optional[str]:
+    for name in names:
+        value = params.get(name)
+        if value:
+            return value.strip()
+    return None
+
+
+def parse_report(params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse a transaction report sent by the upstream
+
+    Reads explicit fields (refid, status, sn, trxid, price, message) when
+    present and falls back to the free-text message, e.g.
+    "R#173...001 S10.081234567890 SUKSES. SN: 0412...".
+
+    Args:
+        params: Report fields, keys compared case-insensitively
+
+    Returns:
+        Dict with 'ref_id', 'state' (OrderState), 'sn', 'trx_id', 'price'
+        and 'message', or None if no refID could be found
+    """
+    params = {key.lower(): str(value) for key, value in params.items()}
+    message = _first(params, 'message', 'msg', 'pesan', 'keterangan') or ''
+
+    ref_id = _first(params, 'refid', 'ref_id', 'reffid')
+    if ref_id is None:
+        match = _REF_PATTERN.search(message)
+        ref_id = match.group(1) if match else None
+    if ref_id is None:
+        return None
+
+    status = (_first(params, 'status', 'statuscode', 'status_code') or '').lower()
+    if status in SUCCESS_STATUSES:
+        state = OrderState.SUCCESS
+    elif status in FAILED_STATUSES:
+        state = OrderState.FAILED
+    elif _FAILED_PATTERN.search(message):
+        state = OrderState.FAILED
+    elif _SUCCESS_PATTERN.search(message):
+        state = OrderState.SUCCESS
+    else:
+        state = OrderState.ACCEPTED
+
+    sn = _first(params, 'sn', 'serial', 'serialnumber')
+    if sn is None:
+        match = _SN_PATTERN.search(message)
+        sn = match.group(1).rstrip('.') if match else None
+
+    trx_id = _first(params, 'trxid', 'trx_id', 'serverid')
+    if trx_id is None:
+        match = _TRX_PATTERN.search(message)
+        trx_id = match.group(1) if match else None
+
+    price = _first(params, 'price', 'harga')
+    try:
+        price = int(float(price)) if price is not None else None
+    except ValueError:
+        price = None
+
+    return {
+        'ref_id': ref_id,
+        'state': state,
+        'sn': sn,
+        'trx_id': trx_id,
+        'price': price,
+        'message': message or None,
+    }
+
+
+class ReportHandler(tornado.web.RequestHandler):
+    """
+    HTTP endpoint for upstream transaction reports.
+
+    Accepts GET query strings, form posts and JSON bodies. Requests must
+    carry the shared secret (``key`` parameter or ``X-Report-Secret``
+    header) and, when an allow list is set, come from an allowed IP. An
+    IP allow list alone is not enough: without a secret every report is
+    rejected.
+    """
+
+    SUPPORTED_METHODS = ("GET", "POST")
+
+    def initialize(self, on_report: Callable[[Dict[str, Any]], Awaitable[bool]],
+                   secret: str, allowed_ips: Iterable[str] = ()) -> None:
+        self.on_report = on_report
+        self.secret = secret
+        self.allowed_ips = set(allowed_ips)
+
+    def _params(self) -> Dict[str, str]:
+        params = {key: values[-1].decode() for key, values in self.request.query_arguments.items()}
+        body = self.request.body
+        if body:
+            content_type = self.request.headers.get('Content-Type', '')
+            if 'json' in content_type:
+                data = json.loads(body)
+                if isinstance(data, dict):
+                    params.update({key: str(value) for key, value in data.items() if value is not None})
+            else:
+                params.update(parse_qsl(body.decode(), keep_blank_values=True))
+        return params
+
+    def _verify(self, params: Dict[str, str]) -> bool:
+        if not self.secret:
+            return False
+        if self.allowed_ips and self.request.remote_ip not in self.allowed_ips:
+            return False
+        supplied = self.request.headers.get('X-Report-Secret') or params.pop('key', '')
+        return hmac.compare_digest(supplied.encode(), self.secret.encode())
+
+    async def _handle(self) -> None:
+        try:
+            params = self._params()
+        except ValueError:
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST)
+
+        if not self._verify(params):
+            logger.warning(f"Rejected report from {self.request.remote_ip}")
+            raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+
+        report = parse_report(params)
+        if report is None:
+            logger.warning(f"Report without refID: {params}")
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST)
+
+        if not await self.on_report(report):
+            raise tornado.web.HTTPError(HTTPStatus.NOT_FOUND)
+        self.write("OK")
+
+    async def get(self) -> None:
+        await self._handle()
+
+    async def post(self) -> None:
+        await self._handle()
+
+
+class ReportPoller:
+    """
+    Fallback status checks for orders that never received a report.
+
+    Periodically picks sent/accepted orders older than ``min_age`` and
+    checks them in batches with limited concurrency. Each order is checked
+    with growing gaps (min_age, 2x, 4x, ... capped at max_interval) until it
+    settles or reaches ``give_up_after``.
+    """
+
+    def __init__(self, journal: TransactionJournal,
+                 check: Callable[[OrderRecord], Awaitable[Dict[str, Any]]],
+                 on_result: Callable[[OrderRecord, Dict[str, Any]], Awaitable[None]],
+                 interval: float = 30.0, min_age: float = 60.0, max_interval: float = 900.0,
+                 batch_size: int = 20, concurrency: int = 5, give_up_after: float = 86400.0):
+        """
+        Initialize poller
+
+        Args:
+            journal: Journal holding pending orders
+            check: Coroutine that queries the upstream for one order
+            on_result: Coroutine called with each check result
+            interval: Seconds between polling rounds
+            min_age: Seconds an order waits for a report before the first check
+            max_interval: Longest gap between checks of the same order
+            batch_size: Maximum orders checked per round
+            concurrency: Maximum status checks in flight
+            give_up_after: Order age after which polling stops
+        """
+        self.journal = journal
+        self.check = check
+        self.on_result = on_result
+        self.interval = interval
+        self.min_age = min_age
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.give_up_after = give_up_after
+
+        self._next_check: Dict[str, float] = {}
+        self._attempts: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def due(self, now: Optional[float] = None) -> List[OrderRecord]:
+        """Orders whose next status check is due, oldest first"""
+        now = now or time.time()
+        due = []
+        for record in self.journal.pending():
+            if record.state == OrderState.CREATED:
+                continue
+            age = now - record.created_at
+            if age < self.min_age or age > self.give_up_after:
+                continue
+            if self._next_check.get(record.ref_id, 0) <= now:
+                due.append(record)
+        due.sort(key=lambda record: record.created_at)
+        return due[:self.batch_size]
+
+    async def poll_once(self) -> int:
+        """Run one polling round and return how many orders were checked"""
+        batch = self.due()
+        if not batch:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check_one(record: OrderRecord) -> None:
+            async with semaphore:
+                attempts = self._attempts.get(record.ref_id, 0) + 1
+                self._attempts[record.ref_id] = attempts
+                self._next_check[record.ref_id] = time.time() + min(
+                    self.max_interval, self.min_age * 2 ** attempts
+                )
+                try:
+                    result = await self.check(record)
+                    await self.on_result(record, result)
+                except Exception as e:
+                    logger.error(f"Status check for {record.ref_id} failed: {e}")
+                if not record.pending:
+                    self._next_check.pop(record.ref_id, None)
+                    self._attempts.pop(record.ref_id, None)
+
+        await asyncio.gather(*[check_one(record) for record in batch])
+        logger.info(f"Polled status of {len(batch)} pending orders")
+        return len(batch)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Report poller round failed: {e}")
@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils import metrics
+from utils.ratelimit import Priority, TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+UPSTREAM_SECONDS = metrics.histogram(
+    'omega_upstream_request_seconds', 'Latency of single upstream attempts',
+    ('endpoint', 'path', 'outcome')
+)
+UPSTREAM_TIMEOUTS = metrics.counter(
+    'omega_upstream_timeouts_total', 'Upstream attempts that timed out', ('endpoint', 'path')
+)
+UPSTREAM_FAILOVERS = metrics.counter(
+    'omega_upstream_failovers_total', 'Requests moved to another endpoint after a failed attempt',
+    ('path', 'endpoint')
+)
+UPSTREAM_THROTTLE_SECONDS = metrics.histogram(
+    'omega_upstream_throttle_seconds', 'Time upstream attempts waited for the request rate limit', ('path',)
+)
+UPSTREAM_HEDGES = metrics.counter(
+    'omega_upstream_hedges_total', 'Hedged requests sent to another endpoint because of a slow reply',
+    ('path', 'endpoint')
+)
+
+
+class Endpoint:
+    """A single upstream base URL with rolling health statistics and a circuit breaker"""
+
+    def __init__(self, base_url: str, window: int = 50, max_age: float = 300.0,
+                 min_samples: int = 5, error_threshold: float = 0.5,
+                 consecutive_failures: int = 3, open_seconds: float = 30.0):
+        """
+        Initialize endpoint
+
+        Args:
+            base_url: Base URL, e.g. https://apiomega.id
+            window: Number of recent calls kept for latency and error rates
+            max_age: Seconds after which a sample drops out of the window, so
+                a demoted endpoint is eventually tried again
+            min_samples: Calls needed before the error rate can open the circuit
+            error_threshold: Error rate (0-1) that opens the circuit
+            consecutive_failures: Back-to-back failures that open the circuit
+            open_seconds: How long the circuit stays open before a probe is allowed
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_streak = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self._probing = False
+
+    def __repr__(self) -> str:
+        return f"<Endpoint {self.base_url} {self.state}>"
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.max_age
+        for samples in (self.latencies, self.outcomes):
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+
+    @property
+    def error_rate(self) -> float:
+        self._prune()
+        if not self.outcomes:
+            return 0.0
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        return failures / len(self.outcomes)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile over the rolling window, or None without samples"""
+        self._prune()
+        if not self.latencies:
+            return None
+        ordered = sorted(latency for _, latency in self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(95)
+
+    def score(self) -> Optional[float]:
+        """Health score, lower is better: tail latency weighted by error rate. None without samples."""
+        latency = self.p95
+        if latency is None:
+            return None
+        return latency * (1 + 4 * self.error_rate)
+
+    def allow_request(self, now: float) -> bool:
+        """Whether the circuit lets a request through right now"""
+        if self.state == CIRCUIT_OPEN:
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+            self._probing = False
+        if self.state == CIRCUIT_HALF_OPEN:
+            return not self._probing
+        return True
+
+    def on_dispatch(self) -> None:
+        """Mark a request as sent; in half-open state it becomes the single probe"""
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = True
+
+    def record_success(self, latency: float) -> None:
+        now = time.monotonic()
+        self.latencies.append((now, latency))
+        self.outcomes.append((now, True))
+        self.failure_streak = 0
+        if self.state != CIRCUIT_CLOSED:
+            logger.info(f"Circuit closed for {self.base_url}")
+            self.state = CIRCUIT_CLOSED
+            self._probing = False
+
+    def record_failure(self, latency: Optional[float] = None) -> None:
+        now = time.monotonic()
+        if latency is not None:
+            self.latencies.append((now, latency))
+        self.outcomes.append((now, False))
+        self.failure_streak += 1
+
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._open()
+        elif self.state == CIRCUIT_CLOSED and (
+            self.failure_streak >= self.consecutive_failures
+            or (len(self.outcomes) >= self.min_samples and self.error_rate >= self.error_threshold)
+        ):
+            self._open()
+
+    def record_abandoned(self, elapsed: float) -> None:
+        """
+        Record a request cancelled because a hedge answered first.
+
+        The call was at least this slow, so the elapsed time is kept as a
+        latency sample, but it does not count as an error.
+        """
+        self.latencies.append((time.monotonic(), elapsed))
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = False
+
+    def _open(self) -> None:
+        logger.warning(
+            f"Circuit opened for {self.base_url} "
+            f"(error rate {self.error_rate:.0%}, {self.failure_streak} consecutive failures)"
+        )
+        self.state = CIRCUIT_OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class EndpointRouter:
+    """
+    Route upstream requests across any number of endpoints.
+
+    Healthy endpoints are tried in configured priority order; endpoints
+    whose health score has degraded go to the back. A failed attempt (timeout,
+    connection error or non-200 reply) fails over to the next endpoint at
+    once. With hedging enabled, the next endpoint is also tried when the
+    current one has not answered by its p95 latency; the first 200 reply
+    wins and the other attempts are cancelled.
+    """
+
+    def __init__(self, endpoints: List[Endpoint],
+                 client_factory: Callable[[], Awaitable[httpx.AsyncClient]],
+                 hedge_default_delay: float = 2.0,
+                 hedge_min_delay: float = 0.05,
+                 hedge_max_delay: float = 5.0,
+                 degrade_factor: float = 3.0,
+                 rate_limiter: Optional[TokenBucket] = None):
+        """
+        Initialize router
+
+        Args:
+            endpoints: Endpoints in configured priority order
+            client_factory: Coroutine returning the shared HTTP client
+            hedge_default_delay: Hedge delay used until an endpoint has latency samples
+            hedge_min_delay: Lower bound for the hedge delay
+            hedge_max_delay: Upper bound for the hedge delay
+            degrade_factor: An endpoint scoring worse than this multiple of
+                the best score is demoted behind the healthy ones
+            rate_limiter: Bucket every attempt (hedges and failovers
+                included) takes a token from before it is sent
+        """
+        if not endpoints:
+            raise ValueError("EndpointRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self._client_factory = client_factory
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.degrade_factor = degrade_factor
+        self.rate_limiter = rate_limiter
+
+    def ranked(self) -> List[Endpoint]:
+        """
+        Endpoints to try, best first.
+
+        Endpoints with an open circuit are skipped. If every circuit is open
+        the router fails open and tries them all, longest-open first.
+        Endpoints without recent samples count as healthy, so a demoted
+        primary gets traffic again once its bad samples age out.
+        """
+        now = time.monotonic()
+        available = [ep for ep in self.endpoints if ep.allow_request(now)]
+        if not available:
+            return sorted(self.endpoints, key=lambda ep: ep.opened_at)
+
+        scores = {ep: ep.score() for ep in available}
+        known = [score for score in scores.values() if score is not None]
+        limit = min(known) * self.degrade_factor + self.hedge_min_delay if known else 0.0
+
+        healthy = [ep for ep in available if scores[ep] is None or scores[ep] <= limit]
+        degraded = sorted(
+            (ep for ep in available if ep not in healthy),
+            key=lambda ep: scores[ep]
+        )
+        return healthy + degraded
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        """How long to wait on an endpoint before hedging to the next one"""
+        delay = endpoint.p95
+        if delay is None:
+            delay = self.hedge_default_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    async def _attempt(self, client: httpx.AsyncClient, endpoint: Endpoint, path: str,
+                       params: Dict[str, str], timeout: float, priority: int) -> httpx.Response:
+        if self.rate_limiter is not None:
+            UPSTREAM_THROTTLE_SECONDS.observe(await self.rate_limiter.acquire(priority), path)
+        started = time.monotonic()
+        try:
+            response = await client.get(f"{endpoint.base_url}{path}", params=params, timeout=timeout)
+        except asyncio.CancelledError:
+            elapsed = time.monotonic() - started
+            endpoint.record_abandoned(elapsed)
+            UPSTREAM_SECONDS.observe(elapsed, endpoint.base_url, path, 'abandoned')
+            raise
+        except httpx.TimeoutException:
+            endpoint.record_failure()
+            UPSTREAM_SECONDS.observe(time.monotonic() - started, endpoint.base_url, path, 'timeout')
+            UPSTREAM_TIMEOUTS.inc(endpoint.base_url, path)
+            raise
+        except httpx.HTTPError:
+            endpoint.record_failure()
+            UPSTREAM_SECONDS.observe(time.monotonic() - started, endpoint.base_url, path, 'error')
+            raise
+
+        latency = time.monotonic() - started
+        if response.status_code == 200:
+            endpoint.record_success(latency)
+            UPSTREAM_SECONDS.observe(latency, endpoint.base_url, path, 'ok')
+        else:
+            endpoint.record_failure(latency)
+            UPSTREAM_SECONDS.observe(latency, endpoint.base_url, path, 'http_error')
+        return response
+
+    async def request(self, path: str, params: Dict[str, str], timeout: float,
+                      hedge: bool = True, priority: int = Priority.NORMAL) -> Tuple[Endpoint, httpx.Response]:
+        """
+        Send a GET request to the healthiest endpoint, failing over and hedging as needed.
+
+        Args:
+            path: Request path, e.g. /CekSaldo
+            params: Query parameters, sent unchanged to every endpoint
+            timeout: Per-attempt timeout in seconds
+            hedge: Whether to send a hedged request when an endpoint is slow
+            priority: Queue position when the rate limiter is saturated
+
+        Returns:
+            Tuple of the endpoint that answered and its response. When no
+            endpoint returns 200, the last non-200 response is returned.
+
+        Raises:
+            httpx.HTTPError: If every endpoint failed without a response
+        """
+        client = await self._client_factory()
+        candidates = self.ranked()
+        pending: Dict[asyncio.Task, Endpoint] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+        last_reply: Optional[Tuple[Endpoint, httpx.Response]] = None
+
+        def launch() -> Endpoint:
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            endpoint.on_dispatch()
+            task = asyncio.ensure_future(self._attempt(client, endpoint, path, params, timeout, priority))
+            pending[task] = endpoint
+            return endpoint
+
+        current = launch()
+        try:
+            while pending:
+                wait = None
+                if hedge and next_index < len(candidates):
+                    wait = self.hedge_delay(current)
+
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    nxt = launch()
+                    UPSTREAM_HEDGES.inc(path, nxt.base_url)
+                    logger.warning(
+                        f"No reply from {current.base_url} after {wait:.2f}s, "
+                        f"hedging {path} to {nxt.base_url}"
+                    )
+                    current = nxt
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except httpx.HTTPError as e:
+                        last_error = e
+                        logger.warning(f"{path} via {endpoint.base_url} failed: {type(e).__name__}: {e}")
+                        continue
+                    if response.status_code == 200:
+                        return endpoint, response
+                    last_reply = (endpoint, response)
+                    logger.warning(f"{path} via {endpoint.base_url} returned HTTP {response.status_code}")
+
+                # Fail over straight away instead of waiting for the hedge timer
+                if next_index < len(candidates):
+                    nxt = launch()
+                    UPSTREAM_FAILOVERS.inc(path, nxt.base_url)
+                    logger.warning(f"Failing over {path} to {nxt.base_url}")
+                    current = nxt
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if last_reply is not None:
+            return last_reply
+        raise last_error
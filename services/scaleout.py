@@ -0,0 +1,326 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import subprocess
+import sys
+import zlib
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional
+
+import httpx
+import tornado.web
+
+from utils import metrics
+from utils.refid import RefIdAllocator
+
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_UPDATES = metrics.counter(
+    'front_updates_forwarded_total', 'Telegram updates passed to a worker', ('worker',)
+)
+DUPLICATE_UPDATES = metrics.counter(
+    'front_updates_duplicate_total', 'Redelivered Telegram updates dropped by update_id'
+)
+FORWARD_FAILURES = metrics.counter(
+    'front_forward_failures_total', 'Updates or reports a worker did not accept', ('worker',)
+)
+
+# Update fields whose payload names the chat (or user) the update belongs to
+_CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'my_chat_member', 'chat_member', 'chat_join_request')
+_USER_FIELDS = ('callback_query', 'inline_query', 'chosen_inline_result',
+                'shipping_query', 'pre_checkout_query', 'poll_answer')
+
+
+def chat_key(update: Dict[str, Any]) -> int:
+    """
+    Chat an update belongs to, read from the raw update JSON
+
+    Callback queries use the chat of their message, so a conversation's
+    button presses and text messages land on the same worker. Updates
+    without a chat fall back to the sending user, then to the update_id.
+    """
+    for field in _CHAT_FIELDS:
+        payload = update.get(field)
+        if payload and payload.get('chat'):
+            return payload['chat']['id']
+    for field in _USER_FIELDS:
+        payload = update.get(field)
+        if payload:
+            message = payload.get('message')
+            if message and message.get('chat'):
+                return message['chat']['id']
+            sender = payload.get('from') or payload.get('user')
+            if sender:
+                return sender['id']
+    return update.get('update_id', 0)
+
+
+class UpdateDeduplicator:
+    """Remembers the most recent update_ids to drop Telegram redeliveries"""
+
+    def __init__(self, capacity: int = 10_000):
+        self.capacity = capacity
+        self._seen: OrderedDict = OrderedDict()
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._seen
+
+    def add(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+
+
+class WorkerPool:
+    """
+    Child bot processes, each serving updates on its own loopback port.
+
+    Worker ``i`` is started with WORKER_INDEX=i, WORKER_PORT and the shared
+    INTERNAL_TOKEN in its environment, and is restarted if it exits while
+    the pool is running.
+    """
+
+    def __init__(self, count: int, base_port: int, command: List[str],
+                 env: Optional[Dict[str, str]] = None, host: str = '127.0.0.1'):
+        """
+        Initialize pool
+
+        Args:
+            count: Number of worker processes
+            base_port: Port of worker 0; worker i listens on base_port + i
+            command: Command line that starts one worker
+            env: Extra environment for every worker
+            host: Address the workers listen on
+        """
+        self.count = count
+        self.base_port = base_port
+        self.command = command
+        self.env = env or {}
+        self.host = host
+        self._processes: List[Optional[subprocess.Popen]] = [None] * count
+        self._monitor: Optional[asyncio.Task] = None
+
+    def url(self, index: int) -> str:
+        return f"http://{self.host}:{self.base_port + index}"
+
+    def _spawn(self, index: int) -> None:
+        env = dict(os.environ, **self.env, WORKER_INDEX=str(index), WORKER_PORT=str(self.base_port + index))
+        self._processes[index] = subprocess.Popen(self.command, env=env)
+        logger.info(f"Started worker {index} (pid {self._processes[index].pid}) on {self.url(index)}")
+
+    def start(self) -> None:
+        for index in range(self.count):
+            self._spawn(index)
+        self._monitor = asyncio.create_task(self._watch())
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+        for process in self._processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                try:
+                    await asyncio.to_thread(process.wait, timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self._processes):
+                if process is not None and process.poll() is not None:
+                    logger.error(f"Worker {index} exited with code {process.returncode}, restarting")
+                    self._spawn(index)
+
+
+class FrontReceiver:
+    """
+    Thin front end that fans Telegram updates and upstream reports out to workers.
+
+    Updates are pinned to a worker by chat, so one conversation is always
+    handled by the same process and in arrival order. Reports go to the
+    worker whose refID node digits match the order's refID.
+    """
+
+    def __init__(self, worker_urls: List[str], internal_token: str, base_node: int = 0,
+                 dedup_capacity: int = 10_000, timeout: float = 10.0):
+        """
+        Initialize receiver
+
+        Args:
+            worker_urls: Base URL of each worker, in worker index order
+            internal_token: Shared secret the workers expect on forwarded requests
+            base_node: refID node of worker 0; worker i uses base_node + i
+            dedup_capacity: Number of recent update_ids remembered
+            timeout: Seconds to wait for a worker to accept a request
+        """
+        self.worker_urls = worker_urls
+        self.internal_token = internal_token
+        self.base_node = base_node
+        self.timeout = timeout
+        self.dedup = UpdateDeduplicator(dedup_capacity)
+        self._client: Optional[httpx.AsyncClient] = None
+        # update_ids being forwarded; a redelivery waits for the first attempt
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=len(self.worker_urls) * 16)
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def worker_for(self, update: Dict[str, Any]) -> int:
+        # crc32 rather than hash(): stable across processes and restarts
+        return zlib.crc32(str(chat_key(update)).encode()) % len(self.worker_urls)
+
+    async def _post(self, index: int, path: str, body: bytes, content_type: str) -> int:
+        response = await self._client.post(
+            f"{self.worker_urls[index]}{path}", content=body, timeout=self.timeout,
+            headers={'Content-Type': content_type, 'X-Telegram-Bot-Api-Secret-Token': self.internal_token,
+                     'X-Report-Secret': self.internal_token}
+        )
+        return response.status_code
+
+    async def forward_update(self, body: bytes) -> bool:
+        """
+        Pass a raw update to its worker
+
+        Returns:
+            True when the update was accepted or is a duplicate; False asks
+            Telegram to redeliver it later
+        """
+        update = json.loads(body)
+        update_id = update.get('update_id')
+        if update_id in self.dedup:
+            DUPLICATE_UPDATES.inc()
+            return True
+        pending = self._inflight.get(update_id)
+        if pending is not None:
+            DUPLICATE_UPDATES.inc()
+            return await asyncio.shield(pending)
+
+        index = self.worker_for(update)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[update_id] = future
+        try:
+            status = await self._post(index, '/update', body, 'application/json')
+            accepted = status == HTTPStatus.OK
+        except httpx.HTTPError as e:
+            logger.error(f"Worker {index} unreachable for update {update_id}: {e}")
+            accepted = False
+        finally:
+            del self._inflight[update_id]
+
+        if accepted:
+            self.dedup.add(update_id)
+            FORWARDED_UPDATES.inc(index)
+        else:
+            FORWARD_FAILURES.inc(index)
+        future.set_result(accepted)
+        return accepted
+
+    async def forward_report(self, report: Dict[str, Any]) -> bool:
+        """Pass a parsed report to the worker that placed the order; False for unknown refIDs"""
+        node = RefIdAllocator.node_of(report['ref_id'])
+        index = (node - self.base_node) if node is not None else -1
+        if not 0 <= index < len(self.worker_urls):
+            logger.warning(f"Report for refID {report['ref_id']} matches no worker")
+            return False
+
+        body = json.dumps({
+            'refid': report['ref_id'],
+            'status': report['state'].value,
+            'sn': report['sn'],
+            'trxid': report['trx_id'],
+            'price': report['price'],
+            'message': report['message'],
+        }).encode()
+        try:
+            status = await self._post(index, '/report', body, 'application/json')
+        except httpx.HTTPError as e:
+            FORWARD_FAILURES.inc(index)
+            raise tornado.web.HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, f"Worker {index} unreachable: {e}")
+        if status not in (HTTPStatus.OK, HTTPStatus.NOT_FOUND):
+            FORWARD_FAILURES.inc(index)
+            raise tornado.web.HTTPError(HTTPStatus.SERVICE_UNAVAILABLE)
+        return status == HTTPStatus.OK
+
+    async def worker_metrics(self, index: int) -> httpx.Response:
+        """
+        Fetch one worker's /metrics page
+
+        Raises:
+            IndexError: For a worker index that does not exist
+            httpx.HTTPError: When the worker cannot be reached
+        """
+        if not 0 <= index < len(self.worker_urls):
+            raise IndexError(f"No worker {index}")
+        return await self._client.get(f"{self.worker_urls[index]}/metrics", timeout=5)
+
+
+class FrontWebhookHandler(tornado.web.RequestHandler):
+    """Receive Telegram updates at the front and forward them without decoding into PTB objects"""
+
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, front: FrontReceiver, secret_token: Optional[str] = None) -> None:
+        self.front = front
+        self.secret_token = secret_token
+
+    async def post(self) -> None:
+        if self.secret_token:
+            supplied = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(supplied.encode(), self.secret_token.encode()):
+                raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+        try:
+            accepted = await self.front.forward_update(self.request.body)
+        except (ValueError, AttributeError):
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST)
+        if not accepted:
+            # Telegram retries non-2xx replies, so the update is not lost
+            raise tornado.web.HTTPError(HTTPStatus.SERVICE_UNAVAILABLE)
+        self.set_status(HTTPStatus.OK)
+
+
+class WorkerMetricsHandler(tornado.web.RequestHandler):
+    """Proxy a worker's /metrics through the front, e.g. /metrics/worker/2"""
+
+    SUPPORTED_METHODS = ("GET",)
+
+    def initialize(self, front: FrontReceiver, token: Optional[str] = None) -> None:
+        self.front = front
+        self.token = token
+
+    async def get(self, index: str) -> None:
+        if self.token:
+            supplied = self.request.headers.get("Authorization", "")
+            if not hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode()):
+                raise tornado.web.HTTPError(HTTPStatus.UNAUTHORIZED)
+        try:
+            response = await self.front.worker_metrics(int(index))
+        except IndexError:
+            raise tornado.web.HTTPError(HTTPStatus.NOT_FOUND)
+        except httpx.HTTPError:
+            raise tornado.web.HTTPError(HTTPStatus.BAD_GATEWAY)
+        self.set_status(response.status_code)
+        self.set_header("Content-Type", response.headers.get("Content-Type", "text/plain"))
+        self.write(response.content)
+
+
+def worker_command() -> List[str]:
+    """Command line that starts another copy of the running bot as a worker"""
+    return [sys.executable, os.path.abspath(sys.argv[0])]
@@ -0,0 +1,429 @@
+import asyncio
+import calendar
+import heapq
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils import metrics
+from utils.ratelimit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED_RUNS = metrics.counter(
+    'bot_scheduled_orders_total', 'Scheduled orders fired, caught up after a restart or missed', ('result',)
+)
+
+# Indonesian schedule words
+REPEATS = {'sekali': 'once', 'harian': 'daily', 'mingguan': 'weekly', 'bulanan': 'monthly'}
+WEEKDAYS = ('senin', 'selasa', 'rabu', 'kamis', 'jumat', 'sabtu', 'minggu')
+
+_COLUMNS = ('id', 'user_id', 'chat_id', 'destination', 'product_code', 'repeat', 'day', 'at', 'date',
+            'next_due', 'last_run', 'last_ref_id', 'created_at')
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM schedules"
+
+
+class Schedule:
+    """A recurring or one-off order and when it is due next"""
+
+    __slots__ = _COLUMNS
+
+    def __init__(self, **fields):
+        for name in _COLUMNS:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self) -> str:
+        return f"<Schedule {self.id} {self.repeat} {self.product_code} {self.destination}>"
+
+    def describe(self) -> str:
+        """When the schedule runs, in words"""
+        if self.repeat == 'daily':
+            return f"Setiap hari pukul {self.at}"
+        if self.repeat == 'weekly':
+            return f"Setiap {WEEKDAYS[self.day].capitalize()} pukul {self.at}"
+        if self.repeat == 'monthly':
+            return f"Setiap tanggal {self.day} pukul {self.at}"
+        return f"Sekali, {datetime.strptime(self.date, '%Y-%m-%d'):%d/%m/%Y} pukul {self.at}"
+
+
+def parse_schedule(words: Sequence[str]) -> Dict[str, Any]:
+    """
+    Parse when a schedule runs from the words after destination and product
+
+    Forms: ``harian 07:00``, ``mingguan senin 07:00``, ``bulanan 1 07:00``
+    and ``sekali 2026-11-01 07:00`` (or ``01/11/2026``). Monthly schedules
+    on days a month lacks run on its last day.
+
+    Returns:
+        Dict with repeat, day, at and date
+
+    Raises:
+        ValueError: With a message for the user when the words do not parse
+    """
+    words = [word.lower() for word in words]
+    if not words or words[0] not in REPEATS:
+        raise ValueError("Jenis jadwal harus sekali, harian, mingguan atau bulanan")
+    repeat = REPEATS[words[0]]
+    args = words[1:]
+    expected = 1 if repeat == 'daily' else 2
+    if len(args) != expected:
+        examples = {
+            'daily': "harian 07:00", 'weekly': "mingguan senin 07:00",
+            'monthly': "bulanan 1 07:00", 'once': "sekali 2026-11-01 07:00",
+        }
+        raise ValueError(f"Format jadwal: {examples[repeat]}")
+
+    try:
+        at = datetime.strptime(args[-1], '%H:%M').strftime('%H:%M')
+    except ValueError:
+        raise ValueError(f"Jam {args[-1]} tidak valid, gunakan format JJ:MM (mis. 07:00)") from None
+
+    day = None
+    on_date = None
+    if repeat == 'weekly':
+        if args[0] not in WEEKDAYS:
+            raise ValueError(f"Hari {args[0]} tidak dikenal, gunakan {', '.join(WEEKDAYS)}")
+        day = WEEKDAYS.index(args[0])
+    elif repeat == 'monthly':
+        if not args[0].isdigit() or not 1 <= int(args[0]) <= 31:
+            raise ValueError(f"Tanggal {args[0]} tidak valid, gunakan 1-31")
+        day = int(args[0])
+    elif repeat == 'once':
+        for layout in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+            try:
+                on_date = datetime.strptime(args[0], layout).strftime('%Y-%m-%d')
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Tanggal {args[0]} tidak valid, gunakan format 2026-11-01 atau 01/11/2026")
+    return {'repeat': repeat, 'day': day, 'at': at, 'date': on_date}
+
+
+def next_occurrence(schedule: Schedule, after: float, tz: timezone) -> Optional[float]:
+    """
+    First time strictly after ``after`` (epoch seconds) that the schedule is due
+
+    Returns:
+        Epoch seconds, or None for a one-off schedule that has passed
+    """
+    hour, minute = map(int, schedule.at.split(':'))
+    now = datetime.fromtimestamp(after, tz)
+
+    def at_day(day: date) -> datetime:
+        return datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+
+    if schedule.repeat == 'once':
+        due = at_day(date.fromisoformat(schedule.date))
+        return due.timestamp() if due > now else None
+
+    if schedule.repeat == 'daily':
+        due = at_day(now.date())
+        if due <= now:
+            due = at_day(now.date() + timedelta(days=1))
+        return due.timestamp()
+
+    if schedule.repeat == 'weekly':
+        due = at_day(now.date() + timedelta(days=(schedule.day - now.weekday()) % 7))
+        if due <= now:
+            due += timedelta(days=7)
+        return due.timestamp()
+
+    # Monthly, on the last day of months shorter than the chosen day
+    year, month = now.year, now.month
+    while True:
+        day = min(schedule.day, calendar.monthrange(year, month)[1])
+        due = at_day(date(year, month, day))
+        if due > now:
+            return due.timestamp()
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class ScheduleStore:
+    """
+    Durable schedules in a SQLite database (WAL mode).
+
+    Like the order history, statements take microseconds and run directly
+    on the event loop.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS schedules ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "chat_id INTEGER NOT NULL, "
+            "destination TEXT NOT NULL, "
+            "product_code TEXT NOT NULL, "
+            "repeat TEXT NOT NULL, "
+            "day INTEGER, "
+            "at TEXT NOT NULL, "
+            "date TEXT, "
+            "next_due REAL NOT NULL, "
+            "last_run REAL, "
+            "last_ref_id TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_schedules_user ON schedules (user_id, id)")
+
+    def add(self, schedule: Schedule) -> int:
+        cursor = self._db.execute(
+            f"INSERT INTO schedules ({', '.join(_COLUMNS[1:])}) VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})",
+            tuple(getattr(schedule, name) for name in _COLUMNS[1:])
+        )
+        return cursor.lastrowid
+
+    def update(self, schedule: Schedule) -> None:
+        self._db.execute(
+            "UPDATE schedules SET next_due = ?, last_run = ?, last_ref_id = ? WHERE id = ?",
+            (schedule.next_due, schedule.last_run, schedule.last_ref_id, schedule.id)
+        )
+
+    def update_many(self, schedules: Sequence[Schedule]) -> None:
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE schedules SET next_due = ?, last_run = ?, last_ref_id = ? WHERE id = ?",
+                [(s.next_due, s.last_run, s.last_ref_id, s.id) for s in schedules]
+            )
+
+    def delete(self, schedule_id: int) -> None:
+        self._db.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+
+    def load(self) -> List[Schedule]:
+        return [Schedule(**dict(zip(_COLUMNS, row))) for row in self._db.execute(_SELECT)]
+
+    def for_user(self, user_id: int) -> List[Schedule]:
+        rows = self._db.execute(f"{_SELECT} WHERE user_id = ? ORDER BY id", (user_id,))
+        return [Schedule(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def count(self, user_id: Optional[int] = None) -> int:
+        if user_id is None:
+            return self._db.execute("SELECT COUNT(*) FROM schedules").fetchone()[0]
+        return self._db.execute("SELECT COUNT(*) FROM schedules WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class OrderScheduler:
+    """
+    Fires scheduled orders from one timer loop over a min-heap.
+
+    The heap holds (fire time, schedule ID) for every schedule; the loop
+    sleeps until the earliest entry is due, so idle cost does not grow with
+    the number of schedules. Changed and removed schedules leave their old
+    entry behind; it is skipped when it comes up, which keeps updates at
+    O(log n) without searching the heap.
+
+    Every schedule fires up to ``jitter`` seconds after its due time, at an
+    offset fixed per schedule, and at most ``fire_rate`` orders start per
+    second, so everything due at 00:00 on the 1st reaches the upstream as
+    a ramp rather than a spike. A schedule is advanced and saved before its
+    order is placed: a crash in between skips one run instead of ordering
+    twice.
+
+    After a restart, a schedule whose run was missed by at most
+    ``max_lateness`` seconds fires once, however many runs it missed; older
+    runs are skipped and reported through ``on_missed``.
+    """
+
+    def __init__(self, store: ScheduleStore,
+                 fire: Callable[[Schedule], Awaitable[Optional[str]]],
+                 on_missed: Optional[Callable[[Schedule, float], Awaitable[None]]] = None,
+                 utc_offset: float = 7.0, jitter: float = 300.0, fire_rate: float = 5.0,
+                 max_lateness: float = 6 * 3600, max_per_user: int = 20, max_sleep: float = 60.0):
+        """
+        Initialize scheduler
+
+        Args:
+            store: Durable schedule storage
+            fire: Places the order of a due schedule; returns its refID
+            on_missed: Called with a schedule and the due time of a run
+                skipped because it was too late
+            utc_offset: Hours from UTC that schedule times are in (WIB = 7)
+            jitter: Largest delay in seconds added to due times
+            fire_rate: Scheduled orders started per second at most
+            max_lateness: Seconds a missed run may be caught up after a restart
+            max_per_user: Schedules one user may have
+            max_sleep: Longest sleep, so a wall clock change is noticed
+        """
+        self.store = store
+        self.fire = fire
+        self.on_missed = on_missed
+        self.tz = timezone(timedelta(hours=utc_offset))
+        self.jitter = jitter
+        self.max_lateness = max_lateness
+        self.max_per_user = max_per_user
+        self.max_sleep = max_sleep
+        self._bucket = TokenBucket(fire_rate, burst=1)
+
+        self._schedules: Dict[int, Schedule] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def local_time(self, timestamp: float) -> datetime:
+        """Epoch seconds in the time zone schedules are written in"""
+        return datetime.fromtimestamp(timestamp, self.tz)
+
+    def fire_time(self, schedule: Schedule) -> float:
+        """Due time plus the schedule's own offset within the jitter window"""
+        if not self.jitter:
+            return schedule.next_due
+        return schedule.next_due + zlib.crc32(str(schedule.id).encode()) % int(self.jitter * 1000) / 1000
+
+    def _push(self, schedule: Schedule) -> None:
+        fire_at = self.fire_time(schedule)
+        if self._heap and fire_at < self._heap[0][0] and self._wakeup is not None:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (fire_at, schedule.id))
+
+    async def start(self) -> None:
+        """
+        Load schedules, settle runs missed while stopped, then run the timer loop
+
+        Loading runs in a thread; with 100k schedules it takes about a second.
+        """
+        if self._task is not None:
+            return
+        now = time.time()
+        missed: List[Tuple[Schedule, float]] = []
+        changed: List[Schedule] = []
+        late = 0
+        for schedule in await asyncio.to_thread(self.store.load):
+            if schedule.next_due < now - self.max_lateness:
+                missed.append((schedule, schedule.next_due))
+                schedule.next_due = next_occurrence(schedule, now, self.tz)
+                if schedule.next_due is None:
+                    self.store.delete(schedule.id)
+                    continue
+                changed.append(schedule)
+            elif schedule.next_due <= now:
+                late += 1
+            self._schedules[schedule.id] = schedule
+        if changed:
+            self.store.update_many(changed)
+
+        self._heap = [(self.fire_time(s), s.id) for s in self._schedules.values()]
+        heapq.heapify(self._heap)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Loaded {len(self._schedules)} order schedules, "
+                    f"catching up {late} missed runs, skipping {len(missed)} too late")
+
+        for schedule, due in missed:
+            SCHEDULED_RUNS.inc('missed')
+            if self.on_missed is not None:
+                self._spawn(self.on_missed(schedule, due))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def add(self, user_id: int, chat_id: int, destination: str, product_code: str,
+            repeat: str, day: Optional[int], at: str, date: Optional[str]) -> Schedule:
+        """
+        Store a new schedule and queue its first run
+
+        Raises:
+            ValueError: When the user has too many schedules or a one-off
+                schedule is in the past
+        """
+        if self.store.count(user_id) >= self.max_per_user:
+            raise ValueError(f"Maksimal {self.max_per_user} jadwal per user")
+        schedule = Schedule(
+            user_id=user_id, chat_id=chat_id, destination=destination, product_code=product_code,
+            repeat=repeat, day=day, at=at, date=date, created_at=time.time()
+        )
+        schedule.next_due = next_occurrence(schedule, time.time(), self.tz)
+        if schedule.next_due is None:
+            raise ValueError("Waktu jadwal sudah lewat")
+        schedule.id = self.store.add(schedule)
+        self._schedules[schedule.id] = schedule
+        self._push(schedule)
+        return schedule
+
+    def remove(self, schedule_id: int, user_id: Optional[int] = None) -> bool:
+        """Delete a schedule; with ``user_id``, only if it belongs to that user"""
+        schedule = self._schedules.get(schedule_id)
+        if schedule is None or (user_id is not None and schedule.user_id != user_id):
+            return False
+        del self._schedules[schedule_id]
+        self.store.delete(schedule_id)
+        return True
+
+    def for_user(self, user_id: int) -> List[Schedule]:
+        return [self._schedules.get(s.id, s) for s in self.store.for_user(user_id)]
+
+    async def _loop(self) -> None:
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, schedule_id = heapq.heappop(self._heap)
+                schedule = self._schedules.get(schedule_id)
+                if schedule is None or self.fire_time(schedule) != fire_at:
+                    continue  # removed or rescheduled since it was pushed
+                await self._bucket.acquire()
+                now = time.time()
+                if self._schedules.get(schedule_id) is schedule:
+                    self._run(schedule, now)
+
+            delay = self.max_sleep
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - now))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _run(self, schedule: Schedule, now: float) -> None:
+        due = schedule.next_due
+        SCHEDULED_RUNS.inc('caught_up' if now - due > self.jitter + 60 else 'fired')
+        schedule.last_run = now
+        # After now as well as after the due time, so a catch-up runs once
+        schedule.next_due = next_occurrence(schedule, max(due, now), self.tz)
+        if schedule.next_due is None:
+            del self._schedules[schedule.id]
+            self.store.delete(schedule.id)
+        else:
+            self.store.update(schedule)
+            self._push(schedule)
+        self._spawn(self._fire(schedule))
+
+    async def _fire(self, schedule: Schedule) -> None:
+        ref_id = await self.fire(schedule)
+        if ref_id and schedule.id in self._schedules:
+            schedule.last_ref_id = ref_id
+            self.store.update(schedule)
+
+    def _spawn(self, coro: Awaitable) -> None:
+        task = asyncio.ensure_future(coro)
+        self._running.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled order failed: {task.exception()!r}")
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionState(str, Enum):
+    """Conversation step a user is in"""
+    WAITING_DESTINATION = 'waiting_destination'
+    WAITING_PRODUCT_CODE = 'waiting_product_code'
+
+
+class Session:
+    """Compact per-user conversation record"""
+
+    __slots__ = ('state', 'destination', 'expires_at')
+
+    def __init__(self, state: SessionState, destination: Optional[str] = None,
+                 expires_at: float = 0.0):
+        self.state = state
+        self.destination = destination
+        self.expires_at = expires_at
+
+    def __repr__(self) -> str:
+        return f"<Session {self.state.value} destination={self.destination!r}>"
+
+
+class SessionStore(ABC):
+    """
+    Base class for session backends.
+
+    Every session expires ``ttl`` seconds after it was last saved. Expired
+    sessions are never returned (lazy eviction) and are removed in bulk by
+    :meth:`sweep`, which :meth:`start_sweeper` runs periodically.
+    """
+
+    def __init__(self, ttl: float = 900.0):
+        """
+        Args:
+            ttl: Seconds of inactivity after which a session expires
+        """
+        self.ttl = ttl
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[Session]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, user_id: int, session: Session) -> None:
+        """Save a session and push its expiry ``ttl`` seconds forward"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Remove expired sessions and return how many were removed"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def size(self) -> int:
+        raise NotImplementedError
+
+    def start_sweeper(self, interval: float = 60.0) -> None:
+        """Run :meth:`sweep` every ``interval`` seconds in the background"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(interval))
+
+    async def _sweep_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Evicted {removed} expired sessions")
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store.
+
+    Sessions are re-inserted on every save, so the dict stays ordered by
+    expiry and a sweep only walks the expired entries at the front.
+    """
+
+    def __init__(self, ttl: float = 900.0):
+        super().__init__(ttl)
+        self._sessions: Dict[int, Session] = {}
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        session = self._sessions.get(user_id)
+        if session is not None and session.expires_at <= time.time():
+            del self._sessions[user_id]
+            return None
+        return session
+
+    async def set(self, user_id: int, session: Session) -> None:
+        session.expires_at = time.time() + self.ttl
+        self._sessions.pop(user_id, None)
+        self._sessions[user_id] = session
+
+    async def delete(self, user_id: int) -> None:
+        self._sessions.pop(user_id, None)
+
+    async def sweep(self) -> int:
+        now = time.time()
+        expired = []
+        for user_id, session in self._sessions.items():
+            if session.expires_at > now:
+                break
+            expired.append(user_id)
+        for user_id in expired:
+            del self._sessions[user_id]
+        return len(expired)
+
+    async def size(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Durable session store in a SQLite database (WAL mode).
+
+    Survives restarts. With WAL and ``synchronous=NORMAL`` a commit does not
+    fsync, so queries take microseconds and run directly on the event loop.
+    """
+
+    def __init__(self, path: str, ttl: float = 900.0):
+        super().__init__(ttl)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "destination TEXT, "
+            "expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        row = self._db.execute(
+            "SELECT state, destination, expires_at FROM sessions WHERE user_id = ? AND expires_at > ?",
+            (user_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return Session(SessionState(row[0]), row[1], row[2])
+
+    async def set(self, user_id: int, session: Session) -> None:
+        session.expires_at = time.time() + self.ttl
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, state, destination, expires_at) VALUES (?, ?, ?, ?)",
+            (user_id, session.state.value, session.destination, session.expires_at)
+        )
+
+    async def delete(self, user_id: int) -> None:
+        self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    async def sweep(self) -> int:
+        return self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def size(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def close(self) -> None:
+        await super().close()
+        self._db.close()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store shared by several worker processes, backed by Redis.
+
+    Each session is a hash with a native Redis expiry, so no sweep is
+    needed. A sorted set of user IDs scored by expiry is kept next to the
+    hashes, so :meth:`size` (read on every metrics scrape) trims and counts
+    it in two cheap commands instead of scanning the keyspace. Requires the
+    optional ``redis`` package.
+    """
+
+    def __init__(self, url: str, ttl: float = 900.0, prefix: str = "session:"):
+        super().__init__(ttl)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        # User IDs are numeric, so this never collides with a session key
+        self._index = f"{prefix}index"
+
+    def _key(self, user_id: int) -> str:
+        return f"{self._prefix}{user_id}"
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        data = await self._redis.hgetall(self._key(user_id))
+        if not data:
+            return None
+        return Session(SessionState(data['state']), data.get('destination') or None,
+                       float(data.get('expires_at', 0)))
+
+    async def set(self, user_id: int, session: Session) -> None:
+        session.expires_at = time.time() + self.ttl
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={
+                'state': session.state.value,
+                'destination': session.destination or '',
+                'expires_at': session.expires_at
+            })
+            pipe.expire(key, int(self.ttl))
+            pipe.zadd(self._index, {str(user_id): session.expires_at})
+            await pipe.execute()
+
+    async def delete(self, user_id: int) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.zrem(self._index, str(user_id))
+            await pipe.execute()
+
+    async def sweep(self) -> int:
+        # Redis expires keys on its own
+        return 0
+
+    async def size(self) -> int:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(self._index, '-inf', time.time())
+            pipe.zcard(self._index)
+            _, count = await pipe.execute()
+        return count
+
+    def start_sweeper(self, interval: float = 60.0) -> None:
+        pass
+
+    async def close(self) -> None:
+        await super().close()
+        await self._redis.aclose()
+
+
+def create_session_store(backend: str = 'memory', ttl: float = 900.0,
+                         path: str = 'data/sessions.db',
+                         url: str = 'redis://localhost:6379/0') -> SessionStore:
+    """
+    Build a session store by backend name
+
+    Args:
+        backend: 'memory', 'sqlite' or 'redis'
+        ttl: Session lifetime in seconds
+        path: Database file for the sqlite backend
+        url: Connection URL for the redis backend
+    """
+    backend = backend.lower()
+    if backend == 'memory':
+        return MemorySessionStore(ttl)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path, ttl)
+    if backend == 'redis':
+        return RedisSessionStore(url, ttl)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import logging
+from typing import Any, Awaitable, Deque, Dict, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+UPDATE_WAIT_SECONDS = metrics.histogram(
+    'bot_update_wait_seconds', 'Time updates wait for their chat and a free slot before handling'
+)
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs updates of different chats concurrently, and each chat's updates in order.
+
+    The order flow is a conversation (destination, then product code), so
+    two updates of one chat must never run at the same time or overtake
+    each other. Every chat gets a FIFO of waiting updates; at most
+    ``max_concurrent`` updates run at once, one per chat.
+
+    Chats with waiting updates take turns: after one of its updates ran, a
+    chat goes to the back of the line, so a chat sending hundreds of updates
+    gets one slot in turn like any other and cannot hold up the rest. A
+    chat's queue is dropped as soon as it is empty, so idle chats cost
+    nothing.
+
+    PTB's own semaphore (``max_pending``) bounds the updates held here,
+    waiting or running; beyond it the update fetcher waits.
+    """
+
+    __slots__ = ('max_concurrent', 'running', '_queues', '_ready')
+
+    def __init__(self, max_concurrent: int = 32, max_pending: int = 4096):
+        """
+        Initialize processor
+
+        Args:
+            max_concurrent: Updates handled at the same time, across all chats
+            max_pending: Updates held at once, waiting or running
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be a positive integer")
+        super().__init__(max(max_pending, max_concurrent))
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._ready: Deque[Hashable] = collections.deque()
+
+    @property
+    def chats(self) -> int:
+        """Chats with updates running or waiting"""
+        return len(self._queues)
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values()) - self.running
+
+    @staticmethod
+    def chat_key(update: object) -> Hashable:
+        """Chat an update belongs to; updates without a chat are ordered per user"""
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return update.effective_user.id
+        # Anything else has nothing to be ordered with
+        return object()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.chat_key(update)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        turn = loop.create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = collections.deque()
+        queue.append(turn)
+        if len(queue) == 1:
+            self._ready.append(key)
+            self._dispatch()
+
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.cancelled():
+                self._drop(key, turn)
+                coroutine.close()
+            else:
+                self._release(key)
+            raise
+        UPDATE_WAIT_SECONDS.observe(loop.time() - started)
+
+        try:
+            await coroutine
+        finally:
+            self._release(key)
+
+    def _dispatch(self) -> None:
+        # Give the next waiting update of each chat in line a slot
+        while self.running < self.max_concurrent and self._ready:
+            key = self._ready.popleft()
+            self.running += 1
+            self._queues[key][0].set_result(None)
+
+    def _release(self, key: Hashable) -> None:
+        self.running -= 1
+        queue = self._queues[key]
+        queue.popleft()
+        if queue:
+            self._ready.append(key)
+        else:
+            del self._queues[key]
+        self._dispatch()
+
+    def _drop(self, key: Hashable, turn: asyncio.Future) -> None:
+        """Forget an update cancelled before its turn came"""
+        queue = self._queues[key]
+        queue.remove(turn)
+        if not queue:
+            del self._queues[key]
+            self._ready.remove(key)
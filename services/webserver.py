@@ -0,0 +1,125 @@
+import asyncio
+import hmac
+import json
+import logging
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+
+import tornado.httpserver
+import tornado.web
+from telegram import Update
+
+from services.scaleout import DUPLICATE_UPDATES, UpdateDeduplicator
+from utils.metrics import CONTENT_TYPE, REGISTRY, Registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Receive updates from Telegram and hand them to the application's update queue"""
+
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, telegram_app, secret_token: Optional[str] = None,
+                   dedup: Optional[UpdateDeduplicator] = None) -> None:
+        # ``application`` is taken by tornado's own RequestHandler arguments
+        self.telegram_app = telegram_app
+        self.secret_token = secret_token
+        self.dedup = dedup
+
+    async def post(self) -> None:
+        if self.secret_token and self.request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+
+        try:
+            data = json.loads(self.request.body)
+            update = Update.de_json(data, self.telegram_app.bot)
+        except Exception as e:
+            logger.error(f"Invalid update received on webhook: {e}")
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST)
+
+        if update is not None:
+            # Telegram redelivers updates it did not see acknowledged in time
+            if self.dedup is not None:
+                if update.update_id in self.dedup:
+                    DUPLICATE_UPDATES.inc()
+                    self.set_status(HTTPStatus.OK)
+                    return
+                self.dedup.add(update.update_id)
+            await self.telegram_app.update_queue.put(update)
+        self.set_status(HTTPStatus.OK)
+
+    def log_exception(self, typ, value, tb) -> None:
+        logger.debug(f"{self.request.remote_ip} - webhook request failed: {value}")
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Serve a metrics registry in Prometheus text format"""
+
+    SUPPORTED_METHODS = ("GET",)
+
+    def initialize(self, registry: Registry = REGISTRY, token: Optional[str] = None) -> None:
+        self.registry = registry
+        self.token = token
+
+    async def get(self) -> None:
+        if self.token:
+            supplied = self.request.headers.get("Authorization", "")
+            if not hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode()):
+                raise tornado.web.HTTPError(HTTPStatus.UNAUTHORIZED)
+        self.set_header("Content-Type", CONTENT_TYPE)
+        self.write(await self.registry.render())
+
+
+class WebServer:
+    """
+    HTTP server shared by the Telegram webhook and the bot's own endpoints.
+
+    PTB's built-in ``run_webhook`` server only serves Telegram updates, so
+    the bot runs this server instead and registers extra routes on it
+    (upstream report callbacks, metrics, ...).
+    """
+
+    def __init__(self, port: int = 8095, host: str = '0.0.0.0', trusted_proxy: bool = False):
+        """
+        Args:
+            port: Port to listen on
+            host: Address to listen on
+            trusted_proxy: Take the client address from X-Real-Ip /
+                X-Forwarded-For. Only when every request comes through a
+                reverse proxy that sets them; otherwise any client can
+                claim any address.
+        """
+        self.port = port
+        self.host = host
+        self.trusted_proxy = trusted_proxy
+        self._routes: List[Tuple[str, Any, Dict[str, Any]]] = []
+        self._server: Optional[tornado.httpserver.HTTPServer] = None
+
+    def add_route(self, path: str, handler, **kwargs) -> None:
+        """Register a tornado RequestHandler; keyword arguments go to its initialize()"""
+        if self._server is not None:
+            raise RuntimeError("Routes must be added before the server starts")
+        self._routes.append((rf"{path}/?", handler, kwargs))
+
+    def add_telegram_webhook(self, path: str, application, secret_token: Optional[str] = None) -> None:
+        self.add_route(path, TelegramWebhookHandler, telegram_app=application, secret_token=secret_token,
+                       dedup=UpdateDeduplicator())
+
+    def add_metrics(self, path: str = '/metrics', registry: Registry = REGISTRY,
+                    token: Optional[str] = None) -> None:
+        self.add_route(path, MetricsHandler, registry=registry, token=token)
+
+    async def start(self) -> None:
+        app = tornado.web.Application(self._routes, log_function=lambda handler: None)
+        self._server = tornado.httpserver.HTTPServer(app, xheaders=self.trusted_proxy)
+        self._server.listen(self.port, address=self.host)
+        logger.info(f"Web server listening on {self.host}:{self.port} "
+                    f"({', '.join(path.rstrip('/?') for path, _, _ in self._routes)})")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            await asyncio.wait_for(self._server.close_all_connections(), 5)
+            self._server = None
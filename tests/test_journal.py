@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from services.journal import OrderState, TransactionJournal
+
+
+def test_finished_orders_expire_from_the_index(tmp_path):
+    async def run():
+        journal = TransactionJournal(str(tmp_path / 'orders.journal'), fsync=False,
+                                     retention=0.2, expire_interval=0)
+        await journal.open()
+        try:
+            for batch in range(5):
+                for i in range(200):
+                    ref_id = f"{batch}-{i}"
+                    await journal.record(ref_id, OrderState.CREATED, user_id=i)
+                    await journal.record(ref_id, OrderState.SUCCESS, trx_id=f"T{ref_id}")
+                await journal.record(f"pending-{batch}", OrderState.SENT)
+                await asyncio.sleep(0.3)
+            # Only the last batch is within retention; pending orders are never dropped
+            assert len(journal) == 200 + 5
+            assert journal.get("0-0") is None
+            assert journal.by_trx_id("T0-0") is None
+            assert journal.get("4-0").state == OrderState.SUCCESS
+            assert len(journal.pending()) == 5
+        finally:
+            await journal.close()
+
+    asyncio.run(run())
+
+
+def test_expired_orders_are_dropped_when_reopened(tmp_path):
+    async def run():
+        path = str(tmp_path / 'orders.journal')
+        journal = TransactionJournal(path, fsync=False, retention=3600)
+        await journal.open()
+        await journal.record("old", OrderState.SUCCESS)
+        await journal.record("open", OrderState.SENT)
+        await journal.close()
+
+        journal = TransactionJournal(path, fsync=False, retention=0)
+        time.sleep(0.01)
+        pending = await journal.open()
+        await journal.close()
+        assert [record.ref_id for record in pending] == ["open"]
+        assert len(journal) == 1
+
+    asyncio.run(run())
+
+
+def test_failing_listener_does_not_drop_the_record(tmp_path):
+    async def run():
+        path = str(tmp_path / 'orders.journal')
+        journal = TransactionJournal(path, fsync=False)
+        await journal.open()
+        seen = []
+
+        def broken(record):
+            raise ValueError("listener bug")
+
+        journal.listeners += [broken, lambda record: seen.append(record.state)]
+        await journal.record("R1", OrderState.SENT, price='10150.0')
+        await journal.record("R1", OrderState.SUCCESS, price='10150.0')
+        await journal.close()
+        # Later listeners still run
+        assert seen == [OrderState.SENT, OrderState.SUCCESS]
+
+        reopened = TransactionJournal(path, fsync=False)
+        await reopened.open()
+        await reopened.close()
+        assert reopened.get("R1").state == OrderState.SUCCESS
+
+    asyncio.run(run())
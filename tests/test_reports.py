@@ -0,0 +1,76 @@
+import asyncio
+import socket
+
+import httpx
+
+from services.reports import ReportHandler
+from services.webserver import WebServer
+
+SECRET = "s3cret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def post_reports(requests, secret=SECRET, allowed_ips=('10.1.2.3',), trusted_proxy=False):
+    """Status codes of ``requests`` (headers, params) and the reports that got through"""
+    async def run():
+        received = []
+
+        async def on_report(report):
+            received.append(report)
+            return True
+
+        port = free_port()
+        server = WebServer(port=port, host='127.0.0.1', trusted_proxy=trusted_proxy)
+        server.add_route('/omega/report', ReportHandler, on_report=on_report, secret=secret,
+                         allowed_ips=list(allowed_ips))
+        await server.start()
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                statuses = []
+                for headers, params in requests:
+                    response = await client.get('/omega/report', headers=headers, params=params)
+                    statuses.append(response.status_code)
+        finally:
+            await server.stop()
+        return statuses, received
+
+    return asyncio.run(run())
+
+
+REPORT = {'refid': '1700000000000001', 'status': 'sukses', 'sn': '0412', 'key': SECRET}
+
+
+def test_spoofed_forwarded_for_is_rejected():
+    statuses, received = post_reports([
+        ({'X-Forwarded-For': '10.1.2.3'}, REPORT),
+        ({'X-Real-Ip': '10.1.2.3'}, REPORT),
+    ])
+    assert statuses == [403, 403]
+    assert received == []
+
+
+def test_forwarded_for_is_used_behind_a_trusted_proxy():
+    statuses, received = post_reports([({'X-Forwarded-For': '10.1.2.3'}, REPORT)], trusted_proxy=True)
+    assert statuses == [200]
+    assert received[0]['ref_id'] == REPORT['refid']
+
+
+def test_allowed_ip_still_needs_the_secret():
+    statuses, received = post_reports([
+        ({}, dict(REPORT, key='wrong')),
+        ({}, {k: v for k, v in REPORT.items() if k != 'key'}),
+        ({}, REPORT),
+    ], allowed_ips=['127.0.0.1'])
+    assert statuses == [403, 403, 200]
+    assert len(received) == 1
+
+
+def test_allow_list_without_secret_rejects_everything():
+    statuses, received = post_reports([({}, REPORT)], secret=None, allowed_ips=['127.0.0.1'])
+    assert statuses == [403]
+    assert received == []
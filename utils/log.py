@@ -0,0 +1,146 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from typing import Any, Dict, Iterable
+
+
+# Parameter names whose values never reach the logs
+REDACTED_KEYS = frozenset({'pin', 'password', 'sign', 'token', 'secret', 'key'})
+REDACTED = '***'
+
+# key=value, key: value and 'key': 'value' forms of the redacted names
+_SECRET_PATTERN = re.compile(
+    r"""(?i)(['"]?\b(?:%s)\b['"]?\s*[:=]\s*['"]?)([^'"&,\s}]+)"""
+    % '|'.join(map(re.escape, sorted(REDACTED_KEYS)))
+)
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(params: Dict[str, Any], keys: Iterable[str] = REDACTED_KEYS) -> Dict[str, Any]:
+    """Copy of ``params`` with credential values masked"""
+    keys = keys if isinstance(keys, frozenset) else frozenset(keys)
+    return {name: REDACTED if name.lower() in keys else value for name, value in params.items()}
+
+
+class Redacted:
+    """
+    Lazy, redacted view of a params dict for log arguments.
+
+    ``logger.debug("Params: %s", Redacted(params))`` costs one small object
+    when DEBUG is off; the copy and its repr are only built if a handler
+    actually formats the record.
+    """
+
+    __slots__ = ('params',)
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+
+    def __repr__(self) -> str:
+        return repr(redact(self.params))
+
+    __str__ = __repr__
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of routine records.
+
+    Records logged with ``extra={'sampled': True}`` below WARNING pass with
+    probability ``rate``; everything else always passes.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, 'sampled', False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class RedactingFilter(logging.Filter):
+    """Mask credential values that slipped into a message as key=value text"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        scrubbed = _SECRET_PATTERN.sub(rf"\1{REDACTED}", message)
+        if scrubbed != message:
+            record.msg, record.args = scrubbed, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed through ``extra`` are included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES and name != 'sampled':
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler merges ``msg % args`` in the logging thread before
+    enqueueing; this one enqueues the record as is, so the event loop only
+    pays for creating the record. Log arguments must therefore not be
+    mutated after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: str = 'INFO', json_format: bool = False, sample_rate: float = 1.0,
+                  stream=None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to a background writer thread
+
+    Args:
+        level: Root log level name
+        json_format: Write JSON lines instead of plain text
+        sample_rate: Fraction of sampled (routine success) records kept
+        stream: Output stream, stderr by default
+
+    Returns:
+        The started QueueListener; call stop() on shutdown to flush it
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.addFilter(RedactingFilter())
+    if json_format:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,217 @@
+import asyncio
+import collections
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import signal
+import sys
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+
+class SamplingProfiler:
+    """
+    Statistical wall-clock profiler.
+
+    While :meth:`run` is active, the stacks of all threads are recorded
+    every ``interval`` seconds; nothing is installed in between, so the
+    process runs at full speed when no profile is taken. Stacks are
+    aggregated in the folded format (``a;b;c count``) read by flamegraph.pl,
+    speedscope and inferno. The event loop waiting in ``select`` shows up as
+    such, so idle time is visible too.
+
+    On the main thread, samples are taken by a SIGALRM interval timer whose
+    handler sees the frame it interrupted. A sampling thread would only get
+    the GIL when the loop releases it, which is almost always in ``select``,
+    and would hide the code that actually holds the GIL. Elsewhere a
+    sampling thread over ``sys._current_frames()`` is used anyway.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Dict[str, int] = collections.Counter()
+        self._names: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _label(self, code) -> str:
+        label = self._names.get(code)
+        if label is None:
+            label = self._names[code] = f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+        return label
+
+    def _record(self, own: int, current=None) -> None:
+        """Add one sample of every thread but ``own``; ``current`` is the frame ``own`` was interrupted in"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        if current is not None:
+            frames[own] = current
+        else:
+            frames.pop(own, None)
+        for ident, frame in frames.items():
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident) or f"thread-{ident}")
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _sample_thread(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._record(own)
+
+    async def run(self, seconds: float) -> None:
+        """Sample for ``seconds`` while the event loop keeps running"""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+            own = threading.get_ident()
+            previous = signal.signal(signal.SIGALRM, lambda signum, frame: self._record(own, frame))
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+            self._thread = threading.main_thread()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+                self._thread = None
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_thread, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def folded(self) -> str:
+        """Collected stacks in folded format, heaviest first"""
+        return ''.join(f"{stack} {count}\n" for stack, count in
+                       sorted(self.stacks.items(), key=lambda item: -item[1]))
+
+    def top(self, limit: int = 10) -> List[tuple]:
+        """(function, share of samples) for the functions most often on top of a stack"""
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, count / total) for name, count in leaves.most_common(limit)]
+
+
+async def profile_calls(seconds: float, sort: str = 'cumulative', limit: int = 40) -> tuple:
+    """
+    Deterministic cProfile of the event loop thread for ``seconds``
+
+    Every call on the loop thread is traced while it runs, which costs far
+    more than sampling but counts calls exactly.
+
+    Returns:
+        (pstats file contents, text report of the top ``limit`` entries)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats(sort).print_stats(limit)
+    # What Stats.dump_stats writes, without a temporary file
+    return marshal.dumps(stats.stats), report.getvalue()
+
+
+class MemoryTracker:
+    """
+    tracemalloc snapshots on demand, each compared with the one before.
+
+    Allocation tracing slows every allocation down, so it is only on
+    between :meth:`start` and :meth:`stop`.
+    """
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._previous = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._previous = None
+
+    def snapshot(self, limit: int = 15) -> str:
+        """
+        Take a snapshot and describe it
+
+        Returns:
+            Traced memory and the top allocation sites by size; from the
+            second snapshot on, the sites that grew most since the last one
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced={current / 2 ** 20:.1f} MiB peak={peak / 2 ** 20:.1f} MiB"]
+        if self._previous is None:
+            lines.append("top allocation sites:")
+            lines += [f"  {stat}" for stat in snapshot.statistics('lineno')[:limit]]
+        else:
+            lines.append("growth since last snapshot:")
+            lines += [f"  {stat}" for stat in snapshot.compare_to(self._previous, 'lineno')[:limit]]
+        self._previous = snapshot
+        return '\n'.join(lines)
+
+
+def _await_stack(coro, limit: int) -> List[str]:
+    """Where a suspended coroutine and everything it awaits are, outermost first"""
+    lines = []
+    while coro is not None and len(lines) < limit:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        code = frame.f_code
+        lines.append(f"{code.co_filename}:{frame.f_lineno} in {code.co_qualname}")
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return lines
+
+
+def dump_tasks(limit: int = 20) -> str:
+    """
+    Every live asyncio task and where it is suspended
+
+    Task.get_stack only shows a task's outermost coroutine; the chain of
+    awaits below it is followed here, so a task stuck deep inside a call
+    shows the line it waits on.
+    """
+    out = io.StringIO()
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    out.write(f"{len(tasks)} tasks\n")
+    for task in tasks:
+        out.write(f"\n{task!r}\n")
+        for line in _await_stack(task.get_coro(), limit):
+            out.write(f"  {line}\n")
+    return out.getvalue()
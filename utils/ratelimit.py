@@ -0,0 +1,134 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import List, Optional, Tuple
+
+
+class Priority(IntEnum):
+    """Order in which waiting requests get tokens; lower goes first"""
+    HIGH = 1      # results the user is waiting for (order outcomes)
+    NORMAL = 2    # replies and menu redraws
+    LOW = 3       # progress updates, background notifications
+
+
+class TokenBucket:
+    """
+    Async token bucket with prioritised waiters.
+
+    Tokens refill continuously at ``rate`` per second up to ``burst``. A
+    caller takes a token immediately when one is free and nobody is queued;
+    otherwise it waits in a heap ordered by (priority, arrival), so urgent
+    requests overtake queued routine ones but never pre-empt a token that
+    was already handed out. ``pause`` empties the bucket for a while, e.g.
+    after the remote side answered "retry after N seconds".
+
+    Everything runs on the event loop thread; there is no locking.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Initialize bucket
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity; defaults to one second worth of tokens
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def __repr__(self) -> str:
+        return f"<TokenBucket {self.rate}/s tokens={self.tokens:.2f} waiting={len(self._waiters)}>"
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill(time.monotonic())
+        return self._tokens
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        """Full and unused, i.e. safe to discard"""
+        return not self._waiters and self.tokens >= self.capacity and time.monotonic() >= self._paused_until
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is free right now and nobody is queued"""
+        now = time.monotonic()
+        if self._waiters or now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority: int = Priority.NORMAL) -> float:
+        """
+        Wait for a token
+
+        Args:
+            priority: Queue position class; lower values are served first
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.try_acquire():
+            return 0.0
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule()
+        await future
+        return time.monotonic() - started
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds``, then restart with a single token"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 1.0
+        self._updated = self._paused_until
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if not self._waiters:
+            return
+        now = time.monotonic()
+        if now < self._paused_until:
+            delay = self._paused_until - now
+        else:
+            self._refill(now)
+            delay = max(0.0, (1 - self._tokens) / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self) -> None:
+        self._wakeup = None
+        now = time.monotonic()
+        if now >= self._paused_until:
+            self._refill(now)
+            while self._waiters and self._tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                # Cancelled waiters give their place up without using a token
+                if not future.done():
+                    self._tokens -= 1
+                    future.set_result(None)
+        self._schedule()
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from typing import Optional
+
+
+class RefIdAllocator:
+    """
+    Allocate unique, monotonically increasing refIDs.
+
+    Format: {milliseconds}{node:02d}{sequence:03d}, e.g. 173000000000001007.
+    Up to 1000 IDs per millisecond per node; when a millisecond runs out the
+    allocator borrows the next one, so IDs never repeat or go backwards even
+    if the clock does.
+
+    With ``state_path`` set, a high-water mark is leased ahead of time and
+    persisted, and a restarted process starts above it. This keeps IDs
+    monotonic across restarts even when the clock moved backwards.
+    """
+
+    def __init__(self, node_id: int = 0, state_path: Optional[str] = None,
+                 lease_ms: int = 60_000):
+        """
+        Initialize allocator
+
+        Args:
+            node_id: Process/worker number (0-99) embedded in every ID, so
+                several processes can allocate without coordination
+            state_path: File holding the persisted high-water mark
+            lease_ms: How far ahead (ms) each persisted lease reaches
+        """
+        if not 0 <= node_id <= 99:
+            raise ValueError(f"node_id must be between 0 and 99, got {node_id}")
+        self.node_id = node_id
+        self.state_path = state_path
+        self.lease_ms = lease_ms
+
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._seq = 0
+        self._lease = 0
+
+        if state_path:
+            self._lease = self._load_lease()
+            # Everything below the previous lease may already have been issued
+            self._last_ms = self._lease
+            self._seq = -1
+
+    def next(self) -> str:
+        """Return a new refID"""
+        with self._lock:
+            now = time.time_ns() // 1_000_000
+            if now > self._last_ms:
+                self._last_ms = now
+                self._seq = 0
+            else:
+                self._seq += 1
+                if self._seq > 999:
+                    self._last_ms += 1
+                    self._seq = 0
+
+            if self.state_path and self._last_ms >= self._lease:
+                self._store_lease(self._last_ms + self.lease_ms)
+
+            return f"{self._last_ms}{self.node_id:02d}{self._seq:03d}"
+
+    __call__ = next
+
+    @staticmethod
+    def node_of(ref_id: str) -> Optional[int]:
+        """Node number embedded in a refID, or None if it is not in this format"""
+        if len(ref_id) != 18 or not ref_id.isdigit():
+            return None
+        return int(ref_id[13:15])
+
+    def _load_lease(self) -> int:
+        try:
+            with open(self.state_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _store_lease(self, lease: int) -> None:
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(lease))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self._lease = lease
@@ -35,7 +35,7 @@ def generate_signature(member_id: str, pin: str, password: str) -> str:
 
 
 def generate_order_signature(member_id: str, pin: str, password: str, 
-                            destination: str, product_code: str) -> str:
+                            destination: str, product_code: str, ref_id: str) -> str:
     """
     Generate signature for order transaction.
     
@@ -47,14 +47,12 @@ def generate_order_signature(member_id: str, pin: str, password: str,
         password: Your API password
         destination: Destination number
         product_code: Product code to order
+        ref_id: Reference ID sent with the order; must be the exact value
+            passed as refID in the request
         
     Returns:
         str: Base64 encoded SHA1 signature
     """
-    # Generate reference ID (can be timestamp or random)
-    import time
-    ref_id = str(int(time.time()))
-    
     signature_string = f"OtomaX|{member_id}|{product_code}|{destination}|{ref_id}|{pin}|{password}"
     
     # Generate SHA1 hash
@@ -70,3 +68,30 @@ def generate_order_signature(member_id: str, pin: str, password: str,
     signature = signature.replace('/', '_').replace('+', '-')
     
     return signature
+
+
+class SigningContext:
+    """
+    Per-account signer with the constant parts of the signature precomputed.
+
+    The signature string always starts with ``OtomaX|{memberID}|`` and ends
+    with ``|{pin}|{password}``. The prefix is hashed once and the hash state
+    is copied for every order, and the suffix is encoded once, so each order
+    only encodes and hashes its own ``product|dest|refID`` part. The balance
+    signature has no variable part and is computed once.
+    """
+
+    __slots__ = ('_prefix', '_suffix', 'balance_signature')
+
+    def __init__(self, member_id: str, pin: str, password: str):
+        self._prefix = hashlib.sha1(f"OtomaX|{member_id}|".encode())
+        self._suffix = f"|{pin}|{password}".encode()
+        self.balance_signature = generate_signature(member_id, pin, password)
+
+    def sign_order(self, destination: str, product_code: str, ref_id: str) -> str:
+        """Same result as generate_order_signature for this account"""
+        sha1 = self._prefix.copy()
+        sha1.update(f"{product_code}|{destination}|{ref_id}".encode())
+        sha1.update(self._suffix)
+        # urlsafe alphabet is the '/' -> '_' and '+' -> '-' replacement
+        return base64.urlsafe_b64encode(sha1.digest()).rstrip(b'=').decode()